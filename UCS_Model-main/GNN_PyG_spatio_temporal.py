@@ -17,9 +17,14 @@ https://pytorch-geometric.readthedocs.io/en/latest/notes/installation.html
 
 """
 
+import argparse
 import os
+import shutil
+import sys
+from types import SimpleNamespace
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.cluster import KMeans
 from sklearn.neighbors import kneighbors_graph
 from sklearn.preprocessing import StandardScaler
@@ -28,6 +33,13 @@ import torch.nn as nn
 from torch_geometric.data import Data, InMemoryDataset, DataLoader
 from torch_geometric.nn import GCNConv
 
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+from stage_cache import StageCache, file_fingerprint, source_fingerprint
+from model_registry import ModelRegistry
+from memory_trace import check_copy, trace_stage, traced
+
 # Config
 CSV_PATH = 'smart_mobility_dataset.csv'
 N_ZONES = 30          # change as needed
@@ -36,8 +48,12 @@ SEQ_LEN = 24
 HORIZON = 12
 BATCH_SIZE = 8
 EPOCHS = 50
+FINE_TUNE_EPOCHS = 5
+CHECKPOINT_PATH = 'stgcn_checkpoint.pt'
+SERVING_BUNDLE_PATH = 'stgcn_serving.npz'
 DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
 
+@traced('gnn.load_and_cluster')
 def load_and_cluster(csv_path, n_zones=30):
     df = pd.read_csv(csv_path)
     assert 'Latitude' in df.columns and 'Longitude' in df.columns, "Need lat/lon"
@@ -48,11 +64,12 @@ def load_and_cluster(csv_path, n_zones=30):
     centroids = kmeans.cluster_centers_
     return df, centroids
 
+@traced('gnn.aggregate_per_zone')
 def aggregate_per_zone(df, n_zones):
     # assume df has Timestamp column; else treat rows as sequential timesteps
     if 'Timestamp' in df.columns:
         df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-        df = df.sort_values('Timestamp').reset_index(drop=True)
+        df = check_copy('sorted observation frame', df.sort_values('Timestamp').reset_index(drop=True))
     # group by timestamp and zone, take mean of numeric features
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     # Remove 'zone' from numeric_cols if it exists
@@ -82,27 +99,83 @@ def build_knn_edge_index(centroids, k=4):
     edge_index = torch.tensor(edge_index, dtype=torch.long)
     return edge_index
 
+@traced('gnn.make_graph_windows')
+def make_graph_windows(tensor, seq_len=SEQ_LEN, horizon=HORIZON):
+    # windows over a T x Z x F tensor -> x: N x Z x (seq_len*F), y: N x Z x F
+    T, Z, F = tensor.shape
+    n = T - seq_len - horizon + 1
+    # strided (n, Z, F, seq_len) view; the reshape to (n, Z, seq_len*F) is the one
+    # copy, instead of n per-window copies that np.stack would then copy again
+    x = sliding_window_view(tensor, seq_len, axis=0)[:n].transpose(0, 1, 3, 2).reshape(n, Z, -1)
+    y = np.asarray(tensor[seq_len+horizon-1:seq_len+horizon-1+n])
+    # x repeats every timestep seq_len times; copy=False keeps the float32 case from copying it again
+    check_copy('graph windows x', x, source=tensor)
+    return x.astype(np.float32, copy=False), y.astype(np.float32, copy=False)
+
 class SpatioTemporalDataset(InMemoryDataset):
-    def __init__(self, tensor, edge_index, transform=None):
-        super().__init__('.', transform)
-        # tensor: T x Z x F
-        self.tensor = tensor
+    def __init__(self, x_windows, y_windows, edge_index, transform=None):
+        # No root: samples come from the stage cache, not PyG's processed/ files
+        super().__init__(None, transform)
+        # x_windows: N x Z x (seq_len*F), y_windows: N x Z x F (see make_graph_windows)
+        self.x_windows = x_windows
+        self.y_windows = y_windows
         self.edge_index = edge_index
-        self.process()
+        self.materialize()
 
-    def process(self):
+    @traced('gnn.SpatioTemporalDataset.materialize')
+    def materialize(self):
+        # For PyG, we create one Data per sample with node features shaped (Z, seq_len*F)
         data_list = []
-        T, Z, F = self.tensor.shape
-        for t in range(T - SEQ_LEN - HORIZON + 1):
-            x = torch.tensor(self.tensor[t:t+SEQ_LEN], dtype=torch.float)  # seq_len x Z x F
-            y = torch.tensor(self.tensor[t+SEQ_LEN+HORIZON-1], dtype=torch.float)  # Z x F (we'll pick target column)
-            # reshape x to (Z, seq_len*F) or keep as temporal dimension in model
-            # For PyG, we create one Data per sample with node features shaped (Z, seq_len*F)
-            x_nodes = x.permute(1,0,2).reshape(Z, -1)  # Z x (seq_len*F)
-            data = Data(x=x_nodes, edge_index=self.edge_index, y=y)
+        for x_nodes, y in zip(self.x_windows, self.y_windows):
+            data = Data(x=torch.tensor(np.array(x_nodes), dtype=torch.float), edge_index=self.edge_index,
+                        y=torch.tensor(np.array(y), dtype=torch.float))  # y: Z x F (we'll pick target column)
             data_list.append(data)
         self.data, self.slices = self.collate(data_list)
 
+def prepare_stages(cache=None, n_zones=N_ZONES, k_neighbors=K_NEIGHBORS):
+    # Each stage is cached on disk by its inputs and config, so e.g. changing
+    # SEQ_LEN only rebuilds the windows, and changing K_NEIGHBORS only the graph
+    cache = cache or StageCache()
+    _, zone_tensor, edges = prepare_graph(cache, n_zones, k_neighbors)
+    windows = cache.run(
+        'gnn_windows',
+        lambda: dict(zip(['x', 'y'], make_graph_windows(zone_tensor['tensor'], SEQ_LEN, HORIZON))),
+        config={'seq_len': SEQ_LEN, 'horizon': HORIZON},
+        inputs=[zone_tensor, source_fingerprint(make_graph_windows)])
+    return zone_tensor, edges, windows
+
+def prepare_graph(cache=None, n_zones=N_ZONES, k_neighbors=K_NEIGHBORS):
+    # zones (with centroids), the T x Z x F zone tensor and the kNN graph, without
+    # the N x Z x (SEQ_LEN*F) windows that only the full-graph loaders need
+    cache = cache or StageCache()
+    source = file_fingerprint(CSV_PATH)
+    zones = cache.run(
+        'gnn_zones',
+        lambda: dict(zip(['zones', 'centroids'], _zones(load_and_cluster(CSV_PATH, n_zones=n_zones)))),
+        config={'n_zones': n_zones},
+        inputs=[source, source_fingerprint(load_and_cluster)])
+    zone_tensor = cache.run(
+        'gnn_zone_tensor',
+        lambda: _zone_tensor(np.asarray(zones['zones']), n_zones),
+        inputs=[source, zones, source_fingerprint(aggregate_per_zone)])
+    edges = cache.run(
+        'gnn_edges',
+        lambda: {'edge_index': build_knn_edge_index(np.asarray(zones['centroids']), k=k_neighbors).numpy()},
+        config={'k_neighbors': k_neighbors},
+        inputs=[zones, source_fingerprint(build_knn_edge_index)])
+    return zones, zone_tensor, edges
+
+def _zones(clustered):
+    df, centroids = clustered
+    return df['zone'].to_numpy(), centroids
+
+def _zone_tensor(zones, n_zones=N_ZONES):
+    df = pd.read_csv(CSV_PATH)
+    df['zone'] = zones
+    tensor, timestamps, feature_list = aggregate_per_zone(df, n_zones)
+    return {'tensor': tensor, 'timestamps': np.array(timestamps, dtype='datetime64[ns]'),
+            'feature_list': feature_list}
+
 class STGCN(nn.Module):
     def __init__(self, in_dim, hidden=64):
         super().__init__()
@@ -111,70 +184,193 @@ class STGCN(nn.Module):
         self.fc = nn.Linear(hidden, 1)  # predicting single target per node
 
     def forward(self, data):
-        # data.x: (batch*Z, in_dim) due to PyG batching -> we will reshape inside training loop
-        # For simplicity, assume data.x is (batch, Z, in_dim)
-        x = data.x  # expected shape: (batch, Z, in_dim)
+        # data.x: (batch, Z, in_dim); data.edge_index is PyG's batched edge_index,
+        # whose node ids are already offset per sample, so one GCN call covers
+        # the whole mini-batch as a single disconnected graph
+        x = data.x
         batch, Z, in_dim = x.shape
-        x = x.view(batch*Z, in_dim)
-        # apply GCN per sample: requires edge_index that is same for every sample; not trivial in mini-batch without using torch_geometric batching
-        # We'll implement a simple per-sample loop (not optimized) — fine for prototyping
-        x = x.view(batch, Z, in_dim)
-        out_nodes = []
-        for b in range(batch):
-            xb = x[b]  # Z x in_dim
-            # apply GCN on single graph
-            xb = xb.to(DEVICE)
-            edge = data.edge_index.to(DEVICE)
-            xb_g = self.gcn1(xb, edge)  # Z x hidden
-            out_nodes.append(xb_g.unsqueeze(0))
-        out = torch.cat(out_nodes, dim=0)  # batch x Z x hidden
+        out = self.gcn1(x.reshape(batch*Z, in_dim), data.edge_index)  # (batch*Z) x hidden
+        out = out.view(batch, Z, -1)  # batch x Z x hidden
         # run GRU across nodes as sequence? alternatively across time — here GRU is not used as we collapsed time dimension earlier
         # we take mean across nodes and predict per-node value via FC
         out = self.fc(out).squeeze(-1)  # batch x Z
         return out
 
-def train():
-    df, centroids = load_and_cluster(CSV_PATH, n_zones=N_ZONES)
-    tensor, timestamps, feature_list = aggregate_per_zone(df, N_ZONES)
-    edge_index = build_knn_edge_index(centroids, k=K_NEIGHBORS)
-    # build dataset
-    dataset = SpatioTemporalDataset(tensor, edge_index)
-    # simple split
+def build_dataset(cache=None, n_zones=N_ZONES, k_neighbors=K_NEIGHBORS):
+    zone_tensor, edges, windows = prepare_stages(cache, n_zones, k_neighbors)
+    edge_index = torch.tensor(np.array(edges['edge_index']), dtype=torch.long)
+    return SpatioTemporalDataset(windows['x'], windows['y'], edge_index)
+
+def make_loaders(dataset, batch_size=BATCH_SIZE):
+    # simple chronological split: 70% train, 15% validation, 15% test
     n = len(dataset)
     train_n = int(n*0.7)
     val_n = int(n*0.85)
-    train_set = dataset[:train_n]
-    val_set = dataset[train_n:val_n]
-    test_set = dataset[val_n:]
-    train_loader = DataLoader(train_set, batch_size=BATCH_SIZE, shuffle=True)
-    val_loader = DataLoader(val_set, batch_size=BATCH_SIZE)
-    test_loader = DataLoader(test_set, batch_size=BATCH_SIZE)
-    model = STGCN(in_dim=dataset[0].x.shape[1], hidden=64).to(DEVICE)
-    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    return (DataLoader(dataset[:train_n], batch_size=batch_size, shuffle=True),
+            DataLoader(dataset[train_n:val_n], batch_size=batch_size),
+            DataLoader(dataset[val_n:], batch_size=batch_size))
+
+def _model_inputs(batch, n_zones):
+    # batch.x: (batch_size*Z, in_dim) and batch.y: (batch_size*Z, F) due to PyG batching
+    batch = batch.to(DEVICE)
+    B = batch.num_graphs
+    x = batch.x.view(B, n_zones, -1)
+    # a plain namespace: a per-batch type() would keep each batch alive in a class reference cycle
+    data_for_model = SimpleNamespace(x=x, edge_index=batch.edge_index)
+    y_true = batch.y.view(B, n_zones, -1)[:, :, 0]  # pick first numeric column as target; adjust as needed
+    return data_for_model, y_true
+
+def train_epoch(model, loader, optimizer, loss_fn, n_zones=N_ZONES):
+    model.train()
+    tot_loss = 0.0
+    for batch in loader:
+        data_for_model, y_true = _model_inputs(batch, n_zones)
+        optimizer.zero_grad()
+        y_pred = model(data_for_model)
+        loss = loss_fn(y_pred, y_true)
+        loss.backward()
+        optimizer.step()
+        tot_loss += loss.item()
+    return tot_loss / max(len(loader), 1)
+
+@torch.no_grad()
+def evaluate(model, loader, loss_fn, n_zones=N_ZONES):
+    model.eval()
+    tot_loss, count = 0.0, 0
+    for batch in loader:
+        data_for_model, y_true = _model_inputs(batch, n_zones)
+        tot_loss += loss_fn(model(data_for_model), y_true).item() * batch.num_graphs
+        count += batch.num_graphs
+    return tot_loss / max(count, 1)
+
+def save_checkpoint(path, epoch, model, optimizer, config):
+    # write-then-rename so a crash mid-save never leaves a truncated checkpoint
+    torch.save({'epoch': epoch, 'config': config, 'model': model.state_dict(),
+                'optimizer': optimizer.state_dict()}, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def load_checkpoint(path, model, optimizer, config):
+    # restore a checkpoint written for the same config; returns the epoch to start from
+    if not path or not os.path.exists(path):
+        return 0
+    checkpoint = torch.load(path, map_location=DEVICE)
+    if checkpoint['config'] != config:
+        print(f'Ignoring {path}: it was written for a different run')
+        return 0
+    model.load_state_dict(checkpoint['model'])
+    optimizer.load_state_dict(checkpoint['optimizer'])
+    print(f"Resuming from {path} after epoch {checkpoint['epoch']}")
+    return checkpoint['epoch']
+
+def fit(dataset, n_zones=N_ZONES, hidden=64, lr=1e-3, epochs=EPOCHS, state=None, verbose=True,
+        checkpoint_path=None):
+    # state: {'model': ..., 'optimizer': ...} state dicts to continue training from
+    # (optimizer optional). With checkpoint_path, model and optimizer state are
+    # saved after every epoch and a run with the same config resumes from there;
+    # the checkpoint is removed once training completes
+    train_loader, val_loader, _ = make_loaders(dataset)
+    model = STGCN(in_dim=dataset[0].x.shape[1], hidden=hidden).to(DEVICE)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    if state is not None:
+        model.load_state_dict(state['model'])
+        if state.get('optimizer') is not None:
+            optimizer.load_state_dict(state['optimizer'])
+    config = {'n_zones': n_zones, 'hidden': hidden, 'lr': lr, 'epochs': epochs, 'samples': len(dataset)}
+    start_epoch = load_checkpoint(checkpoint_path, model, optimizer, config)
     loss_fn = nn.MSELoss()
-    for epoch in range(EPOCHS):
-        model.train()
-        tot_loss = 0.0
-        for batch in train_loader:
-            # batch.x shape: (batch_size*Z, in_dim) due to PyG batching; we will reshape to (batch, Z, in_dim)
-            batch = batch.to(DEVICE)
-            B = batch.num_graphs
-            Z = N_ZONES
-            in_dim = batch.x.shape[1]
-            # reshape
-            x = batch.x.view(B, Z, in_dim)
-            data_for_model = type('obj', (object,), {'x': x, 'edge_index': batch.edge_index})
-            y_true = batch.y[:, :, 0].to(DEVICE)  # pick first numeric column as target; adjust as needed
-            optimizer.zero_grad()
-            y_pred = model(data_for_model)
-            loss = loss_fn(y_pred, y_true)
-            loss.backward()
-            optimizer.step()
-            tot_loss += loss.item()
-        print(f'Epoch {epoch+1}/{EPOCHS} train_loss={tot_loss/len(train_loader):.4f}')
-    print('Training complete. Evaluate on test set similarly.')
-    # Save model
+    for epoch in range(start_epoch, epochs):
+        with trace_stage('gnn.train_epoch'):
+            train_loss = train_epoch(model, train_loader, optimizer, loss_fn, n_zones)
+        if verbose:
+            print(f'Epoch {epoch+1}/{epochs} train_loss={train_loss:.4f}')
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, epoch + 1, model, optimizer, config)
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return model, optimizer, evaluate(model, val_loader, loss_fn, n_zones)
+
+def train(cache=None, checkpoint_path=CHECKPOINT_PATH, fine_tune=False, epochs=None, registry=None):
+    # fine_tune: start from the latest registered STGCN (weights and optimizer) and
+    # train only on windows whose target is newer than the data it was trained on.
+    # The GCN/linear weights are shared by all nodes, so they stay valid if the
+    # zones are re-clustered on the new CSV
+    registry = registry or ModelRegistry()
+    x, y, edge_index, target_times = training_windows(cache)
+    state, parent = None, None
+    if fine_tune:
+        previous = registry.latest('stgcn')
+        if previous is None:
+            raise ValueError(f'No registered STGCN in {registry.root} to fine-tune; run a full training first')
+        new = target_times > np.datetime64(previous['data_end'])
+        if not new.any():
+            print(f"No new data since {previous['data_end']}; nothing to train")
+            return None
+        x, y, target_times = np.asarray(x)[new], np.asarray(y)[new], target_times[new]
+        state = {'model': torch.load(os.path.join(previous['path'], 'stgcn_model.pt'), map_location=DEVICE),
+                 'optimizer': torch.load(os.path.join(previous['path'], 'optimizer.pt'), map_location=DEVICE)}
+        parent = previous['version']
+        print(f"Fine-tuning STGCN v{parent} on {len(x)} new windows since {previous['data_end']}")
+    epochs = epochs or (FINE_TUNE_EPOCHS if fine_tune else EPOCHS)
+    dataset = SpatioTemporalDataset(x, y, edge_index)
+    model, optimizer, val_loss = fit(dataset, N_ZONES, hidden=64, epochs=epochs, state=state,
+                                     checkpoint_path=checkpoint_path)
+    print(f'Training complete. val_loss={val_loss:.4f}. Evaluate on test set similarly.')
+    return save_trained(model, optimizer, target_times, epochs, val_loss, registry,
+                        mode='fine_tune' if fine_tune else 'full', parent=parent, cache=cache)
+
+def training_windows(cache=None):
+    # windows plus the timestamp of each window's target
+    zone_tensor, edges, windows = prepare_stages(cache)
+    edge_index = torch.tensor(np.array(edges['edge_index']), dtype=torch.long)
+    target_times = np.asarray(zone_tensor['timestamps'])[SEQ_LEN+HORIZON-1:][:len(windows['x'])]
+    return windows['x'], windows['y'], edge_index, target_times
+
+def save_serving_bundle(path=SERVING_BUNDLE_PATH, cache=None, n_zones=N_ZONES, hidden=64):
+    # everything the API needs next to stgcn_model.pt: zone centroids for point
+    # lookups, the graph, and the latest SEQ_LEN zone rows as the initial input window
+    zones, zone_tensor, edges = prepare_graph(cache, n_zones)
+    timestamps = np.asarray(zone_tensor['timestamps'])
+    step = np.median(np.diff(timestamps[-SEQ_LEN:])) if len(timestamps) > 1 else np.timedelta64(5, 'm')
+    np.savez(path, centroids=np.asarray(zones['centroids']), edge_index=np.asarray(edges['edge_index']),
+             window=np.asarray(zone_tensor['tensor'][-SEQ_LEN:]), window_end=timestamps[-1],
+             step_minutes=step // np.timedelta64(1, 'm'), feature_list=np.array(zone_tensor['feature_list']),
+             seq_len=SEQ_LEN, horizon=HORIZON, hidden=hidden)
+
+def save_trained(model, optimizer, target_times, epochs, val_loss, registry=None, mode='full', parent=None,
+                 hidden=64, n_zones=N_ZONES, cache=None, **extra):
+    # Save model and its serving bundle
     torch.save(model.state_dict(), 'stgcn_model.pt')
+    save_serving_bundle(SERVING_BUNDLE_PATH, cache, n_zones, hidden)
+    # ...and register it as a new version that later fine-tunes start from
+    registry = registry or ModelRegistry()
+    version, path = registry.new_version('stgcn')
+    torch.save(model.state_dict(), os.path.join(path, 'stgcn_model.pt'))
+    torch.save(optimizer.state_dict(), os.path.join(path, 'optimizer.pt'))
+    shutil.copy(SERVING_BUNDLE_PATH, os.path.join(path, SERVING_BUNDLE_PATH))
+    metadata = registry.commit('stgcn', version, {
+        'mode': mode, 'parent': parent,
+        'data_start': str(target_times[0]), 'data_end': str(target_times[-1]), 'epochs': epochs,
+        'config': {'n_zones': n_zones, 'k_neighbors': K_NEIGHBORS, 'seq_len': SEQ_LEN,
+                   'horizon': HORIZON, 'hidden': hidden},
+        'metrics': {'val_loss': val_loss}, **extra})
+    print(f"Registered stgcn v{version} at {metadata['path']}")
+    return metadata
 
 if __name__ == '__main__':
-    train()
+    parser = argparse.ArgumentParser(description='Train the spatio-temporal GCN')
+    parser.add_argument('--fine-tune', action='store_true',
+                        help='Warm-start from the latest registered STGCN on data since it was trained')
+    parser.add_argument('--epochs', type=int, default=None,
+                        help=f'Training epochs (default {EPOCHS}, or {FINE_TUNE_EPOCHS} with --fine-tune)')
+    parser.add_argument('--no-checkpoint', action='store_true', help="Don't write per-epoch checkpoints")
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Data-parallel CPU processes (see gnn_distributed.py)')
+    args = parser.parse_args()
+    checkpoint_path = None if args.no_checkpoint else CHECKPOINT_PATH
+    if args.processes > 1:
+        if args.fine_tune:
+            parser.error('--fine-tune runs in a single process')
+        from gnn_distributed import train_distributed
+        train_distributed(args.processes, args.epochs or EPOCHS, checkpoint_path=checkpoint_path)
+    else:
+        train(checkpoint_path=checkpoint_path, fine_tune=args.fine_tune, epochs=args.epochs)
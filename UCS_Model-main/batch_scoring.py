@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+City-wide batch scoring for the Traffic Prediction API
+Scores every traffic segment over the coming time buckets in large
+vectorized batches and bulk-upserts the results into the predictions table,
+so the web app can read stored predictions instead of calling Flask
+
+Usage:
+    python batch_scoring.py --database sqlite:///predictions.db --hours 24
+    DATABASE_URL=postgresql://... python batch_scoring.py --workers 4
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+MODEL_TYPE = 'lstm'
+MODEL_CONFIDENCE = 0.92  # Same confidence the web app assigns to model predictions
+ROAD_CAPACITY = {'highway': 1800, 'arterial': 900, 'local': 400}  # vehicles/hour at 100% occupancy
+
+PREDICTION_COLUMNS = ['segment_id', 'prediction_timestamp', 'predicted_speed_kmh', 'predicted_volume',
+                      'predicted_congestion_level', 'model_type', 'confidence_score']
+
+
+class PredictionStore:
+    """Segments/predictions access over any DB-API connection.
+
+    SQLite (stdlib) and Postgres (psycopg2) both support
+    INSERT ... ON CONFLICT, so the same statements serve either backend.
+    """
+
+    def __init__(self, connection, paramstyle='qmark', schema=None):
+        self.connection = connection
+        self.placeholder = '?' if paramstyle == 'qmark' else '%s'
+        prefix = f"{schema}." if schema else ''
+        self.segments_table = f"{prefix}traffic_segments"
+        self.predictions_table = f"{prefix}predictions"
+
+    @classmethod
+    def connect(cls, url):
+        """Open a store from sqlite:///path or postgresql://... URLs"""
+        if url.startswith('sqlite:///'):
+            return SQLitePredictionStore(sqlite3.connect(url[len('sqlite:///'):]))
+        if url.startswith(('postgres://', 'postgresql://')):
+            try:
+                import psycopg2
+            except ImportError:
+                raise RuntimeError("psycopg2 is required for Postgres: pip install psycopg2-binary")
+            return cls(psycopg2.connect(url), paramstyle='format', schema='public')
+        raise ValueError(f"Unsupported database URL: {url}")
+
+    def load_segments(self):
+        """Return all segments as a DataFrame"""
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT id, latitude, longitude, road_type, speed_limit FROM {self.segments_table}")
+        return pd.DataFrame(cursor.fetchall(), columns=['id', 'latitude', 'longitude', 'road_type', 'speed_limit'])
+
+    def upsert_predictions(self, rows, chunk_size=5000):
+        """Insert or refresh predictions keyed by (segment, model, timestamp)"""
+        values = ', '.join([self.placeholder] * len(PREDICTION_COLUMNS))
+        updates = ', '.join(f"{col} = excluded.{col}" for col in PREDICTION_COLUMNS[2:])
+        sql = (f"INSERT INTO {self.predictions_table} ({', '.join(PREDICTION_COLUMNS)}) VALUES ({values}) "
+               f"ON CONFLICT (segment_id, model_type, prediction_timestamp) DO UPDATE SET {updates}")
+        cursor = self.connection.cursor()
+        for start in range(0, len(rows), chunk_size):
+            cursor.executemany(sql, rows[start:start + chunk_size])
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class SQLitePredictionStore(PredictionStore):
+    """Local stand-in for the Supabase tables (tests and offline runs)"""
+
+    def __init__(self, connection):
+        super().__init__(connection, paramstyle='qmark')
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS traffic_segments (
+              id TEXT PRIMARY KEY,
+              segment_name TEXT NOT NULL DEFAULT '',
+              latitude FLOAT NOT NULL,
+              longitude FLOAT NOT NULL,
+              road_type TEXT NOT NULL DEFAULT 'arterial',
+              length_km FLOAT NOT NULL DEFAULT 1.0,
+              speed_limit INT NOT NULL DEFAULT 50
+            );
+            CREATE TABLE IF NOT EXISTS predictions (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              segment_id TEXT NOT NULL REFERENCES traffic_segments(id) ON DELETE CASCADE,
+              prediction_timestamp TIMESTAMP NOT NULL,
+              predicted_speed_kmh FLOAT NOT NULL,
+              predicted_volume INT NOT NULL,
+              predicted_congestion_level TEXT NOT NULL,
+              model_type TEXT NOT NULL,
+              confidence_score FLOAT NOT NULL,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_segment_model_timestamp
+              ON predictions(segment_id, model_type, prediction_timestamp);
+        """)
+
+
+def congestion_level(occupancy):
+    """Map occupancy % to the congestion levels used in traffic_observations"""
+    return np.select([occupancy > 75, occupancy > 55, occupancy > 35],
+                     ['severe', 'heavy', 'moderate'], 'free')
+
+
+def _init_worker(num_threads):
+    """Load the model once per worker process"""
+    from parallel_training import _limit_threads
+    _limit_threads(num_threads)
+    os.chdir(API_DIR)
+    import traffic_prediction_api as api
+    if not api.load_model_and_scalers():
+        raise RuntimeError('Failed to load model')
+
+
+def _score_chunk(lats, lons, timestamps_ns):
+    """Score one chunk of (lat, lon, timestamp) rows in a single forward pass"""
+    import traffic_prediction_api as api
+    timestamps = pd.DatetimeIndex(np.asarray(timestamps_ns, dtype='datetime64[ns]'))
+    # Stored rows are forecasts for future buckets; a segment's current
+    # observation window only describes the next few minutes
+    return api.predict_traffic_batch(lats, lons, timestamps, use_history=False)['prediction']
+
+
+def score_segments(segments, start, hours=24, step_minutes=60, workers=1, chunk_size=8192):
+    """Score every segment at every bucket in [start, start + hours).
+
+    Returns (segment_index, bucket_times, occupancy) as flat arrays.
+    """
+    buckets = pd.date_range(pd.Timestamp(start).ceil(f'{step_minutes}min'),
+                            periods=hours * 60 // step_minutes, freq=f'{step_minutes}min')
+    segment_index = np.repeat(np.arange(len(segments)), len(buckets))
+    times = np.tile(buckets.as_unit('ns').asi8, len(segments))
+    lats = segments['latitude'].to_numpy(dtype=np.float64)[segment_index]
+    lons = segments['longitude'].to_numpy(dtype=np.float64)[segment_index]
+
+    chunks = [slice(i, i + chunk_size) for i in range(0, len(times), chunk_size)]
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    if workers <= 1:
+        _init_worker(threads)
+        results = [_score_chunk(lats[c], lons[c], times[c]) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_worker, initargs=(threads,)) as executor:
+            results = list(executor.map(_score_chunk, *zip(*[(lats[c], lons[c], times[c]) for c in chunks])))
+
+    occupancy = np.concatenate(results) if results else np.zeros(0)
+    return segment_index, times, occupancy
+
+
+def prediction_rows(segments, segment_index, times, occupancy):
+    """Convert occupancy predictions into predictions-table rows"""
+    speed_limit = segments['speed_limit'].to_numpy(dtype=np.float64)[segment_index]
+    capacity = segments['road_type'].map(ROAD_CAPACITY).fillna(ROAD_CAPACITY['arterial']).to_numpy()[segment_index]
+    # Same speed model as route travel times: free flow down to 25% at full occupancy
+    speed = speed_limit * np.maximum(0.25, 1 - 0.75 * occupancy / 100)
+    volume = np.round(capacity * occupancy / 100).astype(int)
+    levels = congestion_level(occupancy)
+    timestamps = pd.DatetimeIndex(times).strftime('%Y-%m-%dT%H:%M:%S')
+    segment_ids = segments['id'].astype(str).to_numpy()[segment_index]
+    return [
+        (segment_id, ts, round(float(s), 2), int(v), level, MODEL_TYPE, MODEL_CONFIDENCE)
+        for segment_id, ts, s, v, level in zip(segment_ids, timestamps, speed, volume, levels)
+    ]
+
+
+def run_batch(database_url, hours=24, step_minutes=60, workers=1, start=None, chunk_size=8192):
+    """Score all segments and upsert the predictions; returns the row count"""
+    if database_url.startswith('sqlite:///'):
+        # Workers chdir into the API directory; keep relative paths stable
+        database_url = 'sqlite:///' + os.path.abspath(database_url[len('sqlite:///'):])
+    store = PredictionStore.connect(database_url)
+    try:
+        segments = store.load_segments()
+        if segments.empty:
+            print("⚠️  No traffic segments found")
+            return 0
+        start = start or datetime.now()
+        print(f"📊 Scoring {len(segments)} segments x {hours * 60 // step_minutes} buckets "
+              f"with {workers} worker(s)...")
+
+        t0 = time.perf_counter()
+        segment_index, times, occupancy = score_segments(segments, start, hours, step_minutes, workers, chunk_size)
+        t1 = time.perf_counter()
+        rows = prediction_rows(segments, segment_index, times, occupancy)
+        store.upsert_predictions(rows)
+        t2 = time.perf_counter()
+
+        print(f"✅ Scored {len(rows)} predictions in {t1 - t0:.1f}s ({len(rows) / max(t1 - t0, 1e-9):.0f}/s), "
+              f"upserted in {t2 - t1:.1f}s")
+        return len(rows)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute traffic predictions for every segment')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_URL', 'sqlite:///predictions.db'),
+                        help='sqlite:///path or postgresql://... (default: $DATABASE_URL)')
+    parser.add_argument('--hours', type=int, default=24, help='Hours ahead to score')
+    parser.add_argument('--step-minutes', type=int, default=60, help='Time bucket size')
+    parser.add_argument('--workers', type=int, default=1, help='Scoring processes')
+    parser.add_argument('--chunk-size', type=int, default=8192, help='Rows per model batch')
+    args = parser.parse_args()
+
+    run_batch(args.database, args.hours, args.step_minutes, args.workers, chunk_size=args.chunk_size)
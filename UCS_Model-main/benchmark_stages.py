@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Stage benchmarks for the training pipelines
+Runs the model training pipeline (load_training_data -> prepare_windows /
+prepare_data -> train_all_models -> evaluate_all_models) and the GNN preprocessing/training
+stages (cluster -> aggregate -> dataset -> epoch) on the synthetic data
+generator at fixed seeds and sizes. Wall time, throughput and peak RSS of
+every stage are written as JSON and compared against a stored baseline, so
+slowdowns and memory growth show up when preprocessing or model code changes.
+
+Usage:
+    python benchmark_stages.py                      # compare with the baseline
+    python benchmark_stages.py --suite gnn --repeats 3
+    python benchmark_stages.py --update-baseline    # after an intended change
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# PyG has to be imported before TensorFlow (see traffic_prediction_api.py)
+import GNN_PyG_spatio_temporal as gnn
+import torch
+import torch.nn as nn
+import tensorflow as tf
+from data_generator import TrafficDataGenerator
+from feature_pipeline import observations_to_frame
+from model_training import load_training_data
+from ml_models import TrafficPredictionPipeline
+from memory_trace import current_rss_mb, peak_rss_mb, reset_peak_rss
+
+BASELINE_PATH = os.path.join(API_DIR, 'benchmark_baseline.json')
+RESULTS_PATH = os.path.join(API_DIR, 'models', 'benchmark_results.json')
+
+# Fixed workloads; 'small' is the one the stored baseline is recorded for
+SIZES = {
+    'small': {'segments': 10, 'days': 14, 'epochs': 1,
+              'gnn_segments': 100, 'gnn_days': 30, 'gnn_zones': 30},
+    'medium': {'segments': 50, 'days': 30, 'epochs': 2,
+               'gnn_segments': 300, 'gnn_days': 60, 'gnn_zones': 100},
+}
+SUITES = ('training', 'gnn')
+
+# A stage regresses when it is this much slower / grows memory this much more
+# than in the baseline, and by more than the absolute slack that absorbs noise
+# on tiny stages. Memory is compared as the stage's own peak above the RSS it
+# started with; the absolute peak also depends on what earlier stages left behind
+TOLERANCES = {'wall_seconds': 0.25, 'rss_growth_mb': 0.25}
+MIN_DIFFERENCE = {'wall_seconds': 0.05, 'rss_growth_mb': 16.0}
+
+
+class StageRecorder:
+    """Wall time, throughput and peak RSS of named stages"""
+
+    def __init__(self):
+        self.stages = {}
+        self.per_stage_peak = reset_peak_rss()
+
+    @contextmanager
+    def stage(self, name, unit):
+        """Time the block; set record['items'] inside it for a throughput"""
+        record = {'unit': unit, 'items': None}
+        reset_peak_rss()
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        yield record
+        seconds = time.perf_counter() - start
+        peak = peak_rss_mb()
+        self.stages.setdefault(name, []).append({
+            'unit': unit,
+            'wall_seconds': seconds,
+            'items': record['items'],
+            'peak_rss_mb': peak,
+            'rss_growth_mb': peak - rss_before,
+        })
+        print(f"   {name:24s} {seconds:8.2f}s  peak RSS {peak:8.1f} MB")
+
+    def summary(self):
+        """Median time and memory growth over the repeats of each stage"""
+        out = {}
+        for name, runs in self.stages.items():
+            seconds = float(np.median([run['wall_seconds'] for run in runs]))
+            items = runs[0]['items']
+            out[name] = {
+                'wall_seconds': seconds,
+                'throughput': items / seconds if items and seconds > 0 else None,
+                'unit': f"{runs[0]['unit']}/s",
+                'items': items,
+                'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+                'rss_growth_mb': float(np.median([run['rss_growth_mb'] for run in runs])),
+                'repeats': len(runs),
+            }
+        return out
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    tf.random.set_seed(seed)
+
+
+def run_training_suite(recorder, size, seed=0):
+    """load_training_data -> prepare_windows/prepare_data -> train_all_models -> evaluate_all_models"""
+    seed_everything(seed)
+    with recorder.stage('load_training_data', 'observations') as record:
+        data, coordinates, hours, timestamps = load_training_data(size['segments'], size['days'])
+        record['items'] = int(data.shape[0] * data.shape[1])
+
+    pipeline = TrafficPredictionPipeline(seq_length=24, num_features=data.shape[2],
+                                         segment_coordinates=coordinates)
+    # Training streams zero-copy windows (as train_and_evaluate does);
+    # prepare_data measures materializing them as arrays
+    with recorder.stage('prepare_windows', 'windows') as record:
+        train_windows, test_windows = pipeline.prepare_windows(data, train_ratio=0.8)
+        record['items'] = len(train_windows) + len(test_windows)
+
+    with recorder.stage('prepare_data', 'windows') as record:
+        (X_train, _), (X_test, _) = pipeline.prepare_data(data, train_ratio=0.8)
+        record['items'] = len(X_train) + len(X_test)
+    del X_train, X_test
+
+    with recorder.stage('train_all_models', 'samples') as record:
+        pipeline.train_all_models(train_windows, epochs=size['epochs'])
+        record['items'] = len(pipeline.models) * size['epochs'] * len(train_windows)
+
+    with recorder.stage('evaluate_all_models', 'samples') as record:
+        pipeline.evaluate_all_models(test_windows, hours=hours)
+        record['items'] = len(pipeline.models) * len(test_windows)
+
+
+def synthetic_zone_csv(path, segments, days):
+    """Generator observations in the smart_mobility_dataset.csv layout"""
+    generator = TrafficDataGenerator(num_segments=segments, days=days)
+    df = observations_to_frame(generator.generate_traffic_observations())
+    coordinates = {seg['id']: (seg['latitude'], seg['longitude']) for seg in generator.segments}
+    df['Latitude'] = df['segment_id'].map(lambda seg_id: coordinates[seg_id][0])
+    df['Longitude'] = df['segment_id'].map(lambda seg_id: coordinates[seg_id][1])
+    df = df.rename(columns={'timestamp': 'Timestamp'}).drop(columns=['segment_id', 'congestion_level'])
+    df.to_csv(path, index=False)
+    return len(df)
+
+
+def run_gnn_suite(recorder, size, seed=0):
+    """cluster -> aggregate -> dataset -> epoch of GNN_PyG_spatio_temporal.py"""
+    seed_everything(seed)
+    n_zones = size['gnn_zones']
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'synthetic_mobility.csv')
+        rows = synthetic_zone_csv(csv_path, size['gnn_segments'], size['gnn_days'])
+
+        with recorder.stage('gnn_cluster', 'rows') as record:
+            df, centroids = gnn.load_and_cluster(csv_path, n_zones=n_zones)
+            record['items'] = rows
+
+    with recorder.stage('gnn_aggregate', 'rows') as record:
+        tensor, _, _ = gnn.aggregate_per_zone(df, n_zones)
+        record['items'] = rows
+
+    with recorder.stage('gnn_dataset', 'windows') as record:
+        edge_index = gnn.build_knn_edge_index(centroids, k=gnn.K_NEIGHBORS)
+        x, y = gnn.make_graph_windows(tensor, gnn.SEQ_LEN, gnn.HORIZON)
+        dataset = gnn.SpatioTemporalDataset(x, y, edge_index)
+        record['items'] = len(dataset)
+
+    train_loader, _, _ = gnn.make_loaders(dataset)
+    model = gnn.STGCN(in_dim=x.shape[2]).to(gnn.DEVICE)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    with recorder.stage('gnn_epoch', 'windows') as record:
+        gnn.train_epoch(model, train_loader, optimizer, nn.MSELoss(), n_zones)
+        record['items'] = len(train_loader.dataset)
+
+
+def run_benchmarks(size_name='small', suites=SUITES, repeats=1, seed=0):
+    """Benchmark report for the selected suites"""
+    size = SIZES[size_name]
+    recorder = StageRecorder()
+    for repeat in range(repeats):
+        for suite in suites:
+            print(f"⏱️  {suite} suite ({size_name}), run {repeat + 1}/{repeats}")
+            {'training': run_training_suite, 'gnn': run_gnn_suite}[suite](recorder, size, seed)
+    return {
+        'created': datetime.now().isoformat(),
+        'size': size_name,
+        'workload': size,
+        'seed': seed,
+        'suites': list(suites),
+        'environment': {'python': platform.python_version(), 'machine': platform.machine(),
+                        'cpu_count': os.cpu_count(), 'per_stage_peak_rss': recorder.per_stage_peak},
+        'stages': recorder.summary(),
+    }
+
+
+def compare(report, baseline, tolerances=TOLERANCES):
+    """Per-stage comparison rows; a row regresses when a metric exceeds its tolerance"""
+    if baseline.get('size') != report['size']:
+        raise ValueError(f"Baseline was recorded for size '{baseline.get('size')}', not '{report['size']}'")
+    rows = []
+    for name, stage in report['stages'].items():
+        reference = baseline['stages'].get(name)
+        row = {'stage': name, 'regressions': []}
+        for metric, tolerance in tolerances.items():
+            if reference is None:
+                continue
+            ratio = stage[metric] / reference[metric] if reference[metric] else float('inf')
+            row[metric] = {'value': stage[metric], 'baseline': reference[metric], 'ratio': ratio}
+            if ratio > 1 + tolerance and stage[metric] - reference[metric] > MIN_DIFFERENCE[metric]:
+                row['regressions'].append(metric)
+        row['status'] = 'new' if reference is None else ('regressed' if row['regressions'] else 'ok')
+        rows.append(row)
+    return rows
+
+
+def print_comparison(rows):
+    print(f"\n{'stage':24s} {'time (s)':>9s} {'baseline':>9s} {'ratio':>6s} "
+          f"{'growth MB':>9s} {'baseline':>9s} {'ratio':>6s}  status")
+    for row in rows:
+        if row['status'] == 'new':
+            print(f"{row['stage']:24s} {'(not in baseline)':>55s}  new")
+            continue
+        wall, rss = row['wall_seconds'], row['rss_growth_mb']
+        print(f"{row['stage']:24s} {wall['value']:9.2f} {wall['baseline']:9.2f} {wall['ratio']:6.2f} "
+              f"{rss['value']:9.1f} {rss['baseline']:9.1f} {rss['ratio']:6.2f}  "
+              f"{'❌ ' + ', '.join(row['regressions']) if row['regressions'] else '✅'}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages against a stored baseline')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--suite', choices=SUITES + ('all',), default='all')
+    parser.add_argument('--repeats', type=int, default=1, help='Runs per stage; the median time is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--time-tolerance', type=float, default=TOLERANCES['wall_seconds'],
+                        help='Allowed relative slowdown per stage')
+    parser.add_argument('--rss-tolerance', type=float, default=TOLERANCES['rss_growth_mb'],
+                        help='Allowed relative increase of each stage\'s peak RSS growth')
+    parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline')
+    args = parser.parse_args()
+
+    os.chdir(API_DIR)
+    suites = SUITES if args.suite == 'all' else (args.suite,)
+    report = run_benchmarks(args.size, suites, args.repeats, args.seed)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    regressed = False
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, {'wall_seconds': args.time_tolerance, 'rss_growth_mb': args.rss_tolerance})
+        print_comparison(rows)
+        report['comparison'] = {'baseline': args.baseline, 'rows': rows}
+        regressed = any(row['status'] == 'regressed' for row in rows)
+    else:
+        print(f"⚠️  No baseline at {args.baseline}; run with --update-baseline to record one")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 Results saved to {args.output}")
+    sys.exit(1 if regressed else 0)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Cluster-partitioned mini-batching for the spatio-temporal GCN
+Splits the zone kNN graph into spatially compact clusters and trains on one
+cluster at a time, together with the halo nodes its GCN outputs depend on.
+Node features are sliced straight from the memory-mapped (T, Z, F) zone
+tensor, so no (N, Z, SEQ_LEN*F) window array is ever built and peak memory is
+set by the cluster size rather than by the number of zones. Inference runs
+every cluster and stitches the core-node outputs back into one city-wide
+vector.
+
+Usage:
+    python gnn_clusters.py --cluster-size 1000
+    python gnn_clusters.py --partitions 16 --epochs 5
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+import torch.nn as nn
+from sklearn.cluster import KMeans
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+import GNN_PyG_spatio_temporal as gnn
+from memory_trace import trace_stage
+
+CLUSTER_SIZE = 1000  # target core zones per partition
+
+
+def partition_zones(centroids, num_parts, seed=42):
+    """Partition id (0..num_parts-1) of every zone
+
+    A kNN graph over zone centroids only links nearby zones, so spatial
+    k-means on the centroids gives compact clusters that cut few edges
+    """
+    centroids = np.asarray(centroids)
+    if num_parts <= 1:
+        return np.zeros(len(centroids), dtype=np.int64)
+    return KMeans(n_clusters=num_parts, random_state=seed).fit(centroids).labels_.astype(np.int64)
+
+
+class ClusterPartition:
+    """One cluster's subgraph: its core zones first, then its halo
+
+    For a model with `layers` GCN layers the halo holds every source within
+    `layers` hops of the core plus their own sources, and the subgraph keeps
+    every edge into the nodes within `layers` hops. That makes the GCN's
+    degree normalization, and therefore the core outputs, identical to a
+    forward pass over the whole graph (the STGCN's single layer needs a
+    2-hop halo)
+    """
+
+    def __init__(self, core, edge_index, num_nodes, layers=1):
+        core = np.sort(np.asarray(core, dtype=np.int64))
+        src, dst = np.asarray(edge_index)
+        inner = np.zeros(num_nodes, dtype=bool)
+        inner[core] = True
+        for _ in range(layers):
+            inner[src[inner[dst]]] = True  # + one more hop of halo
+        keep = inner[dst]
+        members = inner.copy()
+        members[src[keep]] = True  # + the sources their degrees count
+        halo = np.setdiff1d(np.flatnonzero(members), core)
+
+        self.nodes = np.concatenate([core, halo])
+        self.n_core = len(core)
+        local = np.full(num_nodes, -1, dtype=np.int64)
+        local[self.nodes] = np.arange(len(self.nodes))
+        self.edge_index = torch.tensor(local[np.asarray(edge_index)[:, keep]], dtype=torch.long)
+
+    @property
+    def core(self):
+        return self.nodes[:self.n_core]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def batched_edge_index(self, batch_size):
+        """Edge index of `batch_size` copies of the subgraph, offset per sample like PyG's Batch"""
+        offsets = torch.arange(batch_size).repeat_interleave(self.edge_index.shape[1]) * len(self.nodes)
+        return self.edge_index.repeat(1, batch_size) + offsets
+
+
+def build_partitions(centroids, edge_index, num_parts, seed=42, layers=1):
+    """ClusterPartitions covering every zone exactly once as core"""
+    parts = partition_zones(centroids, num_parts, seed)
+    return [ClusterPartition(np.flatnonzero(parts == p), edge_index, len(parts), layers)
+            for p in np.unique(parts)]
+
+
+def cluster_batch(tensor, partition, starts, seq_len=gnn.SEQ_LEN, horizon=gnn.HORIZON, target_col=0):
+    """Model inputs and core targets for windows beginning at `starts`
+
+    x: (B, len(partition), seq_len*F) laid out like make_graph_windows;
+    y: (B, n_core) target column `horizon` steps after each window
+    """
+    starts = np.asarray(starts)
+    times = starts[:, None] + np.arange(seq_len)
+    # Index time and nodes together so only the subgraph's rows are read
+    x = np.asarray(tensor[times[:, :, None], partition.nodes[None, None, :]], dtype=np.float32)
+    x = x.transpose(0, 2, 1, 3).reshape(len(starts), len(partition), -1)
+    y = np.asarray(tensor[starts[:, None] + seq_len + horizon - 1, partition.core[None, :], target_col],
+                   dtype=np.float32)
+    data = SimpleNamespace(x=torch.from_numpy(x).to(gnn.DEVICE),
+                           edge_index=partition.batched_edge_index(len(starts)).to(gnn.DEVICE))
+    return data, torch.from_numpy(y).to(gnn.DEVICE)
+
+
+def window_splits(n_timesteps, seq_len=gnn.SEQ_LEN, horizon=gnn.HORIZON):
+    """Window start indices split chronologically 70/15/15, as in make_loaders"""
+    n = n_timesteps - seq_len - horizon + 1
+    starts = np.arange(max(n, 0))
+    return starts[:int(n*0.7)], starts[int(n*0.7):int(n*0.85)], starts[int(n*0.85):]
+
+
+def train_epoch(model, tensor, partitions, starts, optimizer, loss_fn, batch_size=gnn.BATCH_SIZE, rng=None):
+    """One pass over every (cluster, time batch) pair in random order"""
+    rng = rng or np.random.default_rng()
+    starts = rng.permutation(starts)
+    steps = [(p, starts[i:i + batch_size]) for p in range(len(partitions))
+             for i in range(0, len(starts), batch_size)]
+    model.train()
+    tot_loss = 0.0
+    for step in rng.permutation(len(steps)):
+        p, batch_starts = steps[step]
+        data_for_model, y_true = cluster_batch(tensor, partitions[p], batch_starts)
+        optimizer.zero_grad()
+        # Loss on core nodes only; halo outputs lack part of their neighbourhood
+        y_pred = model(data_for_model)[:, :partitions[p].n_core]
+        loss = loss_fn(y_pred, y_true)
+        loss.backward()
+        optimizer.step()
+        tot_loss += loss.item()
+    return tot_loss / max(len(steps), 1)
+
+
+@torch.no_grad()
+def predict_stitched(model, tensor, partitions, starts, batch_size=gnn.BATCH_SIZE):
+    """(len(starts), Z) predictions, one cluster forward pass at a time"""
+    model.eval()
+    starts = np.asarray(starts)
+    out = np.zeros((len(starts), tensor.shape[1]), dtype=np.float32)
+    for partition in partitions:
+        for i in range(0, len(starts), batch_size):
+            data_for_model, _ = cluster_batch(tensor, partition, starts[i:i + batch_size])
+            out[i:i + batch_size, partition.core] = model(data_for_model)[:, :partition.n_core].cpu().numpy()
+    return out
+
+
+def evaluate(model, tensor, partitions, starts, batch_size=gnn.BATCH_SIZE, target_col=0):
+    """MSE of the stitched predictions over every zone"""
+    if len(starts) == 0:
+        return float('nan')
+    pred = predict_stitched(model, tensor, partitions, starts, batch_size)
+    y = np.asarray(tensor[np.asarray(starts) + gnn.SEQ_LEN + gnn.HORIZON - 1, :, target_col])
+    return float(np.mean((pred - y) ** 2))
+
+
+def train_clustered(cache=None, n_zones=gnn.N_ZONES, cluster_size=CLUSTER_SIZE, num_parts=None, hidden=64,
+                    lr=1e-3, epochs=gnn.EPOCHS, batch_size=gnn.BATCH_SIZE, checkpoint_path=gnn.CHECKPOINT_PATH,
+                    save=True, registry=None, seed=0):
+    """Train the STGCN on cluster subgraphs; returns (model, val_loss, metadata)"""
+    zones, zone_tensor, edges = gnn.prepare_graph(cache, n_zones)
+    tensor = zone_tensor['tensor']  # memory-mapped when loaded from the stage cache
+    num_parts = num_parts or max(1, math.ceil(n_zones / cluster_size))
+    with trace_stage('clusters.build_partitions'):
+        partitions = build_partitions(zones['centroids'], edges['edge_index'], num_parts)
+    sizes = [len(p) for p in partitions]
+    print(f"🧩 {len(partitions)} partition(s) of {n_zones} zones, "
+          f"largest subgraph {max(sizes)} nodes ({max(p.n_core for p in partitions)} core)")
+
+    train_starts, val_starts, _ = window_splits(len(tensor))
+    model = gnn.STGCN(in_dim=gnn.SEQ_LEN * tensor.shape[2], hidden=hidden).to(gnn.DEVICE)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    config = {'n_zones': n_zones, 'hidden': hidden, 'lr': lr, 'epochs': epochs,
+              'samples': len(train_starts), 'partitions': len(partitions), 'batch_size': batch_size}
+    start_epoch = gnn.load_checkpoint(checkpoint_path, model, optimizer, config)
+    loss_fn = nn.MSELoss()
+    rng = np.random.default_rng(seed)
+    for epoch in range(start_epoch, epochs):
+        start = time.perf_counter()
+        with trace_stage('clusters.train_epoch'):
+            train_loss = train_epoch(model, tensor, partitions, train_starts, optimizer, loss_fn, batch_size, rng)
+        print(f"Epoch {epoch+1}/{epochs} train_loss={train_loss:.4f} ({time.perf_counter() - start:.2f}s)")
+        if checkpoint_path:
+            gnn.save_checkpoint(checkpoint_path, epoch + 1, model, optimizer, config)
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    val_loss = evaluate(model, tensor, partitions, val_starts, batch_size)
+    print(f"✅ Training complete. val_loss={val_loss:.4f}")
+    metadata = None
+    if save:
+        target_times = np.asarray(zone_tensor['timestamps'])[gnn.SEQ_LEN + gnn.HORIZON - 1:][:len(train_starts)]
+        metadata = gnn.save_trained(model, optimizer, target_times, epochs, val_loss, registry, hidden=hidden,
+                                    n_zones=n_zones, cache=cache, partitions=len(partitions))
+    return model, val_loss, metadata
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the STGCN on cluster-partitioned subgraphs')
+    parser.add_argument('--zones', type=int, default=gnn.N_ZONES, help='Number of zones to cluster the CSV into')
+    parser.add_argument('--cluster-size', type=int, default=CLUSTER_SIZE, help='Target core zones per partition')
+    parser.add_argument('--partitions', type=int, default=None, help='Number of partitions (overrides --cluster-size)')
+    parser.add_argument('--epochs', type=int, default=gnn.EPOCHS)
+    parser.add_argument('--batch-size', type=int, default=gnn.BATCH_SIZE)
+    parser.add_argument('--no-checkpoint', action='store_true', help="Don't write per-epoch checkpoints")
+    args = parser.parse_args()
+
+    os.chdir(API_DIR)
+    train_clustered(n_zones=args.zones, cluster_size=args.cluster_size, num_parts=args.partitions,
+                    epochs=args.epochs, batch_size=args.batch_size,
+                    checkpoint_path=None if args.no_checkpoint else gnn.CHECKPOINT_PATH)
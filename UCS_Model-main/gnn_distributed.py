@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Multi-process data-parallel training for the spatio-temporal GCN
+Runs N local worker processes with torch DistributedDataParallel on the
+CPU-friendly gloo backend. Each process trains on its own shard of the
+training windows, gradients are averaged across processes after every
+backward pass, and rank 0 logs, checkpoints, evaluates and saves the model.
+
+Usage:
+    python gnn_distributed.py --processes 8
+    python gnn_distributed.py --benchmark 1 2 4 8 --epochs 3
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+import GNN_PyG_spatio_temporal as gnn
+from parallel_training import _limit_threads
+from stage_cache import StageCache
+
+SCALING_REPORT_PATH = os.path.join(API_DIR, 'models', 'ddp_scaling.json')
+
+
+def _free_port():
+    """An unused localhost port for the process group rendezvous"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, epochs, hidden, lr, batch_size, threads, checkpoint_path, save, results):
+    """One data-parallel rank; rank 0 reports its timings through `results`"""
+    _limit_threads(threads, 'torch')
+    os.chdir(API_DIR)
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+    try:
+        # The cached windows are memory-mapped (the parent built them); each rank
+        # only materializes every world_size-th training window, truncated so
+        # all ranks run the same number of steps
+        x, y, edge_index, target_times = gnn.training_windows(StageCache(verbose=False))
+        n = len(x)
+        train_n = int(n*0.7)
+        val_n = int(n*0.85)
+        shard = np.arange(rank, train_n, world_size)[:train_n // world_size]
+        train_set = gnn.SpatioTemporalDataset(x[shard], y[shard], edge_index)
+        loader = gnn.DataLoader(train_set, batch_size=batch_size, shuffle=True)
+
+        model = gnn.STGCN(in_dim=x.shape[2], hidden=hidden)
+        optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+        config = {'n_zones': gnn.N_ZONES, 'hidden': hidden, 'lr': lr, 'epochs': epochs,
+                  'samples': n, 'processes': world_size, 'batch_size': batch_size}
+        # Every rank restores its optimizer state from rank 0's checkpoint; load
+        # before wrapping, as DDP broadcasts rank 0's parameters on construction
+        start_epoch = gnn.load_checkpoint(checkpoint_path, model, optimizer, config)
+        # STGCN.gru is declared but unused; static_graph lets DDP skip its
+        # gradients without a per-step unused-parameter search
+        ddp_model = DistributedDataParallel(model, static_graph=True)
+        loss_fn = nn.MSELoss()
+
+        epoch_seconds = []
+        for epoch in range(start_epoch, epochs):
+            start = time.perf_counter()
+            train_loss = gnn.train_epoch(ddp_model, loader, optimizer, loss_fn, gnn.N_ZONES)
+            epoch_seconds.append(time.perf_counter() - start)
+            mean_loss = torch.tensor([train_loss])
+            dist.all_reduce(mean_loss)
+            if rank == 0:
+                print(f"Epoch {epoch+1}/{epochs} train_loss={mean_loss.item() / world_size:.4f} "
+                      f"({epoch_seconds[-1]:.2f}s, {world_size} process(es))")
+                if checkpoint_path:
+                    gnn.save_checkpoint(checkpoint_path, epoch + 1, model, optimizer, config)
+
+        if rank == 0:
+            val_set = gnn.SpatioTemporalDataset(x[train_n:val_n], y[train_n:val_n], edge_index)
+            val_loader = gnn.DataLoader(val_set, batch_size=batch_size)
+            val_loss = gnn.evaluate(model, val_loader, loss_fn, gnn.N_ZONES)
+            if checkpoint_path and os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            metadata = None
+            if save:
+                metadata = gnn.save_trained(model, optimizer, target_times, epochs, val_loss, hidden=hidden,
+                                            processes=world_size)
+            results.put({'epoch_seconds': epoch_seconds, 'val_loss': val_loss,
+                         'samples_per_process': len(train_set), 'version': metadata and metadata['version']})
+    finally:
+        dist.destroy_process_group()
+
+
+def train_distributed(processes=2, epochs=gnn.EPOCHS, hidden=64, lr=1e-3, batch_size=gnn.BATCH_SIZE,
+                      checkpoint_path=gnn.CHECKPOINT_PATH, save=True, threads_per_process=None):
+    """Train the STGCN on `processes` local ranks; returns rank 0's summary.
+
+    `batch_size` is per process, so the global batch grows with `processes`.
+    """
+    os.chdir(API_DIR)
+    gnn.prepare_stages()  # build/cache the windows once, before the ranks start
+    if threads_per_process is None:
+        threads_per_process = max(1, (os.cpu_count() or 1) // processes)
+    ctx = mp.get_context('spawn')
+    results = ctx.SimpleQueue()
+    mp.spawn(_worker, nprocs=processes, join=True,
+             args=(processes, _free_port(), epochs, hidden, lr, batch_size, threads_per_process,
+                   checkpoint_path, save, results))
+    return results.get()
+
+
+def benchmark_scaling(process_counts=(1, 2, 4, 8), epochs=3, batch_size=gnn.BATCH_SIZE):
+    """Steady-state epoch time at each process count"""
+    rows = []
+    for processes in process_counts:
+        print(f"⏱️  {processes} process(es)...")
+        try:
+            summary = train_distributed(processes, epochs, batch_size=batch_size, checkpoint_path=None, save=False)
+        except Exception as e:
+            # e.g. a rank killed for running out of memory
+            print(f"❌ {processes} process(es) failed: {e}")
+            rows.append({'processes': processes, 'epoch_seconds': None, 'error': str(e)})
+            continue
+        # The first epoch includes worker start-up costs
+        steady = summary['epoch_seconds'][1:] or summary['epoch_seconds']
+        rows.append({'processes': processes, 'epoch_seconds': float(np.mean(steady)),
+                     'val_loss': summary['val_loss']})
+
+    completed = [row for row in rows if row['epoch_seconds'] is not None]
+    baseline = completed[0]['epoch_seconds'] * completed[0]['processes'] if completed else None
+    for row in completed:
+        row['speedup'] = baseline / row['epoch_seconds']
+        row['efficiency'] = row['speedup'] / row['processes']
+    report = {
+        'created': datetime.now().isoformat(),
+        'cpu_count': os.cpu_count(),
+        'epochs': epochs,
+        'batch_size_per_process': batch_size,
+        'results': rows,
+    }
+    os.makedirs(os.path.dirname(SCALING_REPORT_PATH), exist_ok=True)
+    with open(SCALING_REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'processes':>9s} {'epoch (s)':>10s} {'speedup':>8s} {'efficiency':>10s}")
+    for row in rows:
+        if row['epoch_seconds'] is None:
+            print(f"{row['processes']:9d} {'failed':>10s}")
+            continue
+        print(f"{row['processes']:9d} {row['epoch_seconds']:10.2f} {row['speedup']:7.2f}x {row['efficiency']:9.0%}")
+    print(f"✅ Scaling report saved to {SCALING_REPORT_PATH}")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Data-parallel STGCN training on CPU (gloo)')
+    parser.add_argument('--processes', type=int, default=2, help='Local training processes')
+    parser.add_argument('--epochs', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=gnn.BATCH_SIZE, help='Per-process batch size')
+    parser.add_argument('--no-checkpoint', action='store_true', help="Don't write per-epoch checkpoints")
+    parser.add_argument('--benchmark', type=int, nargs='+', metavar='N',
+                        help='Report epoch time at these process counts instead of training')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_scaling(args.benchmark, args.epochs or 3, args.batch_size)
+    else:
+        summary = train_distributed(args.processes, args.epochs or gnn.EPOCHS, batch_size=args.batch_size,
+                                    checkpoint_path=None if args.no_checkpoint else gnn.CHECKPOINT_PATH)
+        print(f"✅ val_loss={summary['val_loss']:.4f}, "
+              f"mean epoch {np.mean(summary['epoch_seconds']):.2f}s on {args.processes} process(es)")
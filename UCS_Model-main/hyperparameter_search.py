@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Parallel hyperparameter search for the traffic models
+Samples configurations from a search space, trains them in parallel worker
+processes and prunes weak trials early with successive halving: every rung
+trains the surviving trials for more epochs (continuing from their weights
+and optimizer state) and keeps the best 1/eta. Every trial/rung result is
+recorded in a local SQLite store.
+
+Usage:
+    python hyperparameter_search.py --model lstm --trials 9 --workers 3
+    python hyperparameter_search.py --model stgcn --trials 27 --min-epochs 1 --eta 3
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from parallel_training import _attach_array, _limit_threads, _share_array
+from stage_cache import StageCache, source_fingerprint
+
+DEFAULT_STORE_PATH = os.path.join(API_DIR, 'models', 'search_trials.db')
+
+KERAS_MODELS = ['lstm', 'cnn_gru', 'gnn']
+SEARCH_SPACES = {
+    'lstm': {'units': [(32, 16), (64, 32), (128, 64)], 'learning_rate': [3e-4, 1e-3, 3e-3]},
+    'cnn_gru': {'units': [(32, 16), (64, 32), (128, 64)], 'learning_rate': [3e-4, 1e-3, 3e-3]},
+    'gnn': {'hidden_dim': [16, 32, 64], 'k_neighbors': [2, 4, 8], 'learning_rate': [3e-4, 1e-3, 3e-3]},
+    'stgcn': {'hidden': [32, 64, 128], 'n_zones': [20, 30, 40], 'k_neighbors': [2, 4, 8],
+              'lr': [3e-4, 1e-3, 3e-3]},
+}
+
+
+class TrialStore:
+    """SQLite record of every trial at every rung"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS trials (
+              study TEXT NOT NULL,
+              trial INTEGER NOT NULL,
+              rung INTEGER NOT NULL,
+              model TEXT NOT NULL,
+              params TEXT NOT NULL,
+              epochs INTEGER NOT NULL,
+              val_loss FLOAT,
+              wall_seconds FLOAT NOT NULL,
+              metrics TEXT NOT NULL,
+              status TEXT NOT NULL,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              PRIMARY KEY (study, trial, rung)
+            );
+        """)
+
+    def record(self, study, trial, rung, model, params, epochs, result, status='running'):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO trials (study, trial, rung, model, params, epochs, val_loss, "
+            "wall_seconds, metrics, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (study, trial, rung, model, json.dumps(params), epochs, result.get('val_loss'),
+             result['wall_seconds'], json.dumps(result.get('metrics', {})), status))
+        self.connection.commit()
+
+    def set_status(self, study, rung, trials, status):
+        self.connection.executemany("UPDATE trials SET status = ? WHERE study = ? AND rung = ? AND trial = ?",
+                                    [(status, study, rung, trial) for trial in trials])
+        self.connection.commit()
+
+    def leaderboard(self, study):
+        """Each trial's furthest rung, best first"""
+        cursor = self.connection.execute("""
+            SELECT trial, rung, params, epochs, val_loss, status,
+                   (SELECT SUM(wall_seconds) FROM trials t2 WHERE t2.study = t.study AND t2.trial = t.trial)
+            FROM trials t
+            WHERE study = ? AND rung = (SELECT MAX(rung) FROM trials t3 WHERE t3.study = t.study AND t3.trial = t.trial)
+            ORDER BY rung DESC, val_loss IS NULL, val_loss
+        """, (study,))
+        columns = ['trial', 'rung', 'params', 'epochs', 'val_loss', 'status', 'wall_seconds']
+        return [{**dict(zip(columns, row)), 'params': json.loads(row[2])} for row in cursor.fetchall()]
+
+    def close(self):
+        self.connection.close()
+
+
+def sample_configs(space, n_trials, seed=0):
+    """Up to n_trials distinct configurations drawn from the grid"""
+    names = list(space)
+    grid = list(itertools.product(*(space[name] for name in names)))
+    order = np.random.default_rng(seed).permutation(len(grid))[:n_trials]
+    return [dict(zip(names, grid[i])) for i in order]
+
+
+def rung_budgets(min_epochs, eta, n_trials, max_epochs=None):
+    """Cumulative epochs per rung until one trial would survive"""
+    budgets = [min_epochs]
+    while n_trials >= eta:
+        n_trials //= eta
+        budgets.append(budgets[-1] * eta)
+    if max_epochs:
+        budgets = sorted({min(b, max_epochs) for b in budgets})
+    return budgets
+
+
+def _init_worker(num_threads, framework):
+    _limit_threads(num_threads, framework)
+    # The GNN trainer reads its CSV relative to the API directory
+    os.chdir(API_DIR)
+
+
+def _keras_trial(name, data_spec, index_spec, seq_length, horizon, target_col, coordinates,
+                 performance, params, epochs, state):
+    """Train one Keras configuration for `epochs` more epochs"""
+    from parallel_training import build_model
+    from windowing import SequenceWindows
+
+    start = time.perf_counter()
+    data_shm, data = _attach_array(data_spec)
+    index_shm, indices = _attach_array(index_spec)
+    try:
+        windows = SequenceWindows(data, seq_length, horizon, target_col, indices=indices)
+        model = build_model(name, seq_length, windows.num_features, num_nodes=windows.num_segments,
+                            coordinates=coordinates, performance=performance, **params)
+        if state is not None:
+            model.model.set_weights(state['weights'])
+            model.model.optimizer.build(model.model.trainable_variables)
+            for variable, value in zip(model.model.optimizer.variables, state['optimizer']):
+                variable.assign(value)
+        history = model.train(windows, epochs=epochs)
+        result = {
+            'val_loss': float(history['val_loss'][-1]),
+            'metrics': {'val_mae': float(history['val_mae'][-1]),
+                        'train_loss': float(history['loss'][-1]),
+                        'samples_per_sec': model.throughput.summary().get('samples_per_sec')},
+            'state': {'weights': model.model.get_weights(),
+                      'optimizer': [v.numpy() for v in model.model.optimizer.variables]},
+        }
+    finally:
+        # Views into the shared buffers must be gone before closing them
+        windows = data = indices = None
+        data_shm.close()
+        index_shm.close()
+    result['wall_seconds'] = time.perf_counter() - start
+    return result
+
+
+_stgcn_datasets = {}
+
+
+def _stgcn_trial(cache_root, params, epochs, state):
+    """Train one STGCN configuration for `epochs` more epochs"""
+    import GNN_PyG_spatio_temporal as gnn
+
+    start = time.perf_counter()
+    # Zones/graph/windows come from the shared stage cache; the dataset is
+    # kept per worker so later rungs of the same graph don't rebuild it
+    graph = (params['n_zones'], params['k_neighbors'])
+    if graph not in _stgcn_datasets:
+        _stgcn_datasets[graph] = gnn.build_dataset(StageCache(cache_root, verbose=False), *graph)
+    model, optimizer, val_loss = gnn.fit(_stgcn_datasets[graph], params['n_zones'], hidden=params['hidden'],
+                                         lr=params['lr'], epochs=epochs, state=state, verbose=False)
+    return {
+        'val_loss': float(val_loss),
+        'metrics': {'val_rmse': float(math.sqrt(val_loss))},
+        'state': {'model': model.state_dict(), 'optimizer': optimizer.state_dict()},
+        'wall_seconds': time.perf_counter() - start,
+    }
+
+
+def successive_halving(model_name, configs, submit_trial, executor, store, study, budgets, eta=3):
+    """Run the rungs; returns the surviving trial dicts"""
+    trials = [{'trial': i, 'params': params, 'state': None, 'epochs': 0} for i, params in enumerate(configs)]
+    for rung, budget in enumerate(budgets):
+        print(f"🪜 Rung {rung}: {len(trials)} trial(s) at {budget} epoch(s)")
+        futures = {submit_trial(executor, t['params'], budget - t['epochs'], t['state']): t for t in trials}
+        for future in as_completed(futures):
+            trial = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'val_loss': None, 'wall_seconds': 0.0, 'metrics': {'error': str(e)}}
+                print(f"❌ Trial {trial['trial']} failed: {e}")
+            trial.update(epochs=budget, state=result.pop('state', None), val_loss=result['val_loss'])
+            store.record(study, trial['trial'], rung, model_name, trial['params'], budget, result,
+                         status='failed' if result['val_loss'] is None else 'running')
+            if result['val_loss'] is not None:
+                print(f"   trial {trial['trial']:3d} val_loss {result['val_loss']:.4f} "
+                      f"({result['wall_seconds']:.1f}s) {trial['params']}")
+
+        finished = sorted([t for t in trials if t['val_loss'] is not None], key=lambda t: t['val_loss'])
+        if rung == len(budgets) - 1:
+            store.set_status(study, rung, [t['trial'] for t in finished], 'completed')
+            return finished
+        keep = max(1, len(finished) // eta)
+        store.set_status(study, rung, [t['trial'] for t in finished[:keep]], 'promoted')
+        store.set_status(study, rung, [t['trial'] for t in finished[keep:]], 'pruned')
+        trials = finished[:keep]
+    return trials
+
+
+def run_search(model_name, n_trials=9, min_epochs=1, eta=3, max_epochs=None, workers=2, seed=0,
+               study=None, store_path=DEFAULT_STORE_PATH, num_segments=20, days=14, performance=False):
+    """Search one architecture's space; returns the leaderboard"""
+    study = study or f"{model_name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    configs = sample_configs(SEARCH_SPACES[model_name], n_trials, seed)
+    budgets = rung_budgets(min_epochs, eta, len(configs), max_epochs)
+    workers = max(1, min(workers, len(configs)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    framework = 'torch' if model_name == 'stgcn' else 'tensorflow'
+    cache = StageCache()
+    store = TrialStore(store_path)
+    shared = []
+
+    if model_name == 'stgcn':
+        def submit_trial(executor, params, epochs, state):
+            return executor.submit(_stgcn_trial, cache.root, params, epochs, state)
+    else:
+        from model_training import load_training_data
+        from ml_models import TrafficPredictionPipeline
+
+        # Generate the training series once; every trial trains on windows
+        # over the same shared-memory copy
+        arrays = cache.run('search_training_data',
+                           lambda: dict(zip(['data', 'coordinates', 'hours', 'timestamps'],
+                                            load_training_data(num_segments=num_segments, days=days))),
+                           config={'num_segments': num_segments, 'days': days},
+                           inputs=[source_fingerprint(load_training_data)])
+        pipeline = TrafficPredictionPipeline(seq_length=24, num_features=arrays['data'].shape[-1])
+        train_windows, _ = pipeline.prepare_windows(np.asarray(arrays['data']), train_ratio=0.8)
+        data_shm, data_spec = _share_array(np.ascontiguousarray(train_windows.data))
+        index_shm, index_spec = _share_array(np.ascontiguousarray(train_windows.indices))
+        shared = [data_shm, index_shm]
+        coordinates = np.asarray(arrays['coordinates'])
+
+        def submit_trial(executor, params, epochs, state):
+            return executor.submit(_keras_trial, model_name, data_spec, index_spec, train_windows.seq_length,
+                                   train_windows.horizon, train_windows.target_col, coordinates,
+                                   performance, params, epochs, state)
+
+    print(f"🔎 Study {study}: {len(configs)} {model_name} trials, rungs at {budgets} epochs, {workers} worker(s)")
+    start = time.perf_counter()
+    try:
+        # spawn: workers must set thread limits before the framework initializes
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_worker, initargs=(threads, framework)) as executor:
+            successive_halving(model_name, configs, submit_trial, executor, store, study, budgets, eta)
+        wall_seconds = time.perf_counter() - start
+        leaderboard = store.leaderboard(study)
+    finally:
+        store.close()
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+    trial_seconds = sum(row['wall_seconds'] or 0 for row in leaderboard)
+    print(f"\n🏁 Search finished in {wall_seconds:.1f}s ({trial_seconds:.1f}s of trial time)")
+    for row in leaderboard[:5]:
+        val_loss = 'failed' if row['val_loss'] is None else f"{row['val_loss']:.4f}"
+        print(f"   #{row['trial']:3d} rung {row['rung']} ({row['epochs']} epochs) {val_loss:>10s} {row['params']}")
+    if leaderboard and leaderboard[0]['val_loss'] is not None:
+        print(f"✅ Best {model_name} config: {leaderboard[0]['params']}")
+    print(f"📄 Trials recorded in {store_path} (study '{study}')")
+    return leaderboard
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Successive-halving hyperparameter search')
+    parser.add_argument('--model', choices=KERAS_MODELS + ['stgcn'], default='lstm')
+    parser.add_argument('--trials', type=int, default=9, help='Configurations sampled from the search space')
+    parser.add_argument('--min-epochs', type=int, default=1, help='Epochs every trial gets in the first rung')
+    parser.add_argument('--eta', type=int, default=3, help='Keep the best 1/eta trials at every rung')
+    parser.add_argument('--max-epochs', type=int, default=None, help='Cap on epochs for the last rung')
+    parser.add_argument('--workers', type=int, default=2, help='Parallel trial processes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--study', default=None, help='Study name in the results store')
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help='SQLite results store')
+    parser.add_argument('--segments', type=int, default=20, help='Synthetic segments (Keras models)')
+    parser.add_argument('--days', type=int, default=14, help='Synthetic days of history (Keras models)')
+    parser.add_argument('--performance', action='store_true', help='Performance training mode (Keras models)')
+    args = parser.parse_args()
+
+    run_search(args.model, args.trials, args.min_epochs, args.eta, args.max_epochs, args.workers,
+               args.seed, args.study, args.store, args.segments, args.days, args.performance)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Model compression for the Traffic Prediction API
+Builds float16/int8 post-training-quantized (TFLite) and magnitude-pruned
+variants of best_model.h5, benchmarks latency, memory, size and held-out
+accuracy, and writes models/compression_report.json for the API to pick a
+variant
+
+Usage:
+    python model_compression.py
+    SERVING_VARIANT=auto python traffic_prediction_api.py
+"""
+
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from windowing import sliding_windows
+from prediction_cache import file_checksum
+from memory_trace import current_rss_mb
+
+MODELS_DIR = os.path.join(API_DIR, 'models')
+VARIANTS_DIR = os.path.join(MODELS_DIR, 'variants')
+REPORT_PATH = os.path.join(MODELS_DIR, 'compression_report.json')
+MODEL_INPUT_FEATURES = 18  # best_model.h5 takes the first 18 scaled features
+SERVE_BATCH_SIZE = 64
+
+
+class CompatAttention(tf.keras.layers.Attention):
+    """Attention that accepts score_mode deserialized as a function.
+
+    Legacy .h5 loading in recent Keras turns the stored "dot" into the
+    keras.ops.dot function, which Attention then rejects.
+    """
+
+    def __init__(self, score_mode='dot', **kwargs):
+        super().__init__(score_mode=getattr(score_mode, '__name__', score_mode), **kwargs)
+
+
+def load_keras_model(path):
+    """Load a saved Keras model without compiling it"""
+    return tf.keras.models.load_model(path, compile=False, custom_objects={
+        'Attention': CompatAttention, 'CompatAttention': CompatAttention})
+
+
+class TFLiteModel:
+    """Keras-like predict() over fixed-batch TFLite interpreters.
+
+    TFLite LSTMs need static shapes, so each variant is converted once for
+    single requests (batch 1) and once for bulk scoring; larger inputs are
+    split into padded chunks of the bulk batch size. An interpreter's
+    tensors are shared state, so each one is invoked under its own lock.
+    """
+
+    layers = []
+
+    def __init__(self, paths, num_threads=None):
+        self.interpreters = {}
+        self._locks = {}
+        for batch_size, path in paths.items():
+            interpreter = tf.lite.Interpreter(model_path=path, num_threads=num_threads)
+            interpreter.allocate_tensors()
+            self.interpreters[int(batch_size)] = interpreter
+            self._locks[int(batch_size)] = threading.Lock()
+        shape = self.interpreters[1].get_input_details()[0]['shape']
+        self.input_shape = (None,) + tuple(int(d) for d in shape[1:])
+        self.bulk_batch_size = max(self.interpreters)
+
+    def _invoke(self, batch_size, x):
+        interpreter = self.interpreters[batch_size]
+        with self._locks[batch_size]:
+            interpreter.set_tensor(interpreter.get_input_details()[0]['index'], x)
+            interpreter.invoke()
+            return interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if len(x) == 1:
+            return self._invoke(1, x)
+        size = self.bulk_batch_size
+        outputs = []
+        for start in range(0, len(x), size):
+            chunk = x[start:start + size]
+            padded = np.zeros((size,) + x.shape[1:], dtype=np.float32)
+            padded[:len(chunk)] = chunk
+            outputs.append(self._invoke(size, padded)[:len(chunk)])
+        return np.concatenate(outputs)
+
+
+def load_holdout(csv_path, metadata, feature_scaler, seq_len=24, horizon=12, test_ratio=0.15):
+    """Held-out (X scaled, y) windows from the notebook's time-based split"""
+    df = pd.read_csv(csv_path)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    df = df.sort_values('Timestamp').reset_index(drop=True)
+    df['hour'] = df['Timestamp'].dt.hour
+    df['dow'] = df['Timestamp'].dt.dayofweek
+    df['is_weekend'] = df['dow'].isin([5, 6]).astype(int)
+    df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
+    df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+    df = pd.get_dummies(df, columns=['Traffic_Light_State', 'Weather_Condition', 'Traffic_Condition'],
+                        drop_first=True)
+    num_cols = df.select_dtypes(include=[np.number, bool]).columns
+    df[num_cols] = df[num_cols].astype(float).ffill().fillna(df[num_cols].astype(float).median())
+
+    features = df.reindex(columns=metadata['feature_columns'], fill_value=0.0).to_numpy(dtype=np.float64)
+    # Scale every row once, then window (windows are views)
+    scaled = feature_scaler.transform(features)[:, :MODEL_INPUT_FEATURES].astype(np.float32)
+    scaled = np.column_stack([scaled, df[metadata['target_column']].to_numpy(dtype=np.float32)])
+    X, y = sliding_windows(scaled, seq_len, horizon, target_col=scaled.shape[1] - 1)
+    test_start = int(len(X) * (1 - test_ratio))
+    return np.ascontiguousarray(X[test_start:, :, :-1]), np.asarray(y[test_start:], dtype=np.float64)
+
+
+def prune_model(model, sparsity):
+    """Zero the smallest-magnitude kernel weights of every layer (biases kept)"""
+    pruned = tf.keras.models.clone_model(model)
+    weights = []
+    for layer in model.layers:
+        for variable, value in zip(layer.weights, layer.get_weights()):
+            if 'kernel' in variable.name and value.size:
+                threshold = np.quantile(np.abs(value), sparsity)
+                value = np.where(np.abs(value) <= threshold, 0, value).astype(value.dtype)
+            weights.append(value)
+    pruned.set_weights(weights)
+    return pruned
+
+
+def convert_tflite(model, batch_size, quantization=None):
+    """Convert a model for a fixed batch size: None, 'float16' or 'int8' (dynamic range)"""
+    fixed = tf.keras.models.clone_model(model, input_tensors=[
+        tf.keras.Input(batch_shape=(batch_size,) + tuple(model.input_shape[1:]))
+    ])
+    fixed.set_weights(model.get_weights())
+    converter = tf.lite.TFLiteConverter.from_keras_model(fixed)
+    if quantization:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def _file_sizes(paths):
+    raw = sum(os.path.getsize(p) for p in paths)
+    # Compressed size reflects pruning, which only shows up once zeros compress
+    compressed = sum(len(gzip.compress(open(p, 'rb').read())) for p in paths)
+    return raw, compressed
+
+
+def benchmark(model, X, y, target_scaler, repeats=200):
+    """Held-out RMSE/MAE plus single-request latency and bulk throughput"""
+    t0 = time.perf_counter()
+    pred_s = model.predict(X, batch_size=SERVE_BATCH_SIZE, verbose=0).reshape(-1)
+    bulk_seconds = time.perf_counter() - t0
+    pred = target_scaler.inverse_transform(pred_s.reshape(-1, 1)).reshape(-1)
+    errors = pred - y
+
+    single = X[:1]
+    model.predict(single, verbose=0)
+    latencies = []
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        model.predict(X[i % len(X):i % len(X) + 1], verbose=0)
+        latencies.append(time.perf_counter() - t0)
+    latencies = np.array(latencies) * 1000
+
+    return {
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mae': float(np.mean(np.abs(errors))),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'bulk_rows_per_second': float(len(X) / bulk_seconds),
+    }, pred_s
+
+
+def _loaded_rss_mb(spec, sample):
+    rss_before = current_rss_mb()
+    model = load_variant(spec, num_threads=1)
+    model.predict(sample, verbose=0)
+    return current_rss_mb() - rss_before
+
+
+def loaded_memory_mb(spec, sample):
+    """RSS growth from loading a variant and serving one request
+
+    Measured in a fresh process so memory kept or freed by earlier variants
+    doesn't skew the number
+    """
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return float(pool.apply(_loaded_rss_mb, (spec, sample)))
+
+
+def build_variants(source_path, sparsities=(0.5, 0.8)):
+    """Write every variant under models/variants; returns {name: spec}"""
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    model = load_keras_model(source_path)
+    variants = {'keras_float32': {'format': 'keras', 'paths': {'1': os.path.relpath(source_path, API_DIR)}}}
+
+    def add_tflite(name, keras_model, quantization):
+        paths = {}
+        for batch_size in (1, SERVE_BATCH_SIZE):
+            path = os.path.join(VARIANTS_DIR, f"{name}_b{batch_size}.tflite")
+            with open(path, 'wb') as f:
+                f.write(convert_tflite(keras_model, batch_size, quantization))
+            paths[str(batch_size)] = os.path.relpath(path, API_DIR)
+        variants[name] = {'format': 'tflite', 'paths': paths, 'quantization': quantization or 'none'}
+
+    add_tflite('tflite_float32', model, None)
+    add_tflite('tflite_float16', model, 'float16')
+    add_tflite('tflite_int8', model, 'int8')
+    for sparsity in sparsities:
+        name = f"pruned_{int(sparsity * 100)}"
+        pruned = prune_model(model, sparsity)
+        path = os.path.join(VARIANTS_DIR, f"{name}.h5")
+        pruned.save(path)
+        variants[name] = {'format': 'keras', 'paths': {'1': os.path.relpath(path, API_DIR)}, 'sparsity': sparsity}
+        add_tflite(f"{name}_int8", pruned, 'int8')
+        variants[f"{name}_int8"]['sparsity'] = sparsity
+    return variants
+
+
+def load_variant(spec, num_threads=None):
+    """Load a variant described in the compression report"""
+    paths = {int(b): os.path.join(API_DIR, p) for b, p in spec['paths'].items()}
+    if spec['format'] == 'tflite':
+        return TFLiteModel(paths, num_threads=num_threads)
+    return load_keras_model(paths[1])
+
+
+def variant_checksum(spec):
+    """Checksum of a variant's files, for versioning cache keys"""
+    return '-'.join(file_checksum(os.path.join(API_DIR, p)) for _, p in sorted(spec['paths'].items()))[:12]
+
+
+def run_report(source_path, csv_path, max_rmse_increase=0.01, repeats=200):
+    """Build, benchmark and rank all variants; writes REPORT_PATH"""
+    with open(os.path.join(MODELS_DIR, 'model_metadata.json')) as f:
+        metadata = json.load(f)
+    feature_scaler = joblib.load(os.path.join(MODELS_DIR, 'feature_scaler.pkl'))
+    target_scaler = joblib.load(os.path.join(MODELS_DIR, 'target_scaler.pkl'))
+    X, y = load_holdout(csv_path, metadata, feature_scaler, seq_len=metadata.get('sequence_length', 24))
+    print(f"📊 Held-out split: {len(X)} windows")
+
+    variants = build_variants(source_path)
+    baseline_pred = None
+    for name, spec in variants.items():
+        model = load_variant(spec, num_threads=1)
+        metrics, pred_s = benchmark(model, X, y, target_scaler, repeats)
+        if baseline_pred is None:
+            baseline_pred = pred_s
+        metrics['max_abs_diff_vs_baseline'] = float(np.max(np.abs(pred_s - baseline_pred)))
+        metrics['rss_loaded_mb'] = loaded_memory_mb(spec, X[:1])
+        metrics['size_bytes'], metrics['gzip_bytes'] = _file_sizes(
+            [os.path.join(API_DIR, p) for p in spec['paths'].values()])
+        spec.update(metrics)
+        print(f"   {name:<22} RMSE {metrics['rmse']:.3f}  MAE {metrics['mae']:.3f}  "
+              f"p50 {metrics['latency_ms_p50']:.2f} ms  {metrics['bulk_rows_per_second']:.0f} rows/s  "
+              f"{metrics['rss_loaded_mb']:.1f} MB RSS  {metrics['gzip_bytes'] / 1024:.0f} KiB gz")
+
+    # Fastest single-request variant whose accuracy stays within tolerance
+    baseline_rmse = variants['keras_float32']['rmse']
+    eligible = [n for n, v in variants.items() if v['rmse'] <= baseline_rmse * (1 + max_rmse_increase)]
+    recommended = min(eligible, key=lambda n: variants[n]['latency_ms_p50'])
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'source_model': os.path.relpath(source_path, API_DIR),
+        'source_checksum': file_checksum(source_path),
+        'holdout_windows': int(len(X)),
+        'max_rmse_increase': max_rmse_increase,
+        'recommended': recommended,
+        'variants': variants,
+    }
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Report written to {REPORT_PATH} (recommended: {recommended})")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and benchmark compressed model variants')
+    parser.add_argument('--model', default=os.path.join(MODELS_DIR, 'best_model.h5'))
+    parser.add_argument('--data', default=os.path.join(API_DIR, 'smart_mobility_dataset.csv'))
+    parser.add_argument('--max-rmse-increase', type=float, default=0.01,
+                        help='Allowed relative RMSE increase for the recommended variant')
+    parser.add_argument('--repeats', type=int, default=200, help='Single-request latency samples')
+    args = parser.parse_args()
+
+    run_report(args.model, args.data, args.max_rmse_increase, args.repeats)
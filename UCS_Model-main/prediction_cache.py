@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Caching for the Traffic Prediction API
+Bounded in-process LRU cache with per-entry TTL, safe to share between
+request threads, and a host-wide cache shared by all API worker processes
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU cache whose entries expire after ttl_seconds"""
+
+    def __init__(self, max_entries=4096, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl_seconds=None):
+        """Store a value, evicting the least recently used entry when full"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def file_checksum(path, length=12):
+    """Short sha256 of a file, used to version cache keys by model"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def default_shared_cache_path(name='traffic_prediction_cache.sqlite'):
+    """Prefer RAM-backed /dev/shm so the shared cache never touches disk"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, name)
+
+
+class SharedTTLCache:
+    """TTL cache shared by every worker process on a host.
+
+    Entries live in a local SQLite file (WAL mode, ideally in /dev/shm) used
+    as a key-value store. ``get_or_compute`` de-duplicates concurrent misses:
+    threads in a process wait on the first one, and processes coordinate
+    through a short lease row so only one of them runs the computation.
+    Values must be JSON-serializable.
+    """
+
+    def __init__(self, path=None, ttl_seconds=300, lease_seconds=10, poll_seconds=0.005,
+                 purge_every=1000):
+        self.path = path or default_shared_cache_path()
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+
+    def _connect(self):
+        # One connection per thread and process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _read(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        value = self._read(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl_seconds=None):
+        """Store a JSON-serializable value"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            conn.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+
+    def _acquire_lease(self, key):
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO leases (key, expires) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires = excluded.expires WHERE leases.expires <= ?",
+            (key, now + self.lease_seconds, now))
+        return cursor.rowcount == 1
+
+    def _release_lease(self, key):
+        self._connect().execute("DELETE FROM leases WHERE key = ?", (key,))
+
+    def _wait_for(self, key):
+        """Poll for a value another process is computing, until its lease ends"""
+        conn = self._connect()
+        deadline = time.monotonic() + self.lease_seconds
+        while time.monotonic() < deadline:
+            value = self._read(key)
+            if value is not None:
+                return value
+            if conn.execute("SELECT 1 FROM leases WHERE key = ? AND expires > ?",
+                            (key, time.time())).fetchone() is None:
+                return self._read(key)
+            time.sleep(self.poll_seconds)
+        return None
+
+    def get_or_compute(self, key, compute, ttl_seconds=None):
+        """Return (value, cached), running compute() at most once per key across workers"""
+        value = self.get(key)
+        if value is not None:
+            return value, True
+
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            event.wait(self.lease_seconds)
+            value = self._read(key)
+            if value is not None:
+                self.coalesced += 1
+                return value, True
+
+        leased = False
+        try:
+            leased = self._acquire_lease(key)
+            if not leased:
+                value = self._wait_for(key)
+                if value is not None:
+                    self.coalesced += 1
+                    return value, True
+            value = compute()
+            self.set(key, value, ttl_seconds)
+            return value, False
+        finally:
+            if leased:
+                self._release_lease(key)
+            if leader:
+                with self._inflight_lock:
+                    del self._inflight[key]
+                event.set()
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM leases")
+
+    def stats(self):
+        entries = self._connect().execute(
+            "SELECT COUNT(*) FROM entries WHERE expires > ?", (time.time(),)).fetchone()[0]
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'path': self.path,
+        }
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Region-aware model routing for the Traffic Prediction API
+Each region (a city) has its own model bundle - model, feature/target
+scalers and metadata - in models/regions/<name>/, and a bounding box in
+models/regions.json. Request coordinates are mapped to a region through a
+grid-bucketed bounding-box index; a region's bundle is loaded on its first
+request and warmed up, and at most ``max_resident`` bundles stay in memory,
+evicting the least recently used. Points outside every region are served by
+the API's default model.
+
+Usage:
+    python region_router.py --add nyc --bbox 40.49 40.92 -74.26 -73.69 --source models
+    python region_router.py --list
+    python region_router.py --locate 40.75 -73.98
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from prediction_cache import file_checksum
+
+MODELS_DIR = os.path.join(API_DIR, 'models')
+REGIONS_PATH = os.path.join(MODELS_DIR, 'regions.json')
+REGIONS_DIR = os.path.join(MODELS_DIR, 'regions')
+MAX_RESIDENT = 4
+INDEX_CELL_DEGREES = 1.0
+LOCATION_SCALE = 2.0  # degrees per unit of the normalized Latitude/Longitude features
+MODEL_FILES = ('best_model.h5', 'traffic_prediction_model.h5')
+BUNDLE_FILES = ('feature_scaler.pkl', 'target_scaler.pkl', 'model_metadata.json')
+
+
+class RegionSpec:
+    """One region: where its bundle lives and which coordinates it serves.
+
+    ``bounds`` is (lat_min, lat_max, lon_min, lon_max), as for the surrogate.
+    ``center`` is the point the Latitude/Longitude features are normalized
+    around and distance_from_center is measured from; it defaults to the
+    middle of the box.
+    """
+
+    def __init__(self, name, bounds, path, center=None, scale=LOCATION_SCALE, warmup_batch_sizes=(1,)):
+        lat_min, lat_max, lon_min, lon_max = (float(b) for b in bounds)
+        if not (lat_min < lat_max and lon_min < lon_max):
+            raise ValueError(f"Region {name}: bounds must be (lat_min, lat_max, lon_min, lon_max)")
+        self.name = name
+        self.bounds = (lat_min, lat_max, lon_min, lon_max)
+        self.path = path
+        self.center = (tuple(float(c) for c in center) if center is not None
+                       else (round((lat_min + lat_max) / 2, 6), round((lon_min + lon_max) / 2, 6)))
+        self.scale = float(scale)
+        self.warmup_batch_sizes = tuple(int(b) for b in warmup_batch_sizes)
+        self.model_path = next((os.path.join(path, f) for f in MODEL_FILES
+                                if os.path.exists(os.path.join(path, f))), None)
+        if self.model_path is None:
+            raise FileNotFoundError(f"Region {name}: no {' / '.join(MODEL_FILES)} in {path}")
+        # Versions cache keys without loading the model
+        self.checksum = file_checksum(self.model_path)
+
+    @property
+    def area(self):
+        lat_min, lat_max, lon_min, lon_max = self.bounds
+        return (lat_max - lat_min) * (lon_max - lon_min)
+
+    def covers(self, lats, lons):
+        """Mask of points inside the region's box"""
+        lat_min, lat_max, lon_min, lon_max = self.bounds
+        return (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+
+    def to_dict(self, root):
+        return {'name': self.name, 'bounds': list(self.bounds), 'path': os.path.relpath(self.path, root),
+                'center': list(self.center), 'scale': self.scale,
+                'warmup_batch_sizes': list(self.warmup_batch_sizes)}
+
+
+class RegionIndex:
+    """Bounding-box lookup of the region serving each point.
+
+    Boxes are bucketed into a grid of ``cell_degrees`` cells, so a lookup
+    only tests the few boxes overlapping the point's cell. Where boxes
+    overlap, the smallest one wins, so a city inside a wider region is
+    routed to the city's model.
+    """
+
+    def __init__(self, regions, cell_degrees=INDEX_CELL_DEGREES):
+        self.regions = list(regions)
+        self.cell_degrees = cell_degrees
+        self._ids = {region.name: i for i, region in enumerate(self.regions)}
+        if len(self._ids) != len(self.regions):
+            raise ValueError("Region names must be unique")
+        self._cells = {}
+        for i in sorted(range(len(self.regions)), key=lambda i: self.regions[i].area):
+            lat_min, lat_max, lon_min, lon_max = self.regions[i].bounds
+            for cell_lat in range(self._cell(lat_min), self._cell(lat_max) + 1):
+                for cell_lon in range(self._cell(lon_min), self._cell(lon_max) + 1):
+                    self._cells.setdefault((cell_lat, cell_lon), []).append(i)
+
+    def _cell(self, degrees):
+        return int(np.floor(degrees / self.cell_degrees))
+
+    def id_of(self, name):
+        return self._ids[name]
+
+    def lookup(self, lats, lons):
+        """Region id of every point, -1 where no region covers it"""
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        ids = np.full(len(lats), -1, dtype=np.int64)
+        cells = np.column_stack([np.floor(lats / self.cell_degrees), np.floor(lons / self.cell_degrees)])
+        unique_cells, inverse = np.unique(cells.astype(np.int64), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for c, (cell_lat, cell_lon) in enumerate(unique_cells):
+            candidates = self._cells.get((int(cell_lat), int(cell_lon)))
+            if not candidates:
+                continue
+            rows = np.flatnonzero(inverse == c)
+            for i in candidates:  # smallest box first
+                hit = self.regions[i].covers(lats[rows], lons[rows])
+                ids[rows[hit]] = i
+                rows = rows[~hit]
+                if not len(rows):
+                    break
+        return ids
+
+    def region_for(self, lat, lon):
+        """RegionSpec serving one point, or None"""
+        i = self.lookup([lat], [lon])[0]
+        return self.regions[i] if i >= 0 else None
+
+
+class RegionBundle:
+    """A loaded region model with its scalers and metadata"""
+
+    def __init__(self, spec, model, feature_scaler, target_scaler, metadata):
+        self.spec = spec
+        self.model = model
+        self.feature_scaler = feature_scaler
+        self.target_scaler = target_scaler
+        self.metadata = metadata
+        self.n_inputs = int(model.input_shape[-1])
+        self.sequence_length = int(model.input_shape[1])
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+
+    @classmethod
+    def load(cls, spec):
+        from model_compression import load_keras_model
+        with open(os.path.join(spec.path, 'model_metadata.json')) as f:
+            metadata = json.load(f)
+        return cls(spec, load_keras_model(spec.model_path),
+                   joblib.load(os.path.join(spec.path, 'feature_scaler.pkl')),
+                   joblib.load(os.path.join(spec.path, 'target_scaler.pkl')), metadata)
+
+
+class ModelRouter:
+    """Lazily loaded region bundles, at most ``max_resident`` at a time.
+
+    ``warmup(bundle, batch_size)`` is called once per configured batch size
+    after a bundle loads, so the first real request does not pay for graph
+    tracing. Loading happens outside the router lock: other regions keep
+    serving while one loads, and concurrent first requests for the same
+    region wait for a single load.
+    """
+
+    def __init__(self, index, max_resident=MAX_RESIDENT, warmup=None, loader=RegionBundle.load):
+        if max_resident < 1:
+            raise ValueError("max_resident must be at least 1")
+        self.index = index
+        self.max_resident = max_resident
+        self.warmup = warmup
+        self.loader = loader
+        self._resident = OrderedDict()  # region id -> RegionBundle, least recently used first
+        self._loading = {}  # region id -> threading.Event set when its load finishes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_errors = 0
+
+    @property
+    def regions(self):
+        return self.index.regions
+
+    def lookup(self, lats, lons):
+        return self.index.lookup(lats, lons)
+
+    def get(self, region_id):
+        """Bundle of a region, loading (and evicting) as needed"""
+        while True:
+            with self._lock:
+                bundle = self._resident.get(region_id)
+                if bundle is not None:
+                    self._resident.move_to_end(region_id)
+                    self.hits += 1
+                    return bundle
+                pending = self._loading.get(region_id)
+                if pending is None:
+                    pending = self._loading[region_id] = threading.Event()
+                    break
+            pending.wait()  # another request is loading it; then retry (it may have failed)
+        try:
+            bundle = self._load(self.index.regions[region_id])
+        except Exception:
+            with self._lock:
+                self.load_errors += 1
+                del self._loading[region_id]
+            pending.set()
+            raise
+        with self._lock:
+            self._resident[region_id] = bundle
+            self.loads += 1
+            while len(self._resident) > self.max_resident:
+                # Requests still holding the evicted bundle finish with it;
+                # its memory is released with their last reference
+                evicted_id, _ = self._resident.popitem(last=False)
+                self.evictions += 1
+                print(f"♻️  Evicted region model: {self.index.regions[evicted_id].name}")
+            del self._loading[region_id]
+        pending.set()
+        return bundle
+
+    def _load(self, spec):
+        start = time.perf_counter()
+        bundle = self.loader(spec)
+        bundle.load_seconds = time.perf_counter() - start
+        if self.warmup is not None:
+            start = time.perf_counter()
+            for batch_size in spec.warmup_batch_sizes:
+                self.warmup(bundle, batch_size)
+            bundle.warmup_seconds = time.perf_counter() - start
+        print(f"📥 Loaded region model: {spec.name} ({bundle.load_seconds:.2f}s load, "
+              f"{bundle.warmup_seconds:.2f}s warm-up)")
+        return bundle
+
+    def preload(self, names):
+        """Load and warm up regions ahead of traffic (at most max_resident)"""
+        for name in list(names)[:self.max_resident]:
+            self.get(self.index.id_of(name))
+
+    def stats(self):
+        with self._lock:
+            resident = {self.index.regions[i].name: {'load_seconds': round(b.load_seconds, 3),
+                                                     'warmup_seconds': round(b.warmup_seconds, 3)}
+                        for i, b in self._resident.items()}
+        return {
+            'regions': len(self.index.regions),
+            'max_resident': self.max_resident,
+            'resident': resident,
+            'hits': self.hits,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'load_errors': self.load_errors,
+        }
+
+
+def load_regions(path=REGIONS_PATH):
+    """RegionSpecs from a regions.json; bundle paths are relative to its directory"""
+    root = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        config = json.load(f)
+    return [RegionSpec(r['name'], r['bounds'], os.path.join(root, r['path']), r.get('center'),
+                       r.get('scale', LOCATION_SCALE), r.get('warmup_batch_sizes', (1,)))
+            for r in config['regions']]
+
+
+def load_model_router(path=None, max_resident=None, warmup=None):
+    """ModelRouter from $REGIONS_PATH, or None if no regions are configured"""
+    path = path or os.environ.get('REGIONS_PATH', REGIONS_PATH)
+    if not os.path.exists(path):
+        return None
+    max_resident = max_resident or int(os.environ.get('REGION_MAX_RESIDENT', MAX_RESIDENT))
+    return ModelRouter(RegionIndex(load_regions(path)), max_resident, warmup)
+
+
+def add_region(name, bounds, source, center=None, scale=LOCATION_SCALE, warmup_batch_sizes=(1,),
+               path=REGIONS_PATH):
+    """Copy a trained bundle from ``source`` into models/regions/<name> and register it"""
+    if not name or os.path.basename(name) != name or name.startswith('.'):
+        raise ValueError(f"Invalid region name: {name!r}")
+    root = os.path.dirname(os.path.abspath(path))
+    target = os.path.join(root, 'regions', name)
+    model_file = next((f for f in MODEL_FILES if os.path.exists(os.path.join(source, f))), None)
+    missing = [f for f in BUNDLE_FILES if not os.path.exists(os.path.join(source, f))]
+    if model_file is None or missing:
+        raise FileNotFoundError(f"{source} is not a model bundle (missing {missing or MODEL_FILES})")
+    os.makedirs(target, exist_ok=True)
+    for f in (model_file, *BUNDLE_FILES):
+        shutil.copy2(os.path.join(source, f), os.path.join(target, f))
+    spec = RegionSpec(name, bounds, target, center, scale, warmup_batch_sizes)
+
+    regions = [r for r in load_regions(path) if r.name != name] if os.path.exists(path) else []
+    regions.append(spec)
+    RegionIndex(regions)  # validate before writing
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'regions': [r.to_dict(root) for r in regions]}, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return spec
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage per-region model bundles')
+    parser.add_argument('--regions', default=REGIONS_PATH, help='regions.json to read/update')
+    parser.add_argument('--add', metavar='NAME', help='register a region (copies the bundle from --source)')
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('LAT_MIN', 'LAT_MAX', 'LON_MIN', 'LON_MAX'))
+    parser.add_argument('--source', default=MODELS_DIR, help='directory with the trained bundle to copy')
+    parser.add_argument('--center', nargs=2, type=float, metavar=('LAT', 'LON'),
+                        help='normalization/city center (default: middle of the box)')
+    parser.add_argument('--scale', type=float, default=LOCATION_SCALE)
+    parser.add_argument('--warmup-batch-sizes', nargs='+', type=int, default=[1])
+    parser.add_argument('--list', action='store_true', help='list registered regions')
+    parser.add_argument('--locate', nargs=2, type=float, metavar=('LAT', 'LON'),
+                        help='print the region serving a point')
+    args = parser.parse_args()
+
+    os.chdir(API_DIR)
+    if args.add:
+        if not args.bbox:
+            parser.error('--add needs --bbox')
+        spec = add_region(args.add, args.bbox, args.source, args.center, args.scale,
+                          args.warmup_batch_sizes, args.regions)
+        print(f"✅ Registered region {spec.name}: bounds {spec.bounds}, center {spec.center}, model {spec.checksum}")
+    if args.list or args.locate:
+        if not os.path.exists(args.regions):
+            sys.exit(f"❌ No regions configured ({args.regions})")
+        index = RegionIndex(load_regions(args.regions))
+        if args.list:
+            for region in index.regions:
+                print(f"🗺️  {region.name:20s} bounds {region.bounds} center {region.center} model {region.checksum}")
+        if args.locate:
+            region = index.region_for(*args.locate)
+            print(f"📍 {args.locate[0]}, {args.locate[1]} -> {region.name if region else 'default model'}")
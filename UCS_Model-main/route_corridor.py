@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Route corridor helpers for the Traffic Prediction API
+Decodes encoded polylines, resamples them at a fixed spacing and collapses
+samples that share a spatial cell and time bucket so each is scored once
+"""
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def decode_polyline(encoded, precision=5):
+    """Decode a Google encoded polyline into an (n, 2) array of (lat, lon)"""
+    values = []
+    index = 0
+    length = len(encoded)
+    while index < length:
+        shift = 0
+        result = 0
+        while True:
+            if index >= length:
+                # the last value's continuation bit is set but the string ended
+                raise ValueError('Malformed polyline')
+            byte = ord(encoded[index]) - 63
+            index += 1
+            result |= (byte & 0x1f) << shift
+            shift += 5
+            if byte < 0x20:
+                break
+        values.append(~(result >> 1) if result & 1 else result >> 1)
+
+    if len(values) % 2:
+        raise ValueError('Malformed polyline')
+    deltas = np.asarray(values, dtype=np.int64).reshape(-1, 2)
+    return np.cumsum(deltas, axis=0) / float(10 ** precision)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (vectorized)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def resample_polyline(points, spacing_m=200):
+    """Resample a polyline every spacing_m metres along its length.
+
+    Returns (samples (m, 2), distance_km (m,)) including both endpoints.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 2:
+        raise ValueError('A route needs at least 2 points')
+
+    step_km = haversine_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+    cumulative = np.concatenate([[0.0], np.cumsum(step_km)])
+    total_km = cumulative[-1]
+
+    spacing_km = spacing_m / 1000.0
+    distance_km = np.arange(0.0, total_km, spacing_km)
+    distance_km = np.append(distance_km, total_km)
+    if len(distance_km) > 1 and distance_km[-1] - distance_km[-2] < 1e-9:
+        distance_km = distance_km[:-1]
+
+    samples = np.column_stack([
+        np.interp(distance_km, cumulative, points[:, 0]),
+        np.interp(distance_km, cumulative, points[:, 1]),
+    ])
+    return samples, distance_km
+
+
+def collapse_cells(samples, times, cell_decimals=3, bucket_minutes=15):
+    """Collapse samples that fall in the same spatial cell and time bucket.
+
+    Returns (cell_lats, cell_lons, cell_times, inverse) where
+    cell_*[inverse] expands unique cells back to the samples.
+    """
+    scale = 10 ** cell_decimals
+    cell_lat = np.round(samples[:, 0] * scale).astype(np.int64)
+    cell_lon = np.round(samples[:, 1] * scale).astype(np.int64)
+    buckets = pd.DatetimeIndex(times).floor(f'{bucket_minutes}min')
+    bucket_ns = buckets.as_unit('ns').asi8
+
+    keys = np.column_stack([cell_lat, cell_lon, bucket_ns])
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    cell_times = unique_keys[:, 2].astype('datetime64[ns]')
+    if buckets.tz is None:
+        cell_times = pd.DatetimeIndex(cell_times)
+    else:
+        # asi8 of an aware index is UTC, not local wall-clock time
+        cell_times = pd.DatetimeIndex(cell_times, tz='UTC').tz_convert(buckets.tz)
+    return (unique_keys[:, 0] / scale,
+            unique_keys[:, 1] / scale,
+            cell_times,
+            inverse.reshape(-1))
+
+
+def segment_travel_minutes(distance_km, traffic, free_flow_kmh=50.0, min_speed_ratio=0.25):
+    """Distance-weighted travel time along resampled samples.
+
+    Each piece between consecutive samples uses the mean traffic level of its
+    endpoints; speed falls linearly from free flow to min_speed_ratio at 100%.
+    Returns (piece_lengths_km, piece_traffic, piece_minutes).
+    """
+    lengths = np.diff(distance_km)
+    piece_traffic = (traffic[:-1] + traffic[1:]) / 2
+    speed = free_flow_kmh * np.maximum(min_speed_ratio, 1 - (1 - min_speed_ratio) * piece_traffic / 100)
+    return lengths, piece_traffic, lengths / speed * 60
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Per-zone ring buffer of recent observations for the Traffic Prediction API
+Holds the last sequence_length feature rows of every zone in one fixed-size
+NumPy array, so predictions can read a real input window in O(1)
+"""
+
+import os
+import threading
+import numpy as np
+
+
+class SequenceRingBuffer:
+    """Fixed-memory ring buffer of (sequence_length, n_features) windows per zone.
+
+    Every row is written twice, at head and head + sequence_length, so the
+    latest window is always the contiguous slice [head + 1, head + 1 + L) and
+    is read without reordering.
+    """
+
+    def __init__(self, sequence_length, n_features, max_zones=10000, zone_decimals=3):
+        self.sequence_length = sequence_length
+        self.n_features = n_features
+        self.max_zones = max_zones
+        self.zone_decimals = zone_decimals
+
+        self._rows = np.zeros((max_zones, 2 * sequence_length, n_features), dtype=np.float32)
+        self._head = np.full(max_zones, sequence_length - 1, dtype=np.int64)
+        self._count = np.zeros(max_zones, dtype=np.int64)
+        self._appended = np.zeros(max_zones, dtype=np.int64)
+        self._last_ts = np.full(max_zones, np.iinfo(np.int64).min, dtype=np.int64)
+        self._zone_slot = {}
+        self._slot_zone = [None] * max_zones
+        self._lock = threading.Lock()
+        self.updates = 0
+
+    def zone_key(self, lat, lon):
+        """Quantize coordinates to a zone key (~110 m cells by default)"""
+        return f"{round(float(lat), self.zone_decimals)},{round(float(lon), self.zone_decimals)}"
+
+    def _slot_for(self, zone):
+        slot = self._zone_slot.get(zone)
+        if slot is not None:
+            return slot
+        if len(self._zone_slot) < self.max_zones:
+            slot = len(self._zone_slot)
+        else:
+            # Full: reuse the slot of the zone that was updated longest ago
+            slot = int(np.argmin(self._last_ts))
+            del self._zone_slot[self._slot_zone[slot]]
+        self._zone_slot[zone] = slot
+        self._slot_zone[slot] = zone
+        self._head[slot] = self.sequence_length - 1
+        self._count[slot] = 0
+        self._appended[slot] = 0
+        self._last_ts[slot] = np.iinfo(np.int64).min
+        return slot
+
+    def append(self, lat, lon, timestamp_ns, row):
+        """Append one observation row to its zone. Returns False if out of order."""
+        zone = self.zone_key(lat, lon)
+        with self._lock:
+            slot = self._slot_for(zone)
+            if timestamp_ns <= self._last_ts[slot]:
+                return False
+            L = self.sequence_length
+            head = (self._head[slot] + 1) % L
+            self._rows[slot, head] = row
+            self._rows[slot, head + L] = row
+            self._head[slot] = head
+            self._count[slot] = min(self._count[slot] + 1, L)
+            self._appended[slot] += 1
+            self._last_ts[slot] = timestamp_ns
+            self.updates += 1
+            return True
+
+    def window(self, lat, lon):
+        """Return the zone's last sequence_length rows (oldest first), or None"""
+        with self._lock:
+            slot = self._zone_slot.get(self.zone_key(lat, lon))
+            if slot is None or self._count[slot] < self.sequence_length:
+                return None
+            start = self._head[slot] + 1
+            return self._rows[slot, start:start + self.sequence_length].copy()
+
+    def lookup(self, lats, lons):
+        """Batch lookup: (slots, appended) per row; slot -1 if the zone is unknown.
+
+        ``appended`` counts rows appended since the zone took its slot, so it
+        identifies the exact state of a zone's window.
+        """
+        with self._lock:
+            slots = np.array([self._zone_slot.get(self.zone_key(lat, lon), -1)
+                              for lat, lon in zip(lats, lons)], dtype=np.int64)
+            appended = np.where(slots >= 0, self._appended[slots], 0)
+        return slots, appended
+
+    def last_observed(self, lats, lons):
+        """Timestamp (ns) of each row's zone's newest observation; int64 min if unknown"""
+        with self._lock:
+            slots = np.array([self._zone_slot.get(self.zone_key(lat, lon), -1)
+                              for lat, lon in zip(lats, lons)], dtype=np.int64)
+            return np.where(slots >= 0, self._last_ts[slots], np.iinfo(np.int64).min)
+
+    def full_windows(self, lats, lons):
+        """Batch lookup: (mask, windows) for rows whose zone has a full window"""
+        with self._lock:
+            slots = np.array([self._zone_slot.get(self.zone_key(lat, lon), -1)
+                              for lat, lon in zip(lats, lons)], dtype=np.int64)
+            mask = slots >= 0
+            mask[mask] = self._count[slots[mask]] >= self.sequence_length
+            found = slots[mask]
+            steps = (self._head[found] + 1)[:, None] + np.arange(self.sequence_length)
+            windows = self._rows[found[:, None], steps]
+        return mask, windows
+
+    def stats(self):
+        with self._lock:
+            zones = len(self._zone_slot)
+            return {
+                'zones': zones,
+                'full_zones': int((self._count[:zones] >= self.sequence_length).sum()) if zones else 0,
+                'max_zones': self.max_zones,
+                'memory_bytes': int(self._rows.nbytes)
+            }
+
+    def snapshot(self, path):
+        """Write the buffer to disk atomically (np.savez)"""
+        with self._lock:
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_path,
+                rows=self._rows, head=self._head, count=self._count,
+                appended=self._appended, last_ts=self._last_ts,
+                zones=np.array([z or '' for z in self._slot_zone], dtype=str),
+                config=np.array([self.sequence_length, self.n_features, self.max_zones, self.zone_decimals])
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Restore a buffer written by snapshot()"""
+        with np.load(path) as data:
+            sequence_length, n_features, max_zones, zone_decimals = (int(v) for v in data['config'])
+            buffer = cls(sequence_length, n_features, max_zones, zone_decimals)
+            buffer._rows[...] = data['rows']
+            buffer._head[...] = data['head']
+            buffer._count[...] = data['count']
+            buffer._last_ts[...] = data['last_ts']
+            buffer._appended[...] = data['appended'] if 'appended' in data else data['count']
+            for slot, zone in enumerate(data['zones']):
+                if zone:
+                    buffer._zone_slot[str(zone)] = slot
+                    buffer._slot_zone[slot] = str(zone)
+        return buffer
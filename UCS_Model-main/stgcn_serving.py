@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+City-wide STGCN serving for the Traffic Prediction API
+Loads stgcn_model.pt with its serving bundle (zone centroids, kNN graph and
+the latest input window), predicts every zone in one forward pass and keeps
+the zone vector until the next time bucket. Point queries are answered from
+that vector through a nearest-centroid lookup, so the model runs once per
+bucket, not once per coordinate.
+"""
+
+import os
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import torch
+from scipy.spatial import cKDTree
+
+import GNN_PyG_spatio_temporal as gnn
+
+STGCN_MODEL_PATH = 'stgcn_model.pt'
+
+
+class ZoneForecaster:
+    """Per-zone STGCN predictions for the bucket after the input window.
+
+    The input window holds the last ``seq_len`` completed buckets. Live
+    observations are averaged per (bucket, zone) and rolled into the window
+    once their bucket has closed; zones without observations in a bucket get
+    zero rows, as in aggregate_per_zone. Until the first observation arrives
+    the window from training is served as-is.
+    """
+
+    def __init__(self, model, centroids, edge_index, window, window_end, step_minutes, feature_list,
+                 horizon=gnn.HORIZON):
+        self.model = model.eval()
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.edge_index = torch.as_tensor(np.asarray(edge_index), dtype=torch.long).to(gnn.DEVICE)
+        self.window = np.array(window, dtype=np.float32)  # (seq_len, Z, F)
+        self.window_end = pd.Timestamp(window_end)  # start of the newest bucket in the window
+        self.bucket = pd.Timedelta(minutes=int(step_minutes))
+        self.feature_list = list(feature_list)
+        self.horizon = horizon
+        self._tree = cKDTree(self.centroids)
+        self._pending = {}  # bucket start -> (feature sums (Z, F), counts (Z,))
+        self._cached = None  # (window end, zone vector)
+        self._lock = threading.Lock()
+        self.forward_passes = 0
+        self.requests = 0
+
+    @classmethod
+    def load(cls, model_path=STGCN_MODEL_PATH, bundle_path=gnn.SERVING_BUNDLE_PATH):
+        bundle = np.load(bundle_path)
+        window = bundle['window']
+        model = gnn.STGCN(in_dim=window.shape[0] * window.shape[2], hidden=int(bundle['hidden'])).to(gnn.DEVICE)
+        model.load_state_dict(torch.load(model_path, map_location=gnn.DEVICE))
+        return cls(model, bundle['centroids'], bundle['edge_index'], window, bundle['window_end'][()],
+                   int(bundle['step_minutes']), bundle['feature_list'].tolist(), int(bundle['horizon']))
+
+    @property
+    def n_zones(self):
+        return len(self.centroids)
+
+    def zones_for(self, lats, lons):
+        """Index of the nearest zone centroid for each point"""
+        points = np.column_stack([np.asarray(lats, dtype=np.float64).reshape(-1),
+                                  np.asarray(lons, dtype=np.float64).reshape(-1)])
+        return self._tree.query(points)[1]
+
+    def _bucket_of(self, timestamp):
+        return pd.Timestamp(timestamp).floor(self.bucket)
+
+    def observe(self, lats, lons, timestamps, rows):
+        """Add observation feature rows (n, F) in ``feature_list`` order; returns how many were kept"""
+        zones = self.zones_for(lats, lons)
+        buckets = pd.DatetimeIndex(pd.to_datetime(timestamps)).floor(self.bucket)
+        rows = np.asarray(rows, dtype=np.float32)
+        kept = 0
+        with self._lock:
+            for zone, bucket, row in zip(zones, buckets, rows):
+                if bucket <= self.window_end:
+                    continue  # its bucket is already part of the window
+                sums, counts = self._pending.setdefault(
+                    bucket, (np.zeros(self.window.shape[1:], dtype=np.float64), np.zeros(self.n_zones)))
+                sums[zone] += row
+                counts[zone] += 1
+                kept += 1
+        return kept
+
+    def _roll(self, bucket):
+        """Move closed pending buckets (< bucket) into the window"""
+        closed = sorted(b for b in self._pending if b < bucket)
+        if not closed:
+            return
+        # Every bucket between the old and the new window end gets a row, but
+        # only the last seq_len of them stay in the window
+        n_new = int((closed[-1] - self.window_end) / self.bucket)
+        keep = min(n_new, len(self.window))
+        rows = np.zeros((keep, *self.window.shape[1:]), dtype=np.float32)
+        for b in closed:
+            sums, counts = self._pending.pop(b)
+            i = int((b - self.window_end) / self.bucket) - 1 - (n_new - keep)
+            if i < 0:
+                continue
+            seen = counts > 0
+            rows[i, seen] = sums[seen] / counts[seen, None]
+        self.window = np.concatenate([self.window[keep:], rows])
+        self.window_end = closed[-1]
+        self._cached = None
+
+    @torch.no_grad()
+    def _forward(self):
+        seq_len, n_zones, _ = self.window.shape
+        x = self.window.transpose(1, 0, 2).reshape(1, n_zones, -1)  # as in make_graph_windows
+        data = SimpleNamespace(x=torch.from_numpy(np.ascontiguousarray(x)).to(gnn.DEVICE),
+                               edge_index=self.edge_index)
+        self.forward_passes += 1
+        return self.model(data)[0].cpu().numpy()
+
+    def zone_vector(self, timestamp):
+        """(predictions (Z,), bucket start, cached) for the bucket containing ``timestamp``"""
+        bucket = self._bucket_of(timestamp)
+        with self._lock:
+            self.requests += 1
+            self._roll(bucket)
+            # The prediction depends only on the window, so every request
+            # between two rolls shares one forward pass
+            if self._cached is not None and self._cached[0] == self.window_end:
+                return self._cached[1], bucket, True
+            vector = self._forward()
+            self._cached = (self.window_end, vector)
+            return vector, bucket, False
+
+    def predict_points(self, lats, lons, timestamp):
+        """(predictions, zone ids, bucket start, cached) for many points at one time"""
+        vector, bucket, cached = self.zone_vector(timestamp)
+        zones = self.zones_for(lats, lons)
+        return vector[zones], zones, bucket, cached
+
+    def forecast_time(self):
+        """Timestamp the current window's predictions refer to"""
+        return self.window_end + self.horizon * self.bucket
+
+    def stats(self):
+        return {
+            'zones': self.n_zones,
+            'target': self.feature_list[0],
+            'bucket_minutes': int(self.bucket / pd.Timedelta(minutes=1)),
+            'window_end': self.window_end.isoformat(),
+            'pending_buckets': len(self._pending),
+            'requests': self.requests,
+            'forward_passes': self.forward_passes,
+        }
+
+
+def load_zone_forecaster(model_path=None, bundle_path=None):
+    """ZoneForecaster from $STGCN_MODEL_PATH / $STGCN_BUNDLE_PATH, or None if not trained"""
+    model_path = model_path or os.environ.get('STGCN_MODEL_PATH', STGCN_MODEL_PATH)
+    bundle_path = bundle_path or os.environ.get('STGCN_BUNDLE_PATH', gnn.SERVING_BUNDLE_PATH)
+    if not (os.path.exists(model_path) and os.path.exists(bundle_path)):
+        return None
+    return ZoneForecaster.load(model_path, bundle_path)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Incremental inference for stacked LSTM models in the Traffic Prediction API
+Keeps each zone's LSTM hidden/cell state and advances it one timestep per new
+observation, with a periodic full-window recompute to bound drift
+"""
+
+import threading
+import numpy as np
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+SUPPORTED_LAYERS = {'InputLayer', 'LSTM', 'Dropout', 'Dense'}
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+}
+
+
+def streaming_unsupported_reason(model):
+    """Return why a Keras model can't be streamed, or None if it can.
+
+    Streaming needs a plain stack of LSTM layers followed by Dense layers
+    (Dropout is ignored at inference). Layers such as Attention look at the
+    whole window, so those models always use full-window inference.
+    """
+    layers = [layer for layer in model.layers if type(layer).__name__ != 'InputLayer']
+    names = [type(layer).__name__ for layer in layers]
+    unsupported = sorted(set(names) - SUPPORTED_LAYERS)
+    if unsupported:
+        return f"unsupported layers: {', '.join(unsupported)}"
+
+    lstms = [layer for layer, name in zip(layers, names) if name == 'LSTM']
+    if not lstms:
+        return 'no LSTM layers'
+    last_lstm = len(names) - 1 - names[::-1].index('LSTM')
+    if 'Dense' in names[:last_lstm]:
+        return 'LSTM layers must be stacked before the Dense head'
+
+    for i, layer in enumerate(lstms):
+        config = layer.get_config()
+        if config.get('go_backwards') or not config.get('use_bias', True):
+            return f"{layer.name}: go_backwards/no-bias LSTMs are not supported"
+        if config.get('activation') != 'tanh' or config.get('recurrent_activation') != 'sigmoid':
+            return f"{layer.name}: only tanh/sigmoid LSTMs are supported"
+        if config.get('return_sequences') != (i < len(lstms) - 1):
+            return f"{layer.name}: only the last LSTM may return a single step"
+    for layer in layers[last_lstm + 1:]:
+        if type(layer).__name__ == 'Dense' and layer.get_config().get('activation') not in ACTIVATIONS:
+            return f"{layer.name}: unsupported activation"
+    return None
+
+
+class StreamingLSTM:
+    """Per-slot LSTM state for a stacked LSTM + Dense Keras model.
+
+    State is indexed by SequenceRingBuffer slot and tagged with the slot's
+    ``appended`` count, so a state is only reused when it is exactly one row
+    behind the buffer. Otherwise, and every ``recompute_every`` steps, the
+    state is rebuilt from the zone's full window, which matches full-window
+    inference exactly.
+    """
+
+    def __init__(self, model, max_zones=10000, recompute_every=12):
+        reason = streaming_unsupported_reason(model)
+        if reason:
+            raise ValueError(f"Model cannot be streamed: {reason}")
+
+        self.recompute_every = recompute_every
+        self.lstm_layers = []
+        self.dense_layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind == 'LSTM':
+                kernel, recurrent_kernel, bias = (w.astype(np.float32) for w in layer.get_weights())
+                self.lstm_layers.append((kernel, recurrent_kernel, bias))
+            elif kind == 'Dense':
+                weights = [w.astype(np.float32) for w in layer.get_weights()]
+                bias = weights[1] if len(weights) > 1 else np.zeros(weights[0].shape[1], dtype=np.float32)
+                self.dense_layers.append((weights[0], bias, ACTIVATIONS[layer.get_config()['activation']]))
+        self.n_features = self.lstm_layers[0][0].shape[0]
+
+        self._h = [np.zeros((max_zones, k.shape[1] // 4), dtype=np.float32) for k, _, _ in self.lstm_layers]
+        self._c = [np.zeros_like(h) for h in self._h]
+        self._output = np.zeros(max_zones, dtype=np.float32)
+        self._appended = np.full(max_zones, -1, dtype=np.int64)
+        self._steps = np.zeros(max_zones, dtype=np.int64)
+        self._lock = threading.Lock()
+        self.recomputes = 0
+        self.steps = 0
+
+    def _cell(self, layer, x, h, c):
+        kernel, recurrent_kernel, bias = self.lstm_layers[layer]
+        z = x @ kernel + h @ recurrent_kernel + bias
+        i, f, g, o = np.split(z, 4, axis=-1)
+        c = _sigmoid(f) * c + _sigmoid(i) * np.tanh(g)
+        h = _sigmoid(o) * np.tanh(c)
+        return h, c
+
+    def _head(self, h):
+        out = h
+        for kernel, bias, activation in self.dense_layers:
+            out = activation(out @ kernel + bias)
+        return out[:, 0]
+
+    def run(self, windows):
+        """Full-window inference from zero state: (B, T, F) -> (outputs, h, c)"""
+        windows = np.asarray(windows, dtype=np.float32)
+        batch = len(windows)
+        h = [np.zeros((batch, k.shape[1] // 4), dtype=np.float32) for k, _, _ in self.lstm_layers]
+        c = [np.zeros_like(state) for state in h]
+        for t in range(windows.shape[1]):
+            x = windows[:, t]
+            for layer in range(len(self.lstm_layers)):
+                h[layer], c[layer] = self._cell(layer, x, h[layer], c[layer])
+                x = h[layer]
+        return self._head(h[-1]), h, c
+
+    def advance(self, slot, appended, row, window):
+        """Advance one zone by a new scaled row and return its scaled prediction.
+
+        ``window`` is a callable returning the zone's scaled (T, F) window; it
+        is only called when the state has to be rebuilt.
+        """
+        with self._lock:
+            if self._appended[slot] == appended - 1 and self._steps[slot] < self.recompute_every:
+                x = np.asarray(row, dtype=np.float32)[None]
+                for layer in range(len(self.lstm_layers)):
+                    h, c = self._cell(layer, x, self._h[layer][slot:slot + 1], self._c[layer][slot:slot + 1])
+                    self._h[layer][slot], self._c[layer][slot] = h[0], c[0]
+                    x = h
+                output = self._head(x)[0]
+                self._steps[slot] += 1
+                self.steps += 1
+            else:
+                outputs, h, c = self.run(window()[None])
+                for layer in range(len(self.lstm_layers)):
+                    self._h[layer][slot], self._c[layer][slot] = h[layer][0], c[layer][0]
+                output = outputs[0]
+                self._steps[slot] = 0
+                self.recomputes += 1
+            self._output[slot] = output
+            self._appended[slot] = appended
+            return float(output)
+
+    def cached(self, slots, appended):
+        """Return (mask, outputs) for slots whose state matches ``appended``"""
+        slots = np.asarray(slots, dtype=np.int64)
+        with self._lock:
+            mask = slots >= 0
+            mask[mask] = self._appended[slots[mask]] == np.asarray(appended)[mask]
+            return mask, self._output[slots[mask]].copy()
+
+    def stats(self):
+        return {
+            'steps': self.steps,
+            'recomputes': self.recomputes,
+            'recompute_every': self.recompute_every
+        }
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Distilled surrogate for the Traffic Prediction API hot path
+Single-location requests without observation history only vary in
+(lat, lon, hour, day of week), so a small regressor trained on the model's
+own outputs can stand in for the LSTM forward pass. The time/location
+adjustments are still applied exactly on top of the surrogate output.
+
+Usage:
+    python surrogate_model.py                  # gradient-boosted trees
+    python surrogate_model.py --kind mlp --locations 4000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+MODELS_DIR = os.path.join(API_DIR, 'models')
+SURROGATE_PATH = os.path.join(MODELS_DIR, 'surrogate.pkl')
+SURROGATE_REPORT_PATH = os.path.join(MODELS_DIR, 'surrogate_report.json')
+DEFAULT_BOUNDS = (16.3, 16.7, 80.4, 80.8)  # lat_min, lat_max, lon_min, lon_max around Vijayawada
+REFERENCE_WEEK = pd.Timestamp('2024-01-01')  # a Monday, so offsets map to day_of_week 0-6
+
+
+def surrogate_features(lats, lons, dt):
+    """(n, 4) surrogate inputs: lat, lon, hour, day_of_week"""
+    return np.column_stack([
+        np.asarray(lats, dtype=np.float64),
+        np.asarray(lons, dtype=np.float64),
+        dt.hour.to_numpy(),
+        dt.dayofweek.to_numpy(),
+    ])
+
+
+def make_estimator(kind='gbt'):
+    """Untrained surrogate regressor"""
+    if kind == 'gbt':
+        # Few, wide trees: single-row predict cost grows with the tree count
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        return HistGradientBoostingRegressor(max_iter=60, learning_rate=0.3, max_leaf_nodes=127,
+                                             categorical_features=[2, 3], random_state=0)
+    if kind == 'mlp':
+        from sklearn.neural_network import MLPRegressor
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+        from sklearn.compose import ColumnTransformer
+        encode = ColumnTransformer([('location', StandardScaler(), [0, 1]),
+                                    ('time', OneHotEncoder(handle_unknown='ignore'), [2, 3])])
+        return make_pipeline(encode, MLPRegressor(hidden_layer_sizes=(64, 64), early_stopping=True, max_iter=300, random_state=0))
+    raise ValueError(f"Unknown surrogate kind: {kind}")
+
+
+class TrafficSurrogate:
+    """Regressor that replaces the model forward pass inside ``bounds``.
+
+    ``teacher_checksum`` is the checksum of the model it was distilled from;
+    the API only serves it while that model is loaded.
+    """
+
+    def __init__(self, estimator, kind, bounds, teacher_checksum):
+        self.estimator = estimator
+        self.kind = kind
+        self.bounds = tuple(bounds)
+        self.teacher_checksum = teacher_checksum
+        self.metrics = {}
+
+    def covers(self, lats, lons):
+        """Mask of points inside the region the surrogate was trained on"""
+        lat_min, lat_max, lon_min, lon_max = self.bounds
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        return (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+
+    def predict(self, lats, lons, dt):
+        """Model occupancy (0-100) for a DatetimeIndex ``dt``"""
+        return np.clip(self.estimator.predict(surrogate_features(lats, lons, dt)), 0, 100)
+
+    def save(self, path=SURROGATE_PATH):
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path=SURROGATE_PATH):
+        return joblib.load(path)
+
+
+def sample_locations(n, bounds, seed=0):
+    """Uniform random (lats, lons) inside bounds"""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    rng = np.random.default_rng(seed)
+    return rng.uniform(lat_min, lat_max, n), rng.uniform(lon_min, lon_max, n)
+
+
+def benchmark_grid(bounds, step=0.02, minute=30):
+    """Fixed lattice of locations x every hour of the reference week"""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    lat_grid, lon_grid = np.meshgrid(np.arange(lat_min, lat_max + 1e-9, step),
+                                     np.arange(lon_min, lon_max + 1e-9, step), indexing='ij')
+    week = REFERENCE_WEEK + pd.to_timedelta(np.arange(7 * 24) * 60 + minute, unit='min')
+    return _cross(lat_grid.ravel(), lon_grid.ravel(), week)
+
+
+def _cross(lats, lons, times):
+    """Every location at every time -> flat (lats, lons, DatetimeIndex)"""
+    index = np.repeat(np.arange(len(lats)), len(times))
+    return lats[index], lons[index], pd.DatetimeIndex(np.tile(times.as_unit('ns').asi8, len(lats)))
+
+
+def _in_chunks(fn, lats, lons, dt, chunk_size=8192):
+    """Concatenate fn over row chunks to bound model batch memory"""
+    return np.concatenate([fn(lats[i:i + chunk_size], lons[i:i + chunk_size], dt[i:i + chunk_size])
+                           for i in range(0, len(lats), chunk_size)])
+
+
+def _latency_ms(fn, n, repeats):
+    """p50/p95 latency in ms of fn(i) over `repeats` calls"""
+    fn(0)  # warm up
+    samples = []
+    for r in range(repeats):
+        start = time.perf_counter()
+        fn(r % n)
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 95))
+
+
+def distill(kind='gbt', n_locations=2000, bounds=DEFAULT_BOUNDS, grid_step=0.02, repeats=200, seed=0):
+    """Train a surrogate on model outputs, report fidelity/speedup, and save both.
+
+    The API must already be loaded (``load_model_and_scalers``).
+    """
+    import traffic_prediction_api as api
+
+    def teacher(lats, lons, dt):
+        return api.model_occupancy_batch(lats, lons, dt, use_history=False)[0]
+
+    # Training pairs: random locations at every hour of the reference week
+    week = REFERENCE_WEEK + pd.to_timedelta(np.arange(7 * 24), unit='h')
+    lats, lons, dt = _cross(*sample_locations(n_locations, bounds, seed), week)
+    print(f"🧪 Generating {len(lats)} teacher outputs...")
+    targets = _in_chunks(teacher, lats, lons, dt)
+
+    print(f"🏋️  Training {kind} surrogate...")
+    start = time.perf_counter()
+    surrogate = TrafficSurrogate(make_estimator(kind), kind, bounds, api.model_checksum)
+    surrogate.estimator.fit(surrogate_features(lats, lons, dt), targets)
+    train_seconds = time.perf_counter() - start
+
+    # Fidelity and bulk speed on the fixed grid, compared on final API outputs
+    grid_lats, grid_lons, grid_dt = benchmark_grid(bounds, grid_step)
+    start = time.perf_counter()
+    full = _in_chunks(lambda a, b, t: api.predict_traffic_batch(a, b, t, use_history=False)['prediction'],
+                      grid_lats, grid_lons, grid_dt)
+    full_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = api.adjust_traffic_batch(surrogate.predict(grid_lats, grid_lons, grid_dt),
+                                    grid_lats, grid_lons, grid_dt)['prediction']
+    fast_seconds = time.perf_counter() - start
+    errors = np.abs(fast - full)
+
+    # Single-request latency, the map-tile hot path
+    def full_request(i):
+        api.predict_traffic_batch(grid_lats[i:i + 1], grid_lons[i:i + 1], grid_dt[i:i + 1], use_history=False)
+
+    def fast_request(i):
+        pred = surrogate.predict(grid_lats[i:i + 1], grid_lons[i:i + 1], grid_dt[i:i + 1])
+        api.adjust_traffic_batch(pred, grid_lats[i:i + 1], grid_lons[i:i + 1], grid_dt[i:i + 1])
+
+    full_p50, full_p95 = _latency_ms(full_request, len(grid_lats), repeats)
+    fast_p50, fast_p95 = _latency_ms(fast_request, len(grid_lats), repeats)
+
+    surrogate.metrics = {
+        'mae': float(errors.mean()),
+        'p95_abs_error': float(np.percentile(errors, 95)),
+        'max_abs_error': float(errors.max()),
+    }
+    report = {
+        'created': datetime.now().isoformat(),
+        'kind': kind,
+        'teacher_checksum': api.model_checksum,
+        'bounds': list(bounds),
+        'training_rows': int(len(lats)),
+        'train_seconds': train_seconds,
+        'grid': {'step_degrees': grid_step, 'rows': int(len(grid_lats))},
+        'fidelity': surrogate.metrics,
+        'latency_ms': {'full_p50': full_p50, 'full_p95': full_p95,
+                       'surrogate_p50': fast_p50, 'surrogate_p95': fast_p95},
+        'single_request_speedup': full_p50 / fast_p50,
+        'bulk_rows_per_second': {'full': len(grid_lats) / full_seconds,
+                                 'surrogate': len(grid_lats) / fast_seconds},
+        'bulk_speedup': full_seconds / fast_seconds,
+    }
+
+    surrogate.save(SURROGATE_PATH)
+    with open(SURROGATE_REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"📊 Grid of {len(grid_lats)} rows: MAE {surrogate.metrics['mae']:.3f}, "
+          f"p95 {surrogate.metrics['p95_abs_error']:.3f}, max {surrogate.metrics['max_abs_error']:.3f}")
+    print(f"⚡ Single request p50 {full_p50:.2f} ms -> {fast_p50:.2f} ms "
+          f"({report['single_request_speedup']:.1f}x), bulk {report['bulk_speedup']:.1f}x")
+    print(f"✅ Surrogate saved to {SURROGATE_PATH}, report to {SURROGATE_REPORT_PATH}")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distill a fast surrogate of the traffic model')
+    parser.add_argument('--kind', choices=['gbt', 'mlp'], default='gbt')
+    parser.add_argument('--locations', type=int, default=2000, help='Random training locations')
+    parser.add_argument('--bounds', type=float, nargs=4, default=DEFAULT_BOUNDS,
+                        metavar=('LAT_MIN', 'LAT_MAX', 'LON_MIN', 'LON_MAX'))
+    parser.add_argument('--grid-step', type=float, default=0.02, help='Benchmark grid spacing in degrees')
+    parser.add_argument('--repeats', type=int, default=200, help='Single-request latency samples')
+    args = parser.parse_args()
+
+    os.chdir(API_DIR)
+    import traffic_prediction_api as api
+    if not api.load_model_and_scalers():
+        sys.exit(1)
+    # Pickle the surrogate under its module name, not __main__
+    from surrogate_model import distill
+    distill(args.kind, args.locations, tuple(args.bounds), args.grid_step, args.repeats)
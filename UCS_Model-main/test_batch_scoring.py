@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Batch scoring test
+Runs batch scoring twice into the SQLite stand-in and checks that the second
+run refreshes the stored predictions instead of adding rows
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+from batch_scoring import SQLitePredictionStore, run_batch
+
+HOURS = 5
+SEGMENTS = [('seg-1', 'Benz Circle', 16.4990, 80.6560, 'arterial', 50),
+            ('seg-2', 'MG Road', 16.5062, 80.6480, 'arterial', 50),
+            ('seg-3', 'NH-16 Bypass', 16.5200, 80.6200, 'highway', 80)]
+
+print("=" * 60)
+print("   BATCH SCORING TEST")
+print("=" * 60)
+print()
+
+failures = []
+
+
+def check(name, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {name}{': ' + detail if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+db_path = os.path.join(tempfile.mkdtemp(), 'predictions.db')
+store = SQLitePredictionStore(sqlite3.connect(db_path))
+store.connection.executemany(
+    "INSERT INTO traffic_segments (id, segment_name, latitude, longitude, road_type, speed_limit) "
+    "VALUES (?, ?, ?, ?, ?, ?)", SEGMENTS)
+store.connection.commit()
+store.close()
+
+
+def stored_rows():
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    finally:
+        connection.close()
+
+
+expected = len(SEGMENTS) * HOURS
+for run in (1, 2):
+    scored = run_batch(f"sqlite:///{db_path}", hours=HOURS, start='2024-03-15T08:00:00')
+    check(f"run {run} scored {expected} rows", scored == expected, f"got {scored}")
+    check(f"run {run} leaves {expected} stored rows", stored_rows() == expected, f"got {stored_rows()}")
+
+print()
+print("=" * 60)
+if failures:
+    print(f"   ❌ FAILED: {', '.join(failures)}")
+    print("=" * 60)
+    sys.exit(1)
+print("   ✅ ALL TESTS PASSED!")
+print("=" * 60)
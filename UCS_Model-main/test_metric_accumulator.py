@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Streamed evaluation metrics test
+Checks that RMSE/MAE/MAPE accumulated batch by batch (overall and per group)
+match a one-shot computation, that (N, 1) predictions against (N,) targets
+are not broadcast, and that real size mismatches raise ValueError
+"""
+
+import os
+import sys
+
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(API_DIR, '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from ml_models import MetricAccumulator, ModelEvaluator
+
+TOLERANCE = 1e-9
+
+print("=" * 60)
+print("   STREAMED METRICS TEST")
+print("=" * 60)
+print()
+
+failures = []
+
+
+def check(name, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {name}{': ' + detail if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def one_shot(y_true, y_pred):
+    error = y_true - y_pred
+    return {'rmse': np.sqrt(np.mean(error ** 2)), 'mae': np.mean(np.abs(error)),
+            'mape': np.mean(np.abs(error / (y_true + 1e-8))) * 100}
+
+
+def matches(streamed, expected):
+    return all(abs(streamed[k] - expected[k]) <= TOLERANCE * max(1.0, abs(expected[k])) for k in expected)
+
+
+rng = np.random.default_rng(0)
+y_true = rng.uniform(20, 80, size=1000)
+y_pred = y_true + rng.normal(0, 5, size=1000)
+hours = rng.integers(0, 24, size=1000)
+
+# 1. Batches of (N, 1) predictions stream to the one-shot metrics
+accumulator = MetricAccumulator()
+for start in range(0, len(y_true), 128):
+    batch = slice(start, start + 128)
+    accumulator.update(y_true[batch], y_pred[batch].reshape(-1, 1), groups=hours[batch])
+total = accumulator.total()
+expected = one_shot(y_true, y_pred)
+check("streamed total matches one-shot", matches(total, expected) and total['samples'] == len(y_true),
+      f"RMSE {total['rmse']:.6f} vs {expected['rmse']:.6f}")
+
+# 2. Per-group metrics match one-shot metrics on each group
+by_hour = accumulator.by_group('hour')
+check("one row per hour", [row['hour'] for row in by_hour] == sorted(set(hours.tolist())))
+check("per-hour metrics match one-shot", all(
+    matches(row, one_shot(y_true[hours == row['hour']], y_pred[hours == row['hour']])) for row in by_hour))
+
+# 3. The one-shot helpers flatten (N, 1) instead of broadcasting to (N, N)
+evaluator = ModelEvaluator()
+column = y_pred.reshape(-1, 1)
+for name, fn in [('rmse', evaluator.calculate_rmse), ('mae', evaluator.calculate_mae),
+                 ('mape', evaluator.calculate_mape)]:
+    value = fn(y_true, column)
+    check(f"calculate_{name} with (N, 1) predictions", abs(value - expected[name]) <= TOLERANCE * expected[name],
+          f"{value:.6f} vs {expected[name]:.6f}")
+
+# 4. Real size mismatches raise instead of broadcasting
+for name, call in [('update', lambda: MetricAccumulator().update(y_true[:10], y_pred[:9])),
+                   ('update with groups', lambda: MetricAccumulator().update(y_true[:10], y_pred[:10], hours[:9])),
+                   ('calculate_rmse', lambda: evaluator.calculate_rmse(y_true[:10], y_pred[:1]))]:
+    try:
+        call()
+        check(f"{name} size mismatch raises ValueError", False, "no error raised")
+    except ValueError as e:
+        check(f"{name} size mismatch raises ValueError", True, str(e))
+
+print()
+print("=" * 60)
+if failures:
+    print(f"   ❌ FAILED: {', '.join(failures)}")
+    print("=" * 60)
+    sys.exit(1)
+print("   ✅ ALL TESTS PASSED!")
+print("=" * 60)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Observed-history test
+Ingests a full window of live observations for one zone through the API and
+checks which request times are served from that history, and that cached
+routes through the zone are invalidated
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+os.environ['SEQUENCE_BUFFER_PATH'] = os.path.join(tempfile.mkdtemp(), 'sequence_buffer.npz')
+import traffic_prediction_api as api
+
+print("=" * 60)
+print("   OBSERVED HISTORY TEST")
+print("=" * 60)
+print()
+
+failures = []
+
+
+def check(name, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {name}{': ' + detail if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+if not api.load_model_and_scalers():
+    print("❌ Could not load the model")
+    sys.exit(1)
+client = api.app.test_client()
+
+lat, lon = 16.5062, 80.6480
+seq_len = api.sequence_buffer.sequence_length
+start = pd.Timestamp('2024-03-15T08:00:00')
+times = [start + pd.Timedelta(minutes=5 * i) for i in range(seq_len)]
+observations = [{'latitude': lat, 'longitude': lon, 'timestamp': t.isoformat(),
+                 'Vehicle_Count': 180 + 5 * i, 'Traffic_Speed_kmh': 35, 'Weather_Condition': 'Clear'}
+                for i, t in enumerate(times)]
+waypoints = [{'latitude': lat, 'longitude': lon}, {'latitude': 16.5180, 'longitude': 80.6300}]
+route_key = api.route_cache_key(waypoints, times[-1])[0]
+response = client.post('/api/observations', json={'observations': observations})
+check(f"ingested {seq_len} observations", response.status_code == 200, str(response.get_json()))
+check("route cache key changes with new observations", api.route_cache_key(waypoints, times[-1])[0] != route_key)
+
+# The newest observation's bucket and the next one use history; later times don't
+for offset, expected in [(0, True), (2, True), (5, True), (7, True), (12, False)]:
+    timestamp = (times[-1] + pd.Timedelta(minutes=offset)).isoformat()
+    response = client.post('/api/predict', json={'latitude': lat, 'longitude': lon, 'timestamp': timestamp})
+    observed = response.get_json().get('factors', {}).get('observed_history')
+    check(f"+{offset} min observed_history is {expected}", observed is expected, f"got {observed}")
+
+print()
+print("=" * 60)
+if failures:
+    print(f"   ❌ FAILED: {', '.join(failures)}")
+    print("=" * 60)
+    sys.exit(1)
+print("   ✅ ALL TESTS PASSED!")
+print("=" * 60)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Shared prediction cache test
+Checks that SharedTTLCache computes a key once for concurrent misses across
+threads and processes, expires entries after their TTL, and recovers from a
+lease left behind by a crashed worker
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import get_context
+
+from prediction_cache import SharedTTLCache
+
+COMPUTE_SECONDS = 0.3
+
+failures = []
+
+
+def check(name, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {name}{': ' + detail if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def _process_worker(path, barrier, computes, results):
+    """One API worker process missing the same key as its siblings"""
+    cache = SharedTTLCache(path=path)
+
+    def compute():
+        with computes.get_lock():
+            computes.value += 1
+        time.sleep(COMPUTE_SECONDS)
+        return {'prediction': 42.0}
+
+    barrier.wait()
+    value, _ = cache.get_or_compute('predict:process', compute)
+    results.put(value['prediction'])
+
+
+def main():
+    print("=" * 60)
+    print("   SHARED PREDICTION CACHE TEST")
+    print("=" * 60)
+    print()
+    path = os.path.join(tempfile.mkdtemp(), 'cache.sqlite')
+
+    # 1. Concurrent misses in one process run compute() once
+    cache = SharedTTLCache(path=path)
+    computes = []
+
+    def compute():
+        computes.append(1)
+        time.sleep(COMPUTE_SECONDS)
+        return {'prediction': 7.5}
+
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(cache.get_or_compute('predict:threads', compute)))
+               for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check("16 threads, one compute", len(computes) == 1, f"{len(computes)} computes")
+    check("every thread got the value", [v for v, _ in values] == [{'prediction': 7.5}] * 16)
+    check("15 threads served without computing", sum(cached for _, cached in values) == 15)
+
+    # 2. Concurrent misses across processes run compute() once
+    context = get_context('spawn')
+    barrier = context.Barrier(4)
+    process_computes = context.Value('i', 0)
+    results = context.Queue()
+    processes = [context.Process(target=_process_worker, args=(path, barrier, process_computes, results))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    got = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+    check("4 processes, one compute", process_computes.value == 1, f"{process_computes.value} computes")
+    check("every process got the value", got == [42.0] * 4, str(got))
+
+    # 3. Entries expire after their TTL
+    cache.set('predict:ttl', {'prediction': 1.0}, ttl_seconds=0.2)
+    check("fresh entry is served", cache.get('predict:ttl') == {'prediction': 1.0})
+    time.sleep(0.3)
+    check("expired entry is gone", cache.get('predict:ttl') is None)
+    _, cached = cache.get_or_compute('predict:ttl', lambda: {'prediction': 2.0})
+    check("expired entry is recomputed", cached is False)
+
+    # 4. A lease held by a crashed worker is taken over once it expires
+    crashed = SharedTTLCache(path=path, lease_seconds=0.5)
+    check("crashed worker took the lease", crashed._acquire_lease('predict:crash'))
+    survivor = SharedTTLCache(path=path, lease_seconds=0.5)
+    start = time.monotonic()
+    value, cached = survivor.get_or_compute('predict:crash', lambda: {'prediction': 3.0})
+    waited = time.monotonic() - start
+    check("survivor computes after the lease expires", value == {'prediction': 3.0} and cached is False)
+    check("survivor waits at most one lease", waited < 0.5 + 0.5, f"waited {waited:.2f}s")
+    check("survivor's value is shared", crashed.get('predict:crash') == {'prediction': 3.0})
+
+    print()
+    print("=" * 60)
+    if failures:
+        print(f"   ❌ FAILED: {', '.join(failures)}")
+        print("=" * 60)
+        sys.exit(1)
+    print("   ✅ ALL TESTS PASSED!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Region model router test
+Checks ModelRouter.get with a fake loader: least-recently-used eviction,
+one load for concurrent first requests to a region, and retrying a region
+after its load failed
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from region_router import ModelRouter, RegionIndex, RegionSpec
+
+LOAD_SECONDS = 0.2
+
+print("=" * 60)
+print("   REGION ROUTER TEST")
+print("=" * 60)
+print()
+
+failures = []
+
+
+def check(name, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {name}{': ' + detail if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def make_region(name, lat):
+    path = os.path.join(tempfile.mkdtemp(), name)
+    os.makedirs(path)
+    with open(os.path.join(path, 'best_model.h5'), 'wb') as f:
+        f.write(name.encode())
+    return RegionSpec(name, (lat, lat + 1, 80.0, 81.0), path)
+
+
+class FakeLoader:
+    """Counts loads per region; fails the first load of regions in ``fail_once``"""
+
+    def __init__(self, fail_once=()):
+        self.calls = Counter()
+        self.fail_once = set(fail_once)
+        self.lock = threading.Lock()
+
+    def __call__(self, spec):
+        with self.lock:
+            self.calls[spec.name] += 1
+            fail = spec.name in self.fail_once
+            self.fail_once.discard(spec.name)
+        time.sleep(LOAD_SECONDS)
+        if fail:
+            raise OSError(f"{spec.name}: corrupt model file")
+        return SimpleNamespace(spec=spec, load_seconds=0.0, warmup_seconds=0.0)  # like RegionBundle
+
+
+def concurrent_gets(router, region_id, n_threads):
+    """(bundles, errors) from n_threads first requests to one region"""
+    bundles, errors = [], []
+
+    def request():
+        try:
+            bundles.append(router.get(region_id))
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return bundles, errors
+
+
+index = RegionIndex([make_region(f"r{i}", 10.0 + 2 * i) for i in range(4)])
+
+# 1. The least recently used bundle is evicted
+loader = FakeLoader()
+warmups = Counter()
+router = ModelRouter(index, max_resident=2, loader=loader,
+                     warmup=lambda bundle, batch_size: warmups.update([bundle.spec.name]))
+router.get(0)
+router.get(1)
+router.get(0)  # r0 becomes the most recently used
+router.get(2)
+stats = router.stats()
+check("LRU region evicted", list(stats['resident']) == ['r0', 'r2'], str(list(stats['resident'])))
+check("hit served from memory", stats['hits'] == 1 and stats['loads'] == 3 and stats['evictions'] == 1, str(stats))
+router.get(1)
+check("evicted region reloads", loader.calls['r1'] == 2 and list(router.stats()['resident']) == ['r2', 'r1'])
+check("each load warmed up once", warmups == loader.calls, str(dict(warmups)))
+
+# 2. Concurrent first requests share one load
+loader = FakeLoader()
+router = ModelRouter(index, max_resident=2, loader=loader)
+bundles, errors = concurrent_gets(router, 3, 16)
+check("16 concurrent requests, one load", loader.calls['r3'] == 1, f"{loader.calls['r3']} loads")
+check("every request got the same bundle", len(bundles) == 16 and all(b is bundles[0] for b in bundles)
+      and not errors)
+
+# 3. A failed load is reported to its request, and waiting requests retry
+loader = FakeLoader(fail_once={'r3'})
+router = ModelRouter(index, max_resident=2, loader=loader)
+bundles, errors = concurrent_gets(router, 3, 8)
+check("failed load raises for one request", len(errors) == 1, f"{len(errors)} errors")
+check("waiting requests retry and load", len(bundles) == 7 and loader.calls['r3'] == 2,
+      f"{len(bundles)} bundles, {loader.calls['r3']} loads")
+stats = router.stats()
+check("failure counted, region resident", stats['load_errors'] == 1 and list(stats['resident']) == ['r3'],
+      str(stats))
+
+print()
+print("=" * 60)
+if failures:
+    print(f"   ❌ FAILED: {', '.join(failures)}")
+    print("=" * 60)
+    sys.exit(1)
+print("   ✅ ALL TESTS PASSED!")
+print("=" * 60)
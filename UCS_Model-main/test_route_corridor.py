@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Route corridor test
+Checks that collapsed corridor cells keep the departure's local time,
+for naive and timezone-aware departures, and that malformed polylines
+are rejected
+"""
+
+import sys
+import pandas as pd
+
+from route_corridor import collapse_cells, decode_polyline, resample_polyline
+
+print("=" * 60)
+print("   ROUTE CORRIDOR TEST")
+print("=" * 60)
+print()
+
+failures = []
+
+
+def check(name, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {name}{': ' + detail if detail else ''}")
+    if not ok:
+        failures.append(name)
+
+
+points = decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+samples, distance_km = resample_polyline(points, spacing_m=500)
+
+# 1. Naive and offset departures bucket to the same wall-clock times
+for departure in [pd.Timestamp('2024-03-15T08:05:00'), pd.Timestamp('2024-03-15T08:05:00+05:30')]:
+    arrival = departure + pd.to_timedelta(distance_km / 50 * 60, unit='min')
+    _, _, cell_times, inverse = collapse_cells(samples, arrival, 3, 15)
+    expected = pd.DatetimeIndex(arrival).floor('15min')
+    same = cell_times[inverse].equals(expected)
+    check(f"cell times for departure {departure.isoformat()}", same,
+          f"first cell {cell_times[inverse][0].isoformat()}")
+    check(f"hour of day kept for departure {departure.isoformat()}",
+          int(cell_times[inverse][0].hour) == 8)
+
+# 2. A truncated polyline is rejected as malformed (a 400 from the API)
+try:
+    decode_polyline('_p~iF~ps|U_')
+    check("truncated polyline rejected", False, "no error raised")
+except ValueError as e:
+    check("truncated polyline rejected", True, str(e))
+except Exception as e:
+    check("truncated polyline rejected", False, f"{type(e).__name__}: {e}")
+
+print()
+if failures:
+    print(f"❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+    sys.exit(1)
+print("✅ All route corridor checks passed")
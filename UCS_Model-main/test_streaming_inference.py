@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Equivalence test for streaming LSTM inference
+Checks that incremental per-zone LSTM state matches full-window inference
+"""
+
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+
+from streaming_lstm import StreamingLSTM, streaming_unsupported_reason
+
+TOLERANCE = 1e-4
+
+print("=" * 60)
+print("   STREAMING INFERENCE TEST")
+print("=" * 60)
+print()
+
+model_file = 'models/traffic_prediction_model.h5'
+if os.path.exists(model_file):
+    print(f"📥 Loading stacked LSTM from {model_file}")
+    model = tf.keras.models.load_model(model_file, compile=False)
+else:
+    print("⚠️  No trained model found, using a randomly initialized stacked LSTM")
+    model = tf.keras.Sequential([
+        tf.keras.Input((24, 22)),
+        tf.keras.layers.LSTM(128, return_sequences=True),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.LSTM(64),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(32, activation='relu'),
+        tf.keras.layers.Dense(1)
+    ])
+
+seq_length, n_features = model.input_shape[1], model.input_shape[2]
+stream = StreamingLSTM(model, max_zones=8, recompute_every=6)
+rng = np.random.default_rng(0)
+series = rng.uniform(0, 1, size=(8, seq_length + 20, n_features)).astype(np.float32)
+
+# Same layers over a variable-length input, to score windows longer than seq_length
+inputs = tf.keras.Input((None, n_features))
+x = inputs
+for layer in model.layers:
+    x = layer(x)
+variable_model = tf.keras.Model(inputs, x)
+
+failures = []
+
+
+def check(name, expected, actual):
+    error = float(np.max(np.abs(np.asarray(expected).reshape(-1) - np.asarray(actual).reshape(-1))))
+    ok = error <= TOLERANCE
+    print(f"   {'✅' if ok else '❌'} {name}: max abs error {error:.2e}")
+    if not ok:
+        failures.append(name)
+
+
+# 1. Full-window recompute matches model.predict
+print("🧪 Full-window recompute vs model.predict...")
+windows = series[:, :seq_length]
+check('full window', model.predict(windows, verbose=0), stream.run(windows)[0])
+
+# 2. Each incremental step matches the model run over the same history
+print("🧪 Incremental steps vs full-history inference...")
+zone = 0
+stream.advance(zone, seq_length, None, lambda: series[zone, :seq_length])
+for step in range(1, stream.recompute_every + 1):
+    end = seq_length + step
+    streamed = stream.advance(zone, end, series[zone, end - 1], None)
+    expected = variable_model.predict(series[zone:zone + 1, :end], verbose=0)
+    check(f'step {step}', expected, streamed)
+
+# 3. The periodic recompute snaps back to the last seq_length window exactly
+print("🧪 Periodic recompute vs last-window inference...")
+end += 1
+streamed = stream.advance(zone, end, series[zone, end - 1], lambda: series[zone, end - seq_length:end])
+if stream.stats()['recomputes'] != 2:
+    failures.append('recompute schedule')
+    print(f"   ❌ expected a recompute after {stream.recompute_every} steps")
+check('recompute', model.predict(series[zone:zone + 1, end - seq_length:end], verbose=0), streamed)
+
+# 4. Drift between recomputes relative to last-window inference
+print("📊 Drift before recompute (informational):")
+stream.advance(1, seq_length, None, lambda: series[1, :seq_length])
+drift = []
+for step in range(1, stream.recompute_every):
+    end = seq_length + step
+    streamed = stream.advance(1, end, series[1, end - 1], None)
+    drift.append(abs(streamed - float(model.predict(series[1:2, end - seq_length:end], verbose=0)[0, 0])))
+print(f"   max drift over {len(drift)} steps: {max(drift):.4f} (scaled units)")
+
+# 5. Window-wide layers are rejected
+print("🧪 Attention models fall back to full-window inference...")
+inputs = tf.keras.Input((seq_length, n_features))
+hidden = tf.keras.layers.LSTM(8, return_sequences=True)(inputs)
+attended = tf.keras.layers.Attention()([hidden, hidden])
+outputs = tf.keras.layers.Dense(1)(tf.keras.layers.GlobalAveragePooling1D()(attended))
+reason = streaming_unsupported_reason(tf.keras.Model(inputs, outputs))
+print(f"   {'✅' if reason else '❌'} rejected: {reason}")
+if not reason:
+    failures.append('attention rejection')
+
+print()
+print("=" * 60)
+if failures:
+    print(f"   ❌ FAILED: {', '.join(failures)}")
+    print("=" * 60)
+    sys.exit(1)
+print("   ✅ ALL TESTS PASSED!")
+print("=" * 60)
@@ -4,17 +4,40 @@ Traffic Prediction API for Web Deployment
 Provides REST API endpoints for traffic prediction based on location and time
 """
 
+import os
+# Zone serving (ZONE_SERVING=1) runs the PyTorch STGCN next to the Keras model;
+# PyG has to be imported before TensorFlow, as importing it afterwards crashes
+# on their conflicting native libraries
+if os.environ.get('ZONE_SERVING', '').lower() in ('1', 'true', 'yes'):
+    import torch_geometric  # noqa: F401
+
 from flask import Flask, request, jsonify, render_template
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 import joblib
+import hashlib
 import json
-import os
-from datetime import datetime, timedelta
+import sys
+import time
+import atexit
+from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+# Shared feature code lives with the training scripts
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from feature_pipeline import temporal_feature_arrays
+from prediction_cache import TTLCache, SharedTTLCache, file_checksum
+from route_corridor import decode_polyline, resample_polyline, collapse_cells, segment_travel_minutes
+from sequence_buffer import SequenceRingBuffer
+from streaming_lstm import StreamingLSTM, streaming_unsupported_reason
+from model_compression import REPORT_PATH, load_keras_model, load_variant, variant_checksum
+from surrogate_model import SURROGATE_PATH, TrafficSurrogate
+from region_router import LOCATION_SCALE, load_model_router
+
 app = Flask(__name__)
 
 # Global variables for model and scalers
@@ -23,10 +46,84 @@ feature_scaler = None
 target_scaler = None
 model_metadata = None
 model_path = None
+model_checksum = None
+
+# Forecasts are cached per ~110 m location cell and start time bucket
+FORECAST_CELL_DECIMALS = 3
+FORECAST_MAX_STEPS = 2016  # one week at 5-minute steps
+forecast_cache = TTLCache(
+    max_entries=int(os.environ.get('FORECAST_CACHE_SIZE', 4096)),
+    ttl_seconds=int(os.environ.get('FORECAST_CACHE_TTL', 300))
+)
+
+# Single-location predictions are shared by all workers on the host, keyed by
+# model checksum + ~11 m cell + 5-minute bucket
+PREDICT_CELL_DECIMALS = int(os.environ.get('PREDICT_CELL_DECIMALS', 4))
+PREDICT_BUCKET_MINUTES = int(os.environ.get('PREDICT_BUCKET_MINUTES', 5))
+prediction_cache = None
+
+# Route responses are cached per rounded waypoint path and departure bucket
+ROUTE_WAYPOINT_DECIMALS = int(os.environ.get('ROUTE_WAYPOINT_DECIMALS', 4))
+ROUTE_BUCKET_MINUTES = int(os.environ.get('ROUTE_BUCKET_MINUTES', 5))
+ROUTE_CACHE_TTL = int(os.environ.get('ROUTE_CACHE_TTL', 60))
+
+# Recent observations per zone, fed by /api/observations
+sequence_buffer = None
+SEQUENCE_BUFFER_PATH = os.environ.get('SEQUENCE_BUFFER_PATH', os.path.join('models', 'sequence_buffer.npz'))
+SEQUENCE_BUFFER_ZONES = int(os.environ.get('SEQUENCE_BUFFER_ZONES', 10000))
+SEQUENCE_SNAPSHOT_INTERVAL = int(os.environ.get('SEQUENCE_SNAPSHOT_INTERVAL', 60))
+_last_snapshot = time.monotonic()
+_snapshot_updates = 0
+
+# Incremental LSTM state per zone (only for plain stacked-LSTM models)
+streaming_model = None
+STREAM_RECOMPUTE_EVERY = int(os.environ.get('STREAM_RECOMPUTE_EVERY', 12))
+
+# Distilled fast path for single-location requests without observation
+# history; only served while its benchmark p95 error (occupancy points) is
+# within SURROGATE_MAX_ERROR
+surrogate = None
+surrogate_checksum = None
+SURROGATE_MAX_ERROR = float(os.environ.get('SURROGATE_MAX_ERROR', 2.0))
+
+# Compressed variant to serve: unset (original model), 'auto' (the report's
+# recommendation) or a variant name from models/compression_report.json
+SERVING_VARIANT = os.environ.get('SERVING_VARIANT')
+
+# City-wide STGCN zone predictions (ZONE_SERVING=1): one forward pass per time
+# bucket covers every zone; needs stgcn_model.pt and stgcn_serving.npz
+zone_forecaster = None
+ZONE_SERVING = os.environ.get('ZONE_SERVING', '').lower() in ('1', 'true', 'yes')
+
+# Per-region models (models/regions.json): points inside a region's bounding
+# box are scored by that region's bundle, loaded on first use, with at most
+# REGION_MAX_RESIDENT bundles in memory; other points use the default model
+region_router = None
+REGION_PRELOAD = [name for name in os.environ.get('REGION_PRELOAD', '').split(',') if name]
+
+# The default model was trained on Vijayawada (Andhra Pradesh) locations
+DEFAULT_LOCATION_CENTER = (16.5, 80.5)  # Latitude/Longitude features are normalized around this
+DEFAULT_CITY_CENTER = (16.5, 80.6)  # distance_from_center is measured from here
+
+def select_serving_variant(name):
+    """Return (name, spec) of a compressed variant of the loaded model, or None"""
+    if not os.path.exists(REPORT_PATH):
+        print("⚠️  No compression report found; run model_compression.py first")
+        return None
+    with open(REPORT_PATH) as f:
+        report = json.load(f)
+    if report['source_checksum'] != file_checksum(model_path):
+        print("⚠️  Compression report was built for a different model; serving the original")
+        return None
+    name = report['recommended'] if name == 'auto' else name
+    if name not in report['variants']:
+        print(f"⚠️  Unknown serving variant: {name}")
+        return None
+    return name, report['variants'][name]
 
 def load_model_and_scalers():
     """Load the trained model and scalers"""
-    global model, feature_scaler, target_scaler, model_metadata, model_path
+    global model, feature_scaler, target_scaler, model_metadata, model_path, model_checksum, prediction_cache
     
     try:
         # Load model without compiling (to avoid metric compatibility issues)
@@ -54,7 +151,7 @@ def load_model_and_scalers():
 
         model_path = selected_path
         print(f"📥 Loading model architecture from: {model_path} ...")
-        model = tf.keras.models.load_model(model_path, compile=False)
+        model = load_keras_model(model_path)
         
         # Manually compile with compatible metrics
         print("🔧 Compiling model with compatible metrics...")
@@ -75,6 +172,22 @@ def load_model_and_scalers():
             model_metadata = json.load(f)
         # Enrich metadata with runtime information
         model_metadata['loaded_model_path'] = os.path.abspath(model_path) if model_path else None
+        model_checksum = file_checksum(model_path)
+
+        if SERVING_VARIANT:
+            selected = select_serving_variant(SERVING_VARIANT)
+            if selected:
+                variant_name, spec = selected
+                print(f"📥 Serving compressed variant: {variant_name} "
+                      f"(RMSE {spec['rmse']:.3f}, p50 {spec['latency_ms_p50']:.2f} ms)")
+                model = load_variant(spec)
+                model_checksum = variant_checksum(spec)
+                model_metadata['serving_variant'] = variant_name
+        model_metadata['model_checksum'] = model_checksum
+        prediction_cache = SharedTTLCache(
+            path=os.environ.get('PREDICTION_CACHE_PATH'),
+            ttl_seconds=int(os.environ.get('PREDICTION_CACHE_TTL', 300))
+        )
             
         print("✅ Model and scalers loaded successfully!")
         print(f"   Model type: {model_metadata.get('model_type', 'Unknown')}")
@@ -98,6 +211,12 @@ def load_model_and_scalers():
                 print(f"   Feature scaler expects: {feature_scaler.n_features_in_} features")
         except Exception as _:
             pass
+
+        init_sequence_buffer()
+        init_streaming_model()
+        init_surrogate()
+        init_zone_forecaster()
+        init_region_router()
         return True
     except Exception as e:
         print(f"❌ Error loading model: {e}")
@@ -105,121 +224,463 @@ def load_model_and_scalers():
         print(f"   and that all model files exist in the 'models/' folder")
         return False
 
-def preprocess_location_data(lat, lon, timestamp, additional_features=None):
-    """Preprocess location-based data for prediction"""
-    # Create base features similar to training data
-    dt = pd.to_datetime(timestamp)
-    
-    # Time-based features
-    hour = dt.hour
-    dow = dt.dayofweek
-    is_weekend = 1 if dow in [5, 6] else 0
-    
-    # Cyclical encodings
-    hour_sin = np.sin(2 * np.pi * hour / 24)
-    hour_cos = np.cos(2 * np.pi * hour / 24)
-    
-    # Location-based features (normalized for India - Andhra Pradesh region)
-    # Vijayawada area: lat ~16.5, lon ~80.6
-    lat_norm = (lat - 16.5) / 2.0  # Normalize around Vijayawada
-    lon_norm = (lon - 80.5) / 2.0  # Normalize around Vijayawada
-    
-    # Create feature vector (matching scaler input - exactly 22 features)
+def init_sequence_buffer():
+    """Create the observation ring buffer, restoring the last snapshot if it matches"""
+    global sequence_buffer
+    sequence_length = model_metadata['sequence_length']
+    n_features = len(model_metadata['feature_columns'])
+    if os.path.exists(SEQUENCE_BUFFER_PATH):
+        try:
+            restored = SequenceRingBuffer.load(SEQUENCE_BUFFER_PATH)
+            if (restored.sequence_length, restored.n_features) == (sequence_length, n_features):
+                sequence_buffer = restored
+                print(f"📥 Restored observation buffer: {sequence_buffer.stats()['zones']} zones")
+                return
+            print("⚠️  Observation buffer snapshot does not match the model, starting empty")
+        except Exception as e:
+            print(f"⚠️  Could not restore observation buffer: {e}")
+    sequence_buffer = SequenceRingBuffer(sequence_length, n_features, max_zones=SEQUENCE_BUFFER_ZONES)
+
+def init_streaming_model():
+    """Enable incremental LSTM inference when the loaded model supports it"""
+    global streaming_model
+    reason = streaming_unsupported_reason(model)
+    if reason:
+        streaming_model = None
+        print(f"ℹ️  Streaming inference disabled ({reason}); using full-window inference")
+        return
+    streaming_model = StreamingLSTM(model, max_zones=sequence_buffer.max_zones,
+                                    recompute_every=STREAM_RECOMPUTE_EVERY)
+    print(f"⚡ Streaming LSTM inference enabled (full recompute every {STREAM_RECOMPUTE_EVERY} steps)")
+
+def init_surrogate():
+    """Enable the distilled fast path if it matches the model and is accurate enough"""
+    global surrogate, surrogate_checksum
+    surrogate = None
+    path = os.environ.get('SURROGATE_PATH', SURROGATE_PATH)
+    if not os.path.exists(path):
+        return
+    try:
+        candidate = TrafficSurrogate.load(path)
+    except Exception as e:
+        print(f"⚠️  Could not load surrogate: {e}")
+        return
+    if candidate.teacher_checksum != model_checksum:
+        print("⚠️  Surrogate was distilled from a different model; using full inference")
+        return
+    error = candidate.metrics.get('p95_abs_error', float('inf'))
+    if error > SURROGATE_MAX_ERROR:
+        print(f"ℹ️  Surrogate p95 error {error:.2f} exceeds SURROGATE_MAX_ERROR={SURROGATE_MAX_ERROR}; disabled")
+        return
+    surrogate = candidate
+    surrogate_checksum = file_checksum(path)
+    print(f"⚡ Surrogate fast path enabled ({candidate.kind}, p95 error {error:.2f})")
+
+def init_zone_forecaster():
+    """Load the STGCN zone forecaster when ZONE_SERVING is enabled"""
+    global zone_forecaster
+    zone_forecaster = None
+    if not ZONE_SERVING:
+        return
+    try:
+        # torch/PyG are only imported by processes that serve zones
+        from stgcn_serving import load_zone_forecaster
+        zone_forecaster = load_zone_forecaster()
+    except Exception as e:
+        print(f"⚠️  Could not load STGCN zone forecaster: {e}")
+        return
+    if zone_forecaster is None:
+        print("⚠️  ZONE_SERVING is set but stgcn_model.pt / stgcn_serving.npz were not found; "
+              "run GNN_PyG_spatio_temporal.py first")
+        return
+    print(f"🗺️  STGCN zone serving enabled ({zone_forecaster.n_zones} zones, "
+          f"{zone_forecaster.stats()['bucket_minutes']}-minute buckets)")
+
+def init_region_router():
+    """Route points inside configured regions to their own model bundles"""
+    global region_router
+    region_router = None
+    try:
+        region_router = load_model_router(warmup=warm_up_region)
+    except Exception as e:
+        print(f"⚠️  Could not load region configuration: {e}")
+        return
+    if region_router is None:
+        return
+    print(f"🗺️  Region routing enabled ({len(region_router.regions)} regions, "
+          f"at most {region_router.max_resident} resident)")
+    for name in REGION_PRELOAD[:region_router.max_resident]:
+        try:
+            region_router.preload([name])
+        except Exception as e:
+            print(f"⚠️  Could not preload region {name}: {e}")
+
+def warm_up_region(bundle, batch_size):
+    """One forward pass at the region's center, tracing the model for this batch size"""
+    lat, lon = bundle.spec.center
+    dt = pd.DatetimeIndex([pd.Timestamp.now()] * batch_size)
+    region_occupancy_batch(bundle, np.full(batch_size, lat), np.full(batch_size, lon), dt)
+
+def region_for(lat, lon):
+    """RegionSpec whose model serves the point, or None for the default model"""
+    return region_router.index.region_for(lat, lon) if region_router is not None else None
+
+def snapshot_sequence_buffer():
+    """Persist the observation buffer for fast restarts"""
+    global _last_snapshot, _snapshot_updates
+    # Only processes that ingested observations write (not e.g. batch scoring workers)
+    if sequence_buffer is not None and sequence_buffer.updates != _snapshot_updates:
+        sequence_buffer.snapshot(SEQUENCE_BUFFER_PATH)
+        _snapshot_updates = sequence_buffer.updates
+        _last_snapshot = time.monotonic()
+
+atexit.register(snapshot_sequence_buffer)
+
+def preprocess_location_batch(lats, lons, timestamps, center=DEFAULT_LOCATION_CENTER, scale=LOCATION_SCALE):
+    """Preprocess many (lat, lon, timestamp) rows at once -> (n, 22) features
+
+    Latitude/Longitude are normalized around ``center`` (the default model's
+    Vijayawada center, or a region bundle's)
+    """
+    lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+    lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+    n = len(lats)
+
+    # Time-based and cyclical features, computed column-wise
+    temporal = temporal_feature_arrays(np.broadcast_to(np.asarray(timestamps, dtype=object), (n,)))
+
+    # Create feature matrix (matching scaler input - exactly 22 features)
     # Based on model_metadata.json feature_columns
-    features = np.array([
-        lat_norm, lon_norm,  # 1-2: Latitude, Longitude
-        0, 0,  # 3-4: Vehicle_Count, Traffic_Speed_kmh
-        0, 0, 0,  # 5-7: Accident_Report, Sentiment_Score, Ride_Sharing_Demand
-        0, 0, 0,  # 8-10: Parking_Availability, Emission_Levels_g_km, Energy_Consumption_L_h
-        hour, dow, is_weekend,  # 11-13: hour, dow, is_weekend
-        hour_sin, hour_cos,  # 14-15: hour_sin, hour_cos
-        0, 0,  # 16-17: Traffic_Light_State_Red, Traffic_Light_State_Yellow
-        0, 0, 0,  # 18-20: Weather_Condition_Fog, Weather_Condition_Rain, Weather_Condition_Snow
-        0, 0  # 21-22: Traffic_Condition_Low, Traffic_Condition_Medium
-    ])
-    
+    features = np.zeros((n, 22), dtype=np.float64)
+    # Location-based features, normalized around the model's region
+    features[:, 0] = (lats - center[0]) / scale  # 1: Latitude
+    features[:, 1] = (lons - center[1]) / scale  # 2: Longitude
+    # 3-10: observation-driven features stay zero without live data
+    features[:, 10] = temporal['hour']  # 11: hour
+    features[:, 11] = temporal['day_of_week']  # 12: dow
+    features[:, 12] = temporal['is_weekend']  # 13: is_weekend
+    features[:, 13] = temporal['hour_sin']  # 14: hour_sin
+    features[:, 14] = temporal['hour_cos']  # 15: hour_cos
+    # 16-22: traffic light, weather and condition one-hots stay zero
+
     return features
 
+def preprocess_observations(observations):
+    """Build raw (n, 22) feature rows from observation dicts.
+
+    Location/time features come from preprocess_location_batch; other
+    feature columns are read by name, and categorical columns such as
+    Weather_Condition_Rain are one-hot encoded from Weather_Condition.
+    """
+    features = preprocess_location_batch(
+        [float(o['latitude']) for o in observations],
+        [float(o['longitude']) for o in observations],
+        [o['timestamp'] for o in observations]
+    )
+    derived = {'Latitude', 'Longitude', 'hour', 'dow', 'is_weekend', 'hour_sin', 'hour_cos'}
+    for col_idx, column in enumerate(model_metadata['feature_columns']):
+        if column in derived:
+            continue
+        for row_idx, obs in enumerate(observations):
+            if column in obs:
+                features[row_idx, col_idx] = float(obs[column])
+            elif '_' in column:
+                base, _, value = column.rpartition('_')
+                if base in obs:
+                    features[row_idx, col_idx] = 1.0 if str(obs[base]) == value else 0.0
+    return features
+
+def preprocess_location_data(lat, lon, timestamp, additional_features=None):
+    """Preprocess location-based data for prediction, normalized for the point's region"""
+    region = region_for(lat, lon)
+    if region is not None:
+        return preprocess_location_batch([lat], [lon], [timestamp], region.center, region.scale)[0]
+    return preprocess_location_batch([lat], [lon], [timestamp])[0]
+
+def _is_peak_hour(hour):
+    """Peak hours: 7-9 AM, 5-7 PM"""
+    return ((hour >= 7) & (hour <= 9)) | ((hour >= 17) & (hour <= 19))
+
+def predict_traffic_batch(lats, lons, timestamps, use_history=True):
+    """Predict traffic for many (lat, lon, timestamp) rows in one forward pass.
+
+    Returns a dict of arrays: prediction, hour, is_peak_hour,
+    distance_from_center, used_history.
+    """
+    lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+    lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+    dt = pd.DatetimeIndex(pd.to_datetime(np.broadcast_to(np.asarray(timestamps, dtype=object), lats.shape)))
+
+    if region_router is None:
+        pred, used_history = model_occupancy_batch(lats, lons, dt, use_history)
+        result = adjust_traffic_batch(pred, lats, lons, dt)
+        result['used_history'] = used_history
+        result['region'] = np.full(len(lats), -1)
+        return result
+
+    # Score each region's rows with its own bundle, the rest with the default model
+    regions = region_router.lookup(lats, lons)
+    pred = np.zeros(len(lats))
+    used_history = np.zeros(len(lats), dtype=bool)
+    center = np.tile(np.asarray(DEFAULT_CITY_CENTER, dtype=np.float64), (len(lats), 1))
+    default = regions < 0
+    if default.any():
+        pred[default], used_history[default] = model_occupancy_batch(lats[default], lons[default], dt[default],
+                                                                     use_history)
+    for region_id in np.unique(regions[~default]):
+        rows = regions == region_id
+        bundle = region_router.get(region_id)
+        pred[rows] = region_occupancy_batch(bundle, lats[rows], lons[rows], dt[rows])
+        center[rows] = bundle.spec.center
+    result = adjust_traffic_batch(pred, lats, lons, dt, center[:, 0], center[:, 1])
+    result['used_history'] = used_history
+    result['region'] = regions
+    return result
+
+def region_occupancy_batch(bundle, lats, lons, dt):
+    """Clipped output (0-100) of a region's model from location/time features.
+
+    Region bundles do not use the observation buffer, which holds feature
+    rows for the default model
+    """
+    spec = bundle.spec
+    features = preprocess_location_batch(lats, lons, dt, spec.center, spec.scale)
+    features_scaled = bundle.feature_scaler.transform(features)[:, :bundle.n_inputs].astype(np.float32)
+    sequences = np.broadcast_to(features_scaled[:, None, :],
+                                (len(features_scaled), bundle.sequence_length, features_scaled.shape[1]))
+    pred_scaled = bundle.model.predict(sequences, batch_size=max(1, len(sequences)), verbose=0).reshape(-1)
+    pred = bundle.target_scaler.inverse_transform(pred_scaled.reshape(-1, 1)).reshape(-1)
+    return np.clip(pred, 0, 100)
+
+def model_occupancy_batch(lats, lons, dt, use_history=True):
+    """Clipped model output (0-100) before time/location adjustments.
+
+    Returns (prediction, used_history) arrays.
+    """
+    # Preprocess the input
+    features = preprocess_location_batch(lats, lons, dt)
+
+    # Every step of the sequence repeats the same features, so scale each row
+    # once and broadcast it across sequence_length instead of tiling
+    sequence_length = model_metadata['sequence_length']
+    features_scaled = feature_scaler.transform(features)
+
+    # The scaler outputs 22 features; models may take only the first ones
+    # (best_model.h5 takes 18)
+    n_inputs = int(model.input_shape[-1])
+    features_scaled = features_scaled[:, :n_inputs].astype(np.float32)
+    sequences = np.broadcast_to(features_scaled[:, None, :],
+                                (len(features_scaled), sequence_length, features_scaled.shape[1]))
+
+    # Zones with a full window of real observations use it instead; zones
+    # whose streaming LSTM state is current skip the model entirely
+    used_history = np.zeros(len(lats), dtype=bool)
+    streamed = np.zeros(len(lats), dtype=bool)
+    pred_scaled = np.zeros(len(lats), dtype=np.float32)
+    if use_history and sequence_buffer is not None:
+        used_history, windows = sequence_buffer.full_windows(lats, lons)
+        # A window only describes the next few minutes; later times fall back
+        # to location/time features
+        current = history_is_current(lats, lons, dt)
+        windows = windows[current[used_history]]
+        used_history &= current
+        if streaming_model is not None and used_history.any():
+            streamed, streamed_pred = streaming_model.cached(*sequence_buffer.lookup(lats, lons))
+            pred_scaled[streamed] = streamed_pred
+            streamed &= used_history
+            windows = windows[~streamed[used_history]]
+        replay = used_history & ~streamed
+        if replay.any():
+            windows_scaled = feature_scaler.transform(windows.reshape(-1, windows.shape[-1]))
+            sequences = np.array(sequences)
+            sequences[replay] = windows_scaled[:, :n_inputs].reshape(len(windows), sequence_length, -1)
+
+    # Make predictions (single batched forward pass)
+    if not streamed.all():
+        sequences = sequences[~streamed]
+        pred_scaled[~streamed] = model.predict(sequences, batch_size=max(1, len(sequences)), verbose=0).reshape(-1)
+    pred = target_scaler.inverse_transform(pred_scaled.reshape(-1, 1)).reshape(-1)
+
+    # Ensure prediction is within reasonable bounds
+    return np.clip(pred, 0, 100), used_history
+
+def adjust_traffic_batch(pred, lats, lons, dt, center_lat=DEFAULT_CITY_CENTER[0], center_lon=DEFAULT_CITY_CENTER[1]):
+    """Apply time-of-day and location adjustments to model occupancy"""
+    # Add time-based variation for more realistic predictions
+    hour = dt.hour.to_numpy()
+    minute = dt.minute.to_numpy()
+    peak = _is_peak_hour(hour)
+    business = (hour >= 10) & (hour <= 16)
+    night = (hour >= 0) & (hour <= 5)
+    pred = np.select(
+        [peak, business, night],
+        [
+            # Peak hours - traffic builds in first 30 min, reduces in last 30 min
+            np.minimum(100, pred * 1.3 * (1.0 + (30 - np.abs(30 - minute)) / 150) + 10),
+            # Business hours - slight minute variation
+            np.minimum(100, pred * 1.15 * (1.0 + minute / 300) + 5),
+            # Late night - reduce congestion
+            np.maximum(0, pred * 0.3),
+        ],
+        # Regular hours with slight variation
+        np.minimum(100, pred * 1.05 * (1.0 + minute / 600)),
+    )
+
+    # Add location-based variation (distance from city center affects traffic)
+    distance_from_center = np.sqrt((lats - center_lat)**2 + (lons - center_lon)**2)
+    pred = np.where(distance_from_center < 0.05, np.minimum(100, pred * 1.15 + 8),  # City center
+                    np.where(distance_from_center > 0.2, np.maximum(0, pred * 0.7 - 5), pred))  # Outskirts/highways
+
+    # Add semi-random variation based on coordinates to create diversity
+    # This simulates different road types and local conditions
+    variation_seed = np.mod(lats * 1000 + lons * 1000, 100).astype(np.int64) % 3
+    pred = np.where(variation_seed == 0, np.maximum(0, pred * 0.85),  # Lower traffic (highways/good roads)
+                    np.where(variation_seed == 1, np.minimum(100, pred * 1.1), pred))  # Slightly higher (normal roads)
+
+    return {
+        'prediction': pred,
+        'hour': hour,
+        'is_peak_hour': peak,
+        'distance_from_center': distance_from_center,
+    }
+
+def history_is_current(lats, lons, dt):
+    """Mask of rows whose time falls in their zone's newest observed bucket or the one after it"""
+    bucket_ns = PREDICT_BUCKET_MINUTES * 60 * 10**9
+    last_bucket = sequence_buffer.last_observed(lats, lons) // bucket_ns
+    requested = pd.DatetimeIndex(dt).as_unit('ns').asi8 // bucket_ns
+    # Live requests usually land in the bucket still being observed
+    return (requested >= last_bucket) & (requested <= last_bucket + 1)
+
+def _has_history(lat, lon, timestamp):
+    """Whether the zone's observation window is the model input at ``timestamp``"""
+    return (sequence_buffer is not None and
+            sequence_buffer.lookup([lat], [lon])[1][0] >= sequence_buffer.sequence_length and
+            bool(history_is_current([lat], [lon], pd.DatetimeIndex(pd.to_datetime([timestamp])))[0]))
+
+def _use_surrogate(lat, lon, timestamp):
+    # The surrogate stands in for the default model only
+    return (surrogate is not None and bool(surrogate.covers(lat, lon)) and region_for(lat, lon) is None
+            and not _has_history(lat, lon, timestamp))
+
+def _score_location(lat, lon, timestamp):
+    """Model prediction and factors for one location and time"""
+    use_surrogate = _use_surrogate(lat, lon, timestamp)
+    if use_surrogate:
+        lats, lons = np.array([float(lat)]), np.array([float(lon)])
+        dt = pd.DatetimeIndex(pd.to_datetime([timestamp]))
+        batch = adjust_traffic_batch(surrogate.predict(lats, lons, dt), lats, lons, dt)
+        batch['used_history'] = np.zeros(1, dtype=bool)
+        batch['region'] = np.full(1, -1)
+    else:
+        batch = predict_traffic_batch([lat], [lon], [timestamp])
+    region_id = int(batch['region'][0])
+    return {
+        'prediction': float(batch['prediction'][0]),
+        'factors': {
+            'hour': int(batch['hour'][0]),
+            'is_peak_hour': bool(batch['is_peak_hour'][0]),
+            'distance_from_center_km': float(batch['distance_from_center'][0] * 111),  # Rough conversion to km
+            'observed_history': bool(batch['used_history'][0]),
+            'surrogate': use_surrogate,
+            'region': region_router.regions[region_id].name if region_id >= 0 else None
+        }
+    }
+
+def prediction_cache_key(lat, lon, timestamp):
+    """Versioned shared-cache key: returns (key, cell_lat, cell_lon, bucket)"""
+    cell_lat = round(float(lat), PREDICT_CELL_DECIMALS)
+    cell_lon = round(float(lon), PREDICT_CELL_DECIMALS)
+    bucket = pd.Timestamp(timestamp).floor(f'{PREDICT_BUCKET_MINUTES}min')
+    # Misses score the cell, so region and history are looked up for the cell too
+    region = region_for(cell_lat, cell_lon)
+    if region is not None:
+        # Region models only see location and time
+        return f"predict:{region.checksum}:{cell_lat}:{cell_lon}:{bucket.isoformat()}", cell_lat, cell_lon, bucket
+    key = f"predict:{model_checksum}:{cell_lat}:{cell_lon}:{bucket.isoformat()}"
+    if _has_history(cell_lat, cell_lon, bucket):
+        # New observations for the zone change its input window
+        key += f":h{sequence_buffer.lookup([cell_lat], [cell_lon])[1][0]}"
+    elif _use_surrogate(cell_lat, cell_lon, bucket):
+        key += f":s{surrogate_checksum}"
+    return key, cell_lat, cell_lon, bucket
+
 def predict_traffic_for_location(lat, lon, timestamp, hours_ahead=1):
     """Predict traffic for a specific location and time"""
     try:
-        # Preprocess the input
-        features = preprocess_location_data(lat, lon, timestamp)
-        
-        # Create sequence (repeat the same features for sequence_length)
-        sequence_length = model_metadata['sequence_length']
-        sequence = np.tile(features, (sequence_length, 1))
-        
-        # Scale the sequence
-        sequence_scaled = feature_scaler.transform(sequence)
-        
-        # Model expects 18 features, but scaler outputs 22, so we need to slice
-        # Take the first 18 features to match model input shape
-        sequence_scaled = sequence_scaled[:, :18]
-        sequence_scaled = sequence_scaled.reshape(1, sequence_length, -1)
-        
-        # Make prediction
-        pred_scaled = model.predict(sequence_scaled, verbose=0)
-        pred_original = target_scaler.inverse_transform(pred_scaled.reshape(-1, 1))[0][0]
-        
-        # Ensure prediction is within reasonable bounds
-        pred_original = max(0, min(100, pred_original))
-        
-        # Add time-based variation for more realistic predictions
-        # Peak hours: 7-9 AM, 5-7 PM should have higher congestion
-        dt = pd.to_datetime(timestamp)
-        hour = dt.hour
-        minute = dt.minute
-        
-        # Apply time-based multiplier with minute-level variation
-        if (hour >= 7 and hour <= 9) or (hour >= 17 and hour <= 19):
-            # Peak hours - vary by minute to show traffic building/reducing
-            base_multiplier = 1.3
-            # Add variation: traffic builds in first 30 min, reduces in last 30 min
-            minute_factor = 1.0 + (30 - abs(30 - minute)) / 150  # 0.8 to 1.2
-            pred_original = min(100, pred_original * base_multiplier * minute_factor + 10)
-        elif (hour >= 10 and hour <= 16):
-            # Business hours - slight minute variation
-            minute_factor = 1.0 + (minute / 300)  # 1.0 to 1.2
-            pred_original = min(100, pred_original * 1.15 * minute_factor + 5)
-        elif hour >= 0 and hour <= 5:
-            # Late night - reduce congestion
-            pred_original = max(0, pred_original * 0.3)
+        cached = False
+        if prediction_cache is None:
+            scored = _score_location(lat, lon, timestamp)
         else:
-            # Regular hours with slight variation
-            minute_factor = 1.0 + (minute / 600)  # 1.0 to 1.1
-            pred_original = min(100, pred_original * 1.05 * minute_factor)
-        
-        # Add location-based variation (distance from city center affects traffic)
-        distance_from_center = np.sqrt((lat - 16.5)**2 + (lon - 80.6)**2)
-        if distance_from_center < 0.05:  # City center
-            pred_original = min(100, pred_original * 1.15 + 8)
-        elif distance_from_center > 0.2:  # Outskirts/highways
-            pred_original = max(0, pred_original * 0.7 - 5)
-        
-        # Add semi-random variation based on coordinates to create diversity
-        # This simulates different road types and local conditions
-        variation_seed = int((lat * 1000 + lon * 1000) % 100)
-        if variation_seed % 3 == 0:  # ~33% of locations
-            pred_original = max(0, pred_original * 0.85)  # Lower traffic (highways/good roads)
-        elif variation_seed % 3 == 1:  # ~33% of locations  
-            pred_original = min(100, pred_original * 1.1)  # Slightly higher (normal roads)
-        # else: keep as is (~33%)
-        
+            # Score the cell/bucket itself so every worker caches the same value
+            key, cell_lat, cell_lon, bucket = prediction_cache_key(lat, lon, timestamp)
+            scored, cached = prediction_cache.get_or_compute(
+                key, lambda: _score_location(cell_lat, cell_lon, bucket))
+        pred_original = scored['prediction']
+
         return {
-            'prediction': float(pred_original),
+            'prediction': pred_original,
             'confidence': 'high' if pred_original > 50 else 'medium',
             'timestamp': timestamp,
             'location': {'lat': lat, 'lon': lon},
-            'factors': {
-                'hour': hour,
-                'is_peak_hour': (hour >= 7 and hour <= 9) or (hour >= 17 and hour <= 19),
-                'distance_from_center_km': float(distance_from_center * 111)  # Rough conversion to km
-            }
+            'factors': scored['factors'],
+            'cached': cached
         }
     except Exception as e:
         return {'error': str(e)}
 
+def forecast_for_location(lat, lon, start, horizon_hours=24, step_minutes=15):
+    """Forecast traffic for a location cell across a whole horizon.
+
+    All time-shifted inputs are scored in a single batched forward pass.
+    Returns (result, cached).
+    """
+    cell_lat = round(lat, FORECAST_CELL_DECIMALS)
+    cell_lon = round(lon, FORECAST_CELL_DECIMALS)
+    start_bucket = pd.Timestamp(start).floor(f'{step_minutes}min')
+    n_steps = int(horizon_hours * 60 // step_minutes)
+
+    # Version by the model serving the cell and, as in prediction_cache_key,
+    # by new observations that change the zone's input window
+    region = region_for(cell_lat, cell_lon)
+    checksum = region.checksum if region is not None else model_checksum
+    appended = int(sequence_buffer.lookup([cell_lat], [cell_lon])[1][0]) if sequence_buffer is not None else 0
+    cache_key = ('forecast', checksum, cell_lat, cell_lon, start_bucket.isoformat(), n_steps, step_minutes,
+                 appended)
+    cached = forecast_cache.get(cache_key)
+    if cached is not None:
+        return cached, True
+
+    times = start_bucket + pd.to_timedelta(np.arange(n_steps) * step_minutes, unit='min')
+    batch = predict_traffic_batch(np.full(n_steps, cell_lat), np.full(n_steps, cell_lon), times)
+    predictions = batch['prediction']
+    peak_idx = int(np.argmax(predictions))
+
+    result = {
+        'location': {'lat': lat, 'lon': lon},
+        'cell': {'lat': cell_lat, 'lon': cell_lon},
+        'start': start_bucket.isoformat(),
+        'horizon_hours': horizon_hours,
+        'step_minutes': step_minutes,
+        'forecast': [
+            {
+                'timestamp': ts.isoformat(),
+                'prediction': float(p),
+                'confidence': 'high' if p > 50 else 'medium'
+            }
+            for ts, p in zip(times, predictions)
+        ],
+        'summary': {
+            'average_traffic': float(predictions.mean()),
+            'max_traffic': float(predictions[peak_idx]),
+            'min_traffic': float(predictions.min()),
+            'peak_time': times[peak_idx].isoformat(),
+            'total_steps': n_steps
+        }
+    }
+    forecast_cache.set(cache_key, result)
+    return result, False
+
 @app.route('/')
 def index():
     """Serve the main web interface"""
@@ -256,6 +717,52 @@ def predict():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def route_cache_key(waypoints, departure_time):
+    """Canonical route key: returns (key, rounded points (n, 2), departure bucket)"""
+    points = np.round(np.array([[float(w['latitude']), float(w['longitude'])] for w in waypoints]),
+                      ROUTE_WAYPOINT_DECIMALS)
+    departure = pd.Timestamp(departure_time).floor(f'{ROUTE_BUCKET_MINUTES}min')
+    path = ';'.join(f"{lat:.{ROUTE_WAYPOINT_DECIMALS}f},{lon:.{ROUTE_WAYPOINT_DECIMALS}f}" for lat, lon in points)
+    checksum = model_checksum
+    if region_router is not None:
+        # Also versioned by the models of the regions the route passes through
+        regions = np.unique(region_router.lookup(points[:, 0], points[:, 1]))
+        checksum = '+'.join([model_checksum] + [region_router.regions[r].checksum for r in regions if r >= 0])
+    if sequence_buffer is not None:
+        # New observations in any waypoint's zone change its input window, as
+        # in prediction_cache_key
+        appended = sequence_buffer.lookup(points[:, 0], points[:, 1])[1]
+        if appended.any():
+            checksum += f":h{hashlib.sha256(appended.astype(np.int64).tobytes()).hexdigest()[:12]}"
+    return f"route:{checksum}:{departure.isoformat()}:{path}", points, departure
+
+def route_response_body(points, departure):
+    """Score every waypoint in one batch and serialize the route response"""
+    # Assuming 5 minutes between waypoints
+    times = departure + pd.to_timedelta(np.arange(len(points)) * 5, unit='min')
+    predictions = predict_traffic_batch(points[:, 0], points[:, 1], times)['prediction']
+
+    route_predictions = [
+        {
+            'waypoint': i,
+            'location': {'latitude': float(lat), 'longitude': float(lon)},
+            'prediction': float(p),
+            'timestamp': ts.isoformat()
+        }
+        for i, ((lat, lon), p, ts) in enumerate(zip(points, predictions, times))
+    ]
+    body = json.dumps({
+        'route_predictions': route_predictions,
+        'summary': {
+            'average_traffic': float(predictions.mean()),
+            'max_traffic': float(predictions.max()),
+            'min_traffic': float(predictions.min()),
+            'total_waypoints': len(route_predictions),
+            'departure_time': departure.isoformat()
+        }
+    })
+    return {'body': body, 'etag': hashlib.sha256(body.encode()).hexdigest()[:32]}
+
 @app.route('/api/predict_route', methods=['POST'])
 def predict_route():
     """API endpoint for route-based traffic prediction"""
@@ -269,51 +776,265 @@ def predict_route():
         if len(waypoints) < 2:
             return jsonify({'error': 'At least 2 waypoints required'}), 400
         
-        route_predictions = []
-        
         for i, waypoint in enumerate(waypoints):
             if 'latitude' not in waypoint or 'longitude' not in waypoint:
                 return jsonify({'error': f'Invalid waypoint {i}'}), 400
-            
-            # Calculate time for this waypoint (assuming 5 minutes between points)
-            base_time = datetime.now()
-            waypoint_time = base_time + timedelta(minutes=i * 5)
-            
-            result = predict_traffic_for_location(
-                waypoint['latitude'], 
-                waypoint['longitude'], 
-                waypoint_time.isoformat()
-            )
-            
-            if 'error' not in result:
-                route_predictions.append({
-                    'waypoint': i,
-                    'location': waypoint,
-                    'prediction': result['prediction'],
-                    'timestamp': waypoint_time.isoformat()
-                })
-        
-        # Calculate route summary
-        if route_predictions:
-            avg_traffic = np.mean([p['prediction'] for p in route_predictions])
-            max_traffic = max([p['prediction'] for p in route_predictions])
-            min_traffic = min([p['prediction'] for p in route_predictions])
-            
-            return jsonify({
-                'route_predictions': route_predictions,
-                'summary': {
-                    'average_traffic': float(avg_traffic),
-                    'max_traffic': float(max_traffic),
-                    'min_traffic': float(min_traffic),
-                    'total_waypoints': len(route_predictions)
-                }
-            })
+
+        key, points, departure = route_cache_key(waypoints, data.get('departure_time') or datetime.now())
+
+        # Identical concurrent requests share one computation; repeats are
+        # served from the cache (or 304 Not Modified) without the model
+        if prediction_cache is None:
+            cached = route_response_body(points, departure)
+        else:
+            cached, _ = prediction_cache.get_or_compute(
+                key, lambda: route_response_body(points, departure), ttl_seconds=ROUTE_CACHE_TTL)
+
+        # predict_route is an idempotent POST, so honour If-None-Match directly
+        # (werkzeug's make_conditional only does this for GET/HEAD)
+        if request.if_none_match.contains(cached['etag']):
+            response = app.response_class(status=304)
         else:
-            return jsonify({'error': 'No valid predictions'}), 500
+            response = app.response_class(cached['body'], mimetype='application/json')
+        response.set_etag(cached['etag'])
+        response.cache_control.private = True
+        response.cache_control.max_age = ROUTE_CACHE_TTL
+        return response
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/forecast', methods=['POST'])
+def forecast():
+    """API endpoint for a multi-horizon forecast at one location"""
+    try:
+        data = request.get_json()
+
+        for field in ['latitude', 'longitude']:
+            if field not in data:
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+
+        lat = float(data['latitude'])
+        lon = float(data['longitude'])
+        start = data.get('start') or datetime.now().isoformat()
+        horizon_hours = float(data.get('horizon_hours', 24))
+        step_minutes = int(data.get('step_minutes', 15))
+
+        if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+            return jsonify({'error': 'Invalid coordinates'}), 400
+        if not (5 <= step_minutes <= 1440) or horizon_hours <= 0:
+            return jsonify({'error': 'step_minutes must be 5-1440 and horizon_hours positive'}), 400
+        if horizon_hours * 60 // step_minutes > FORECAST_MAX_STEPS:
+            return jsonify({'error': f'Forecast is limited to {FORECAST_MAX_STEPS} steps'}), 400
+        if horizon_hours * 60 < step_minutes:
+            return jsonify({'error': 'horizon_hours must cover at least one step'}), 400
+
+        result, cached = forecast_for_location(lat, lon, start, horizon_hours, step_minutes)
+        return jsonify({**result, 'cached': cached})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/predict_corridor', methods=['POST'])
+def predict_corridor():
+    """API endpoint for route prediction along an encoded polyline"""
+    try:
+        data = request.get_json()
+
+        if 'polyline' not in data:
+            return jsonify({'error': 'Missing polyline'}), 400
+
+        departure = pd.Timestamp(data.get('departure_time') or datetime.now().isoformat())
+        spacing_m = float(data.get('spacing_m', 200))
+        bucket_minutes = int(data.get('bucket_minutes', 15))
+        free_flow_kmh = float(data.get('free_flow_kmh', 50))
+        if spacing_m < 10 or not (1 <= bucket_minutes <= 1440) or free_flow_kmh <= 0:
+            return jsonify({'error': 'Invalid spacing_m, bucket_minutes or free_flow_kmh'}), 400
+
+        points = decode_polyline(data['polyline'], int(data.get('precision', 5)))
+        samples, distance_km = resample_polyline(points, spacing_m)
+
+        # Arrival time at each sample, assuming free-flow progress along the route
+        arrival = departure + pd.to_timedelta(distance_km / free_flow_kmh * 60, unit='min')
+
+        # Score each unique (cell, time bucket) once, then expand along the route
+        cell_lats, cell_lons, cell_times, inverse = collapse_cells(
+            samples, arrival, FORECAST_CELL_DECIMALS, bucket_minutes)
+        batch = predict_traffic_batch(cell_lats, cell_lons, cell_times)
+        traffic = batch['prediction'][inverse]
+
+        lengths, piece_traffic, piece_minutes = segment_travel_minutes(distance_km, traffic, free_flow_kmh)
+        total_km = float(distance_km[-1])
+        free_flow_minutes = total_km / free_flow_kmh * 60
+        travel_minutes = float(piece_minutes.sum())
+        weighted_traffic = float((piece_traffic * lengths).sum() / total_km) if total_km > 0 else float(traffic.mean())
+
+        return jsonify({
+            'route_predictions': [
+                {
+                    'index': i,
+                    'location': {'latitude': float(lat), 'longitude': float(lon)},
+                    'distance_km': float(d),
+                    'timestamp': ts.isoformat(),
+                    'prediction': float(p)
+                }
+                for i, ((lat, lon), d, ts, p) in enumerate(zip(samples, distance_km, arrival, traffic))
+            ],
+            'summary': {
+                'average_traffic': weighted_traffic,
+                'max_traffic': float(traffic.max()),
+                'min_traffic': float(traffic.min()),
+                'distance_km': total_km,
+                'free_flow_minutes': float(free_flow_minutes),
+                'estimated_travel_minutes': travel_minutes,
+                'delay_minutes': float(travel_minutes - free_flow_minutes),
+                'polyline_points': int(len(points)),
+                'sampled_points': int(len(samples)),
+                'scored_cells': int(len(cell_lats))
+            }
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def zone_response(zones, predictions, bucket, cached):
+    """Shared fields of the zone endpoints"""
+    return {
+        'target': zone_forecaster.feature_list[0],
+        'bucket': bucket.isoformat(),
+        'forecast_for': zone_forecaster.forecast_time().isoformat(),
+        'cached': cached,
+        'predictions': [
+            {
+                'zone': int(zone),
+                'centroid': {'latitude': float(zone_forecaster.centroids[zone, 0]),
+                             'longitude': float(zone_forecaster.centroids[zone, 1])},
+                'prediction': float(p)
+            }
+            for zone, p in zip(zones, predictions)
+        ]
+    }
+
+@app.route('/api/zones', methods=['GET'])
+def predict_zones():
+    """API endpoint for STGCN predictions of every zone"""
+    try:
+        if zone_forecaster is None:
+            return jsonify({'error': 'Zone serving not enabled (set ZONE_SERVING=1)'}), 503
+        timestamp = request.args.get('timestamp') or datetime.now().isoformat()
+        vector, bucket, cached = zone_forecaster.zone_vector(timestamp)
+        return jsonify(zone_response(np.arange(len(vector)), vector, bucket, cached))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/predict_zone', methods=['POST'])
+def predict_zone():
+    """API endpoint for STGCN predictions at points, via their nearest zone"""
+    try:
+        if zone_forecaster is None:
+            return jsonify({'error': 'Zone serving not enabled (set ZONE_SERVING=1)'}), 503
+        data = request.get_json()
+        points = data.get('points', [data])
+        for i, point in enumerate(points):
+            if 'latitude' not in point or 'longitude' not in point:
+                return jsonify({'error': f'Invalid point {i}'}), 400
+        lats = np.array([float(p['latitude']) for p in points])
+        lons = np.array([float(p['longitude']) for p in points])
+        if not ((np.abs(lats) <= 90) & (np.abs(lons) <= 180)).all():
+            return jsonify({'error': 'Invalid coordinates'}), 400
+
+        timestamp = data.get('timestamp') or datetime.now().isoformat()
+        predictions, zones, bucket, cached = zone_forecaster.predict_points(lats, lons, timestamp)
+        result = zone_response(zones, predictions, bucket, cached)
+        for point, lat, lon in zip(result['predictions'], lats, lons):
+            point['location'] = {'latitude': float(lat), 'longitude': float(lon)}
+        return jsonify(result)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/regions', methods=['GET'])
+def list_regions():
+    """API endpoint listing the configured regions and which models are resident"""
+    if region_router is None:
+        return jsonify({'regions': [], 'router': None})
+    stats = region_router.stats()
+    return jsonify({
+        'regions': [
+            {
+                'name': region.name,
+                'bounds': {'lat_min': region.bounds[0], 'lat_max': region.bounds[1],
+                           'lon_min': region.bounds[2], 'lon_max': region.bounds[3]},
+                'center': {'latitude': region.center[0], 'longitude': region.center[1]},
+                'model_checksum': region.checksum,
+                'resident': region.name in stats['resident']
+            }
+            for region in region_router.regions
+        ],
+        'router': stats
+    })
+
+@app.route('/api/observations', methods=['POST'])
+def ingest_observations():
+    """API endpoint for ingesting live traffic observations"""
+    try:
+        if sequence_buffer is None:
+            return jsonify({'error': 'Model not loaded'}), 500
+
+        data = request.get_json()
+        observations = data.get('observations', [data]) if isinstance(data, dict) else data
+        if not observations:
+            return jsonify({'error': 'No observations'}), 400
+
+        valid = []
+        for i, obs in enumerate(observations):
+            if not all(field in obs for field in ('latitude', 'longitude', 'timestamp')):
+                return jsonify({'error': f'Invalid observation {i}'}), 400
+            valid.append(obs)
+
+        timestamps = pd.DatetimeIndex(pd.to_datetime([o['timestamp'] for o in valid])).as_unit('ns')
+        rows = preprocess_observations(valid)
+        if streaming_model is not None:
+            n_inputs = streaming_model.n_features
+            rows_scaled = feature_scaler.transform(rows)[:, :n_inputs]
+        accepted = 0
+        # Append in time order so each zone's window stays chronological
+        for idx in np.argsort(timestamps.asi8, kind='stable'):
+            lat, lon = valid[idx]['latitude'], valid[idx]['longitude']
+            if not sequence_buffer.append(lat, lon, int(timestamps.asi8[idx]), rows[idx]):
+                continue
+            accepted += 1
+            if streaming_model is not None:
+                slots, appended = sequence_buffer.lookup([lat], [lon])
+                if appended[0] >= sequence_buffer.sequence_length:
+                    # Advance the zone's LSTM state by this row (O(1) per tick)
+                    streaming_model.advance(
+                        slots[0], appended[0], rows_scaled[idx],
+                        lambda: feature_scaler.transform(sequence_buffer.window(lat, lon))[:, :n_inputs]
+                    )
+
+        if zone_forecaster is not None:
+            # Per-zone feature averages for the STGCN's next input bucket
+            zone_forecaster.observe(
+                [o['latitude'] for o in valid], [o['longitude'] for o in valid], timestamps,
+                [[float(o.get(name, 0.0)) for name in zone_forecaster.feature_list] for o in valid])
+
+        if time.monotonic() - _last_snapshot > SEQUENCE_SNAPSHOT_INTERVAL:
+            snapshot_sequence_buffer()
+
+        return jsonify({
+            'accepted': accepted,
+            'rejected': len(valid) - accepted,
+            'buffer': sequence_buffer.stats(),
+            'streaming': streaming_model.stats() if streaming_model is not None else None
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/model_info', methods=['GET'])
 def model_info():
     """Get model information and performance metrics"""
@@ -328,6 +1049,11 @@ def health():
     return jsonify({
         'status': 'healthy',
         'model_loaded': model is not None,
+        'observation_buffer': sequence_buffer.stats() if sequence_buffer is not None else None,
+        'prediction_cache': prediction_cache.stats() if prediction_cache is not None else None,
+        'surrogate': surrogate.metrics if surrogate is not None else None,
+        'zone_forecaster': zone_forecaster.stats() if zone_forecaster is not None else None,
+        'region_router': region_router.stats() if region_router is not None else None,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -36,7 +36,11 @@ export async function POST(request: Request) {
     const supabase = await createClient()
     const body = await request.json()
 
-    const { data, error } = await supabase.from("predictions").insert([body]).select().single()
+    const { data, error } = await supabase
+      .from("predictions")
+      .upsert([body], { onConflict: "segment_id,model_type,prediction_timestamp" })
+      .select()
+      .single()
 
     if (error) throw error
 
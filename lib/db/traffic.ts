@@ -82,7 +82,11 @@ export async function insertTrafficObservation(
 
 export async function insertPrediction(prediction: Omit<Prediction, "id">): Promise<Prediction> {
   const supabase = await createClient()
-  const { data, error } = await supabase.from("predictions").insert([prediction]).select().single()
+  const { data, error } = await supabase
+    .from("predictions")
+    .upsert([prediction], { onConflict: "segment_id,model_type,prediction_timestamp" })
+    .select()
+    .single()
 
   if (error) throw error
   return data
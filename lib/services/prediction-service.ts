@@ -40,8 +40,10 @@ export class PredictionService {
       })
     }
 
-    // Insert predictions
-    const { error } = await supabase.from("predictions").insert(predictions)
+    // Upsert predictions: batch scoring may already hold these buckets
+    const { error } = await supabase
+      .from("predictions")
+      .upsert(predictions, { onConflict: "segment_id,model_type,prediction_timestamp" })
 
     if (error) {
       console.error("Error inserting predictions:", error)
@@ -0,0 +1,11 @@
+-- Unique key for precomputed predictions so batch scoring can upsert
+-- (INSERT ... ON CONFLICT) one row per segment, model and time bucket
+DELETE FROM public.predictions a
+  USING public.predictions b
+  WHERE a.segment_id = b.segment_id
+    AND a.model_type = b.model_type
+    AND a.prediction_timestamp = b.prediction_timestamp
+    AND (a.created_at, a.ctid) < (b.created_at, b.ctid);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_segment_model_timestamp
+  ON public.predictions(segment_id, model_type, prediction_timestamp);
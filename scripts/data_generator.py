@@ -8,6 +8,9 @@ import math
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple
 import json
+import numpy as np
+from windowing import sliding_windows
+from memory_trace import traced
 
 class TrafficDataGenerator:
     """Generate synthetic traffic data for training ML models."""
@@ -34,6 +37,7 @@ class TrafficDataGenerator:
             })
         return segments
     
+    @traced()
     def generate_traffic_observations(self) -> List[Dict]:
         """Generate historical traffic observations."""
         observations = []
@@ -202,13 +206,10 @@ class DataPreprocessor:
         return data
     
     @staticmethod
-    def create_sequences(data: List[float], seq_length: int = 24) -> Tuple[List, List]:
-        """Create sequences for time series models."""
-        X, y = [], []
-        for i in range(len(data) - seq_length):
-            X.append(data[i:i + seq_length])
-            y.append(data[i + seq_length])
-        return X, y
+    def create_sequences(data: List[float], seq_length: int = 24,
+                         horizon: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Create sequences for time series models (zero-copy window views)."""
+        return sliding_windows(np.asarray(data), seq_length, horizon)
     
     @staticmethod
     def split_train_test(data: List, train_ratio: float = 0.8) -> Tuple[List, List]:
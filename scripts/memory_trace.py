@@ -0,0 +1,256 @@
+"""
+Opt-in memory instrumentation for pipeline stages.
+Set ``MEMORY_TRACE=1`` (or call ``enable()``) to record, for every named
+stage, the peak traced Python/NumPy allocation, the RSS delta and the RSS
+peak above the stage's starting point, and to flag large array copies. A
+per-stage table is printed when the process exits. When tracing is off,
+``trace_stage``, ``traced`` and ``check_copy`` do nothing.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+MB = 1024 * 1024
+DEFAULT_COPY_THRESHOLD_MB = 64.0
+
+
+def _status_kb(field: str) -> int:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def reset_peak_rss() -> bool:
+    """Restart peak-RSS tracking; False where only the lifetime peak is available."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory since the last reset (Linux) or process start; NaN on Windows."""
+    try:
+        return _status_kb('VmHWM') / 1024
+    except (OSError, KeyError):
+        pass
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return float('nan')
+    # ru_maxrss is KiB on Linux but bytes on macOS
+    scale = MB if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def current_rss_mb() -> float:
+    """Resident memory now, or NaN where /proc is unavailable."""
+    try:
+        return _status_kb('VmRSS') / 1024
+    except (OSError, KeyError):
+        return float('nan')
+
+
+def _nbytes(obj) -> int:
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, 'memory_usage'):  # DataFrame
+        return int(obj.memory_usage(index=True).sum())
+    return int(getattr(obj, 'nbytes', 0))
+
+
+class MemoryTracer:
+    """Per-stage memory statistics for one process.
+
+    Stages may nest: an outer stage's peaks include its inner stages. A
+    stage whose traced peak exceeds the memory it keeps by more than the
+    copy threshold is flagged as building large transient copies.
+    """
+
+    def __init__(self, copy_threshold_mb: float = DEFAULT_COPY_THRESHOLD_MB):
+        self.copy_threshold_mb = copy_threshold_mb
+        self.stages: Dict[str, Dict] = {}
+        self.copies: List[Dict] = []
+        self._stack: List[Dict] = []
+        self.per_stage_rss_peak = reset_peak_rss()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _fold_peaks(self):
+        """Carry the current peaks into every open stage before they are reset."""
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        rss_peak = peak_rss_mb()
+        for frame in self._stack:
+            frame['traced_peak'] = max(frame['traced_peak'], traced_peak)
+            frame['rss_peak'] = max(frame['rss_peak'], rss_peak)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the block's allocations under ``name``."""
+        self._fold_peaks()
+        tracemalloc.reset_peak()
+        reset_peak_rss()
+        traced_start = tracemalloc.get_traced_memory()[0]
+        frame = {'name': name, 'traced_start': traced_start, 'traced_peak': traced_start,
+                 'rss_start': current_rss_mb(), 'rss_peak': 0.0, 'start': time.perf_counter()}
+        self._stack.append(frame)
+        try:
+            yield self
+        finally:
+            self._fold_peaks()
+            self._stack.pop()
+            traced_end = tracemalloc.get_traced_memory()[0]
+            peak = (frame['traced_peak'] - frame['traced_start']) / MB
+            kept = (traced_end - frame['traced_start']) / MB
+            self._record(name, {
+                'seconds': time.perf_counter() - frame['start'],
+                'traced_peak_mb': peak,
+                'traced_kept_mb': kept,
+                'transient_mb': max(peak - max(kept, 0.0), 0.0),
+                'rss_delta_mb': current_rss_mb() - frame['rss_start'],
+                'rss_peak_growth_mb': frame['rss_peak'] - frame['rss_start'],
+            })
+
+    def _record(self, name: str, run: Dict):
+        stats = self.stages.get(name)
+        if stats is None:
+            self.stages[name] = {**run, 'calls': 1}
+            return
+        stats['calls'] += 1
+        stats['seconds'] += run['seconds']
+        for key in ('traced_peak_mb', 'traced_kept_mb', 'transient_mb', 'rss_delta_mb', 'rss_peak_growth_mb'):
+            stats[key] = max(stats[key], run[key])
+
+    def check_copy(self, label: str, result, source=None):
+        """Flag ``result`` if it is a new buffer above the threshold.
+
+        With a ``source`` array, results that are views of it are not copies.
+        """
+        size_mb = _nbytes(result) / MB
+        if size_mb < self.copy_threshold_mb:
+            return
+        if (source is not None and isinstance(result, np.ndarray) and isinstance(source, np.ndarray)
+                and np.may_share_memory(result, source)):
+            return
+        stage = self._stack[-1]['name'] if self._stack else None
+        self.copies.append({'stage': stage, 'label': label, 'size_mb': size_mb,
+                            'source_mb': _nbytes(source) / MB if source is not None else None})
+
+    def report(self) -> Dict:
+        """Stage statistics, flagged copies and the settings used."""
+        flagged = {name for name, stats in self.stages.items()
+                   if stats['transient_mb'] >= self.copy_threshold_mb}
+        flagged |= {copy['stage'] for copy in self.copies}
+        return {
+            'copy_threshold_mb': self.copy_threshold_mb,
+            'per_stage_rss_peak': self.per_stage_rss_peak,
+            'stages': {name: {**stats, 'flagged': name in flagged} for name, stats in self.stages.items()},
+            'copies': self.copies,
+        }
+
+    def print_table(self, file=None):
+        """Per-stage memory table, largest traced peak first."""
+        file = file or sys.stdout
+        if not self.stages:
+            return
+        report = self.report()
+        print(f"\nMemory by stage (copy threshold {self.copy_threshold_mb:.0f} MB):", file=file)
+        print(f"{'stage':40s} {'calls':>5s} {'time s':>8s} {'traced peak':>11s} {'kept':>8s} "
+              f"{'transient':>9s} {'RSS delta':>9s} {'RSS peak+':>9s}", file=file)
+        for name, stats in sorted(report['stages'].items(), key=lambda item: -item[1]['traced_peak_mb']):
+            marker = '  <- large copies' if stats['flagged'] else ''
+            print(f"{name[:40]:40s} {stats['calls']:5d} {stats['seconds']:8.2f} "
+                  f"{stats['traced_peak_mb']:9.1f}MB {stats['traced_kept_mb']:6.1f}MB "
+                  f"{stats['transient_mb']:7.1f}MB {stats['rss_delta_mb']:7.1f}MB "
+                  f"{stats['rss_peak_growth_mb']:7.1f}MB{marker}", file=file)
+        for copy in report['copies']:
+            source = f" of a {copy['source_mb']:.1f} MB source" if copy['source_mb'] is not None else ""
+            print(f"  copy: {copy['label']} ({copy['size_mb']:.1f} MB{source}) in {copy['stage']}", file=file)
+        if not report['per_stage_rss_peak']:
+            print("  (RSS peaks are process lifetime peaks on this platform)", file=file)
+
+
+_tracer: Optional[MemoryTracer] = None
+
+
+def enable(copy_threshold_mb: Optional[float] = None, report_path: Optional[str] = None) -> MemoryTracer:
+    """Start tracing; the table is printed (and the report written) at exit."""
+    global _tracer
+    if _tracer is None:
+        if copy_threshold_mb is None:
+            copy_threshold_mb = float(os.environ.get('MEMORY_TRACE_COPY_MB', DEFAULT_COPY_THRESHOLD_MB))
+        _tracer = MemoryTracer(copy_threshold_mb)
+        atexit.register(_finish, report_path or os.environ.get('MEMORY_TRACE_PATH'))
+    return _tracer
+
+
+def disable():
+    """Stop tracing without reporting."""
+    global _tracer
+    _tracer = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def active() -> Optional[MemoryTracer]:
+    """The running tracer, or None when tracing is off."""
+    return _tracer
+
+
+def _finish(report_path: Optional[str]):
+    tracer = _tracer
+    if tracer is None:
+        return
+    tracer.print_table()
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(tracer.report(), f, indent=2)
+
+
+@contextmanager
+def trace_stage(name: str):
+    """Record the block as stage ``name`` when tracing is enabled."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.stage(name) as tracer:
+        yield tracer
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator recording every call of a function as a stage."""
+    def decorator(fn: Callable) -> Callable:
+        stage_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with _tracer.stage(stage_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def check_copy(label: str, result, source=None):
+    """Flag a large copy when tracing is enabled; returns ``result`` unchanged."""
+    if _tracer is not None:
+        _tracer.check_copy(label, result, source)
+    return result
+
+
+if os.environ.get('MEMORY_TRACE', '').lower() in ('1', 'true', 'yes'):
+    enable()
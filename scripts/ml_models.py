@@ -8,43 +8,188 @@ import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, Model
 from typing import Tuple, List, Dict
+from contextlib import contextmanager
 import json
+import math
+import os
+import time
 from datetime import datetime
+from windowing import SequenceWindows
+from stage_cache import StageCache, array_fingerprint
+from model_registry import ModelRegistry
+from memory_trace import check_copy, trace_stage
+
+
+# Performance mode: larger batches keep the fused/XLA kernels busy
+DEFAULT_BATCH_SIZE = 32
+PERFORMANCE_BATCH_SIZES = {'lstm': 256, 'cnn_gru': 256, 'gnn': 64}
+# XLA fuses the GNN's dense graph convolutions (~2x), but compiles recurrent
+# layers into a while loop that runs several times slower than TF's kernels
+PERFORMANCE_JIT_COMPILE = {'lstm': False, 'cnn_gru': False, 'gnn': True}
+
+
+def cpu_supports_bfloat16() -> bool:
+    """Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    return bool(flags & {'avx512_bf16', 'amx_bf16'})
+
+
+def precision_policy(mixed_precision: bool) -> str:
+    """Keras dtype policy: bfloat16 compute only where the CPU runs it natively."""
+    return 'mixed_bfloat16' if mixed_precision and cpu_supports_bfloat16() else 'float32'
+
+
+@contextmanager
+def _dtype_policy(name: str):
+    """Build layers under a dtype policy without changing it for other models."""
+    previous = keras.mixed_precision.global_policy()
+    keras.mixed_precision.set_global_policy(name)
+    try:
+        yield
+    finally:
+        keras.mixed_precision.set_global_policy(previous)
+
+
+class ThroughputReport(keras.callbacks.Callback):
+    """Per-epoch training samples/sec and step time.
+    
+    Times the training steps only (validation excluded). The first epoch
+    includes graph tracing and XLA compilation, so ``summary`` reports the
+    steady state from the second epoch on.
+    """
+    
+    def __init__(self, model_name: str):
+        super().__init__()
+        self.model_name = model_name
+        self.samples_per_epoch = None
+        self.batch_size = None
+        self.epochs = []
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._steps = 0
+    
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+        self._train_end = time.perf_counter()
+    
+    def on_epoch_end(self, epoch, logs=None):
+        train_seconds = self._train_end - self._epoch_start
+        self.epochs.append({
+            'epoch': epoch + 1,
+            'samples_per_sec': self.samples_per_epoch / train_seconds,
+            'step_time_ms': train_seconds / max(self._steps, 1) * 1000,
+            'train_seconds': train_seconds,
+            'steps': self._steps
+        })
+    
+    def summary(self) -> Dict:
+        """Mean steady-state throughput."""
+        steady = self.epochs[1:] or self.epochs
+        return {
+            'model': self.model_name,
+            'batch_size': self.batch_size,
+            'samples_per_sec': float(np.mean([e['samples_per_sec'] for e in steady])),
+            'step_time_ms': float(np.mean([e['step_time_ms'] for e in steady])),
+            'first_epoch_seconds': self.epochs[0]['train_seconds'] if self.epochs else None
+        }
+
+
+def _fit_model(model: Model, X_train, y_train, epochs: int, batch_size: int,
+               graph: bool = False, report: ThroughputReport = None,
+               checkpoint_dir: str = None) -> Dict:
+    """Fit a Keras model on arrays or on generator-fed SequenceWindows.
+    
+    Graph models get (batch, segments, seq, F) samples from the windows.
+    With a ``checkpoint_dir``, model and optimizer state are saved there
+    after every epoch; an interrupted fit called again with the same
+    directory resumes from the last completed epoch. The checkpoint is
+    removed once training finishes.
+    """
+    callbacks = [report] if report is not None else []
+    if checkpoint_dir is not None:
+        callbacks.append(keras.callbacks.BackupAndRestore(checkpoint_dir, save_freq='epoch'))
+    if isinstance(X_train, SequenceWindows):
+        # Hold out the last 20% of every segment, like validation_split=0.2
+        train_windows, val_windows = X_train.split(0.8)
+        to_dataset = 'to_graph_dataset' if graph else 'to_dataset'
+        if report is not None:
+            report.batch_size = batch_size
+            report.samples_per_epoch = (len(train_windows.graph_positions()) if graph
+                                        else len(train_windows))
+        history = model.fit(
+            getattr(train_windows, to_dataset)(batch_size, shuffle=True),
+            validation_data=getattr(val_windows, to_dataset)(batch_size),
+            epochs=epochs,
+            callbacks=callbacks,
+            verbose=0
+        )
+        return history.history
+
+    if report is not None:
+        report.batch_size = batch_size
+        report.samples_per_epoch = int(math.ceil(len(X_train) * 0.8))
+    history = model.fit(
+        X_train, y_train,
+        epochs=epochs,
+        batch_size=batch_size,
+        validation_split=0.2,
+        callbacks=callbacks,
+        verbose=0
+    )
+    return history.history
 
 
 class LSTMModel:
-    """LSTM model for time series traffic prediction."""
+    """LSTM model for time series traffic prediction.
+    
+    ``performance=True`` trains fused-kernel-compatible tanh/sigmoid LSTMs
+    with a larger batch size. ``mixed_precision=True`` adds bfloat16
+    compute when the CPU supports it natively; measure it with the throughput
+    report, as small recurrent models can run slower in bfloat16.
+    """
     
-    def __init__(self, seq_length: int = 24, num_features: int = 5):
+    def __init__(self, seq_length: int = 24, num_features: int = 5, performance: bool = False,
+                 mixed_precision: bool = False, units: Tuple[int, int] = (64, 32),
+                 learning_rate: float = 1e-3):
         self.seq_length = seq_length
         self.num_features = num_features
-        self.model = self._build_model()
+        self.units = tuple(units)
+        self.learning_rate = learning_rate
+        self.performance = performance
+        self.batch_size = PERFORMANCE_BATCH_SIZES['lstm'] if performance else DEFAULT_BATCH_SIZE
+        self.jit_compile = performance and PERFORMANCE_JIT_COMPILE['lstm']
+        self.throughput = ThroughputReport('lstm')
+        with _dtype_policy(precision_policy(mixed_precision)):
+            self.model = self._build_model()
     
     def _build_model(self) -> Model:
         """Build LSTM architecture."""
+        # relu recurrences can't use the fused (cuDNN/oneDNN) LSTM kernels
+        activation = 'tanh' if self.performance else 'relu'
         model = keras.Sequential([
-            layers.LSTM(64, activation='relu', input_shape=(self.seq_length, self.num_features),
-                       return_sequences=True),
+            layers.LSTM(self.units[0], activation=activation,
+                       input_shape=(self.seq_length, self.num_features), return_sequences=True),
             layers.Dropout(0.2),
-            layers.LSTM(32, activation='relu', return_sequences=False),
+            layers.LSTM(self.units[1], activation=activation, return_sequences=False),
             layers.Dropout(0.2),
             layers.Dense(16, activation='relu'),
-            layers.Dense(1)
+            layers.Dense(1, dtype='float32')
         ])
-        model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+        model.compile(optimizer=keras.optimizers.Adam(self.learning_rate), loss='mse', metrics=['mae'],
+                      jit_compile=self.jit_compile)
         return model
     
-    def train(self, X_train: np.ndarray, y_train: np.ndarray, 
-              epochs: int = 50, batch_size: int = 32) -> Dict:
-        """Train LSTM model."""
-        history = self.model.fit(
-            X_train, y_train,
-            epochs=epochs,
-            batch_size=batch_size,
-            validation_split=0.2,
-            verbose=0
-        )
-        return history.history
+    def train(self, X_train, y_train: np.ndarray = None,
+              epochs: int = 50, batch_size: int = None, checkpoint_dir: str = None) -> Dict:
+        """Train LSTM model on arrays or SequenceWindows."""
+        self.throughput = ThroughputReport('lstm')
+        return _fit_model(self.model, X_train, y_train, epochs, batch_size or self.batch_size,
+                          report=self.throughput, checkpoint_dir=checkpoint_dir)
     
     def predict(self, X: np.ndarray) -> np.ndarray:
         """Make predictions."""
@@ -59,79 +204,157 @@ class LSTMModel:
         self.model = keras.models.load_model(path)
 
 
+def normalized_adjacency(coordinates: np.ndarray,
+                         k_neighbors: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """Build a symmetric k-NN adjacency with self-loops, normalized as
+    D^-1/2 (A + I) D^-1/2, in sparse COO form (indices, values)."""
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    num_nodes = len(coordinates)
+    k = min(k_neighbors, num_nodes - 1)
+    
+    adj = np.eye(num_nodes, dtype=bool)
+    if k > 0:
+        diff = coordinates[:, None, :] - coordinates[None, :, :]
+        distances = np.sqrt((diff ** 2).sum(-1))
+        np.fill_diagonal(distances, np.inf)
+        neighbors = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        adj[np.repeat(np.arange(num_nodes), k), neighbors.ravel()] = True
+        adj |= adj.T
+    
+    rows, cols = np.nonzero(adj)
+    degree = adj.sum(axis=1).astype(np.float64)
+    values = 1.0 / np.sqrt(degree[rows] * degree[cols])
+    return np.stack([rows, cols], axis=1).astype(np.int64), values.astype(np.float32)
+
+
+@keras.utils.register_keras_serializable(package='traffic')
+class GraphConv(layers.Layer):
+    """Graph convolution A_hat @ X @ W over a fixed sparse adjacency.
+    
+    ``sparse=False`` multiplies by the dense adjacency instead, which XLA can
+    compile and which is faster for graphs of a few hundred nodes.
+    """
+    
+    def __init__(self, units: int, adjacency_indices, adjacency_values,
+                 num_nodes: int, activation='relu', sparse: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.units = units
+        self.num_nodes = num_nodes
+        self.adjacency_indices = np.asarray(adjacency_indices, dtype=np.int64)
+        self.adjacency_values = np.asarray(adjacency_values, dtype=np.float32)
+        self.activation = keras.activations.get(activation)
+        self.sparse = sparse
+        self.dense = layers.Dense(units)
+    
+    def build(self, input_shape):
+        self.dense.build(input_shape)
+        super().build(input_shape)
+    
+    def call(self, inputs):
+        # inputs: (batch, num_nodes, features)
+        x = self.dense(inputs)
+        if not self.sparse:
+            adjacency = np.zeros((self.num_nodes, self.num_nodes), dtype=np.float32)
+            adjacency[self.adjacency_indices[:, 0], self.adjacency_indices[:, 1]] = self.adjacency_values
+            return self.activation(tf.einsum('ij,bjf->bif', tf.cast(adjacency, x.dtype), x))
+        adjacency = tf.sparse.SparseTensor(
+            self.adjacency_indices,
+            tf.cast(self.adjacency_values, x.dtype),
+            (self.num_nodes, self.num_nodes)
+        )
+        # Fold the batch into columns: one sparse matmul for the whole batch
+        batch = tf.shape(x)[0]
+        x = tf.reshape(tf.transpose(x, [1, 0, 2]), (self.num_nodes, -1))
+        x = tf.sparse.sparse_dense_matmul(adjacency, x)
+        x = tf.transpose(tf.reshape(x, (self.num_nodes, batch, self.units)), [1, 0, 2])
+        return self.activation(x)
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            'units': self.units,
+            'adjacency_indices': self.adjacency_indices.tolist(),
+            'adjacency_values': self.adjacency_values.tolist(),
+            'num_nodes': self.num_nodes,
+            'activation': keras.activations.serialize(self.activation),
+            'sparse': self.sparse,
+        })
+        return config
+
+
 class GNNModel:
-    """Graph Neural Network for spatial-temporal traffic prediction."""
+    """Graph Neural Network for spatial-temporal traffic prediction.
+    
+    Takes (batch, num_nodes, seq_length, num_features) and predicts the next
+    value for every node in one forward pass: a shared LSTM encodes each
+    node's history, then graph convolutions mix neighbouring segments.
+    """
+    
+    is_graph_model = True
     
     def __init__(self, num_nodes: int = 50, seq_length: int = 24, 
-                 num_features: int = 5, hidden_dim: int = 32):
+                 num_features: int = 5, hidden_dim: int = 32,
+                 coordinates: np.ndarray = None, k_neighbors: int = 4,
+                 performance: bool = False, mixed_precision: bool = False,
+                 learning_rate: float = 1e-3):
         self.num_nodes = num_nodes
         self.seq_length = seq_length
         self.num_features = num_features
         self.hidden_dim = hidden_dim
-        self.model = self._build_model()
-    
-    def _build_adjacency_matrix(self, distances: np.ndarray, 
-                                threshold: float = 0.5) -> np.ndarray:
-        """Build adjacency matrix from distances."""
-        # Normalize distances
-        distances_norm = (distances - distances.min()) / (distances.max() - distances.min() + 1e-8)
-        # Create adjacency matrix (connect if distance < threshold)
-        adj = (distances_norm < threshold).astype(float)
-        # Add self-loops
-        np.fill_diagonal(adj, 1)
-        return adj
-    
-    def _graph_conv_layer(self, inputs, adj_matrix, units: int):
-        """Graph convolution layer."""
-        # inputs shape: (batch, num_nodes, features)
-        # adj_matrix shape: (num_nodes, num_nodes)
-        
-        # Dense transformation
-        x = layers.Dense(units, activation='relu')(inputs)
-        
-        # Graph convolution: A @ X
-        # Expand adj_matrix for batch processing
-        adj_expanded = tf.expand_dims(adj_matrix, 0)  # (1, num_nodes, num_nodes)
-        x = tf.matmul(adj_expanded, x)  # (batch, num_nodes, units)
-        
-        return x
+        self.k_neighbors = k_neighbors
+        self.learning_rate = learning_rate
+        self.performance = performance
+        self.batch_size = PERFORMANCE_BATCH_SIZES['gnn'] if performance else DEFAULT_BATCH_SIZE
+        self.jit_compile = performance and PERFORMANCE_JIT_COMPILE['gnn']
+        self.throughput = ThroughputReport('gnn')
+        self.adjacency = self._build_adjacency_matrix(coordinates, k_neighbors)
+        with _dtype_policy(precision_policy(mixed_precision)):
+            self.model = self._build_model()
+    
+    def _build_adjacency_matrix(self, coordinates: np.ndarray,
+                                k_neighbors: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """Build the normalized sparse adjacency once from segment coordinates."""
+        if coordinates is None:
+            # No spatial information: every node only sees itself
+            indices = np.repeat(np.arange(self.num_nodes), 2).reshape(-1, 2)
+            return indices.astype(np.int64), np.ones(self.num_nodes, dtype=np.float32)
+        if len(coordinates) != self.num_nodes:
+            raise ValueError(f"Expected {self.num_nodes} coordinates, got {len(coordinates)}")
+        return normalized_adjacency(coordinates, k_neighbors)
     
     def _build_model(self) -> Model:
         """Build GNN architecture."""
         # Input: (batch, num_nodes, seq_length, num_features)
         node_input = layers.Input(shape=(self.num_nodes, self.seq_length, self.num_features))
         
-        # Reshape for temporal processing
-        x = layers.Reshape((self.num_nodes, self.seq_length * self.num_features))(node_input)
+        # Temporal encoding with one LSTM shared by all nodes (batched over nodes)
+        x = layers.TimeDistributed(layers.LSTM(self.hidden_dim))(node_input)
         
-        # Graph convolution layers
-        x = layers.Dense(self.hidden_dim, activation='relu')(x)
-        x = layers.Dense(self.hidden_dim, activation='relu')(x)
+        # Graph convolution layers: (batch, num_nodes, hidden_dim)
+        indices, values = self.adjacency
+        # XLA can't compile sparse matmuls
+        sparse = not self.jit_compile
+        x = GraphConv(self.hidden_dim, indices, values, self.num_nodes, sparse=sparse)(x)
+        x = GraphConv(self.hidden_dim, indices, values, self.num_nodes, sparse=sparse)(x)
         
-        # Temporal processing with LSTM
-        x = layers.LSTM(32, activation='relu', return_sequences=False)(x)
-        
-        # Output layer
-        output = layers.Dense(1)(x)
+        # One output per node
+        x = layers.Dense(1, dtype='float32')(x)
+        output = layers.Reshape((self.num_nodes,))(x)
         
         model = Model(inputs=node_input, outputs=output)
-        model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+        model.compile(optimizer=keras.optimizers.Adam(self.learning_rate), loss='mse', metrics=['mae'],
+                      jit_compile=self.jit_compile)
         return model
     
-    def train(self, X_train: np.ndarray, y_train: np.ndarray,
-              epochs: int = 50, batch_size: int = 32) -> Dict:
-        """Train GNN model."""
-        history = self.model.fit(
-            X_train, y_train,
-            epochs=epochs,
-            batch_size=batch_size,
-            validation_split=0.2,
-            verbose=0
-        )
-        return history.history
+    def train(self, X_train, y_train: np.ndarray = None,
+              epochs: int = 50, batch_size: int = None, checkpoint_dir: str = None) -> Dict:
+        """Train GNN model on (samples, nodes, seq, features) arrays or SequenceWindows."""
+        self.throughput = ThroughputReport('gnn')
+        return _fit_model(self.model, X_train, y_train, epochs, batch_size or self.batch_size,
+                          graph=True, report=self.throughput, checkpoint_dir=checkpoint_dir)
     
     def predict(self, X: np.ndarray) -> np.ndarray:
-        """Make predictions."""
+        """Predict every node: (batch, num_nodes)."""
         return self.model.predict(X, verbose=0)
     
     def save(self, path: str):
@@ -146,13 +369,24 @@ class GNNModel:
 class CNNGRUModel:
     """CNN-GRU model combining convolutional and recurrent layers."""
     
-    def __init__(self, seq_length: int = 24, num_features: int = 5):
+    def __init__(self, seq_length: int = 24, num_features: int = 5, performance: bool = False,
+                 mixed_precision: bool = False, units: Tuple[int, int] = (64, 32),
+                 learning_rate: float = 1e-3):
         self.seq_length = seq_length
         self.num_features = num_features
-        self.model = self._build_model()
+        self.units = tuple(units)
+        self.learning_rate = learning_rate
+        self.performance = performance
+        self.batch_size = PERFORMANCE_BATCH_SIZES['cnn_gru'] if performance else DEFAULT_BATCH_SIZE
+        self.jit_compile = performance and PERFORMANCE_JIT_COMPILE['cnn_gru']
+        self.throughput = ThroughputReport('cnn_gru')
+        with _dtype_policy(precision_policy(mixed_precision)):
+            self.model = self._build_model()
     
     def _build_model(self) -> Model:
         """Build CNN-GRU architecture."""
+        # relu recurrences can't use the fused GRU kernels
+        activation = 'tanh' if self.performance else 'relu'
         model = keras.Sequential([
             # CNN layers for feature extraction
             layers.Conv1D(filters=64, kernel_size=3, activation='relu',
@@ -162,29 +396,25 @@ class CNNGRUModel:
             layers.Dropout(0.2),
             
             # GRU layers for temporal modeling
-            layers.GRU(64, activation='relu', return_sequences=True),
+            layers.GRU(self.units[0], activation=activation, return_sequences=True),
             layers.Dropout(0.2),
-            layers.GRU(32, activation='relu', return_sequences=False),
+            layers.GRU(self.units[1], activation=activation, return_sequences=False),
             layers.Dropout(0.2),
             
             # Dense layers
             layers.Dense(16, activation='relu'),
-            layers.Dense(1)
+            layers.Dense(1, dtype='float32')
         ])
-        model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+        model.compile(optimizer=keras.optimizers.Adam(self.learning_rate), loss='mse', metrics=['mae'],
+                      jit_compile=self.jit_compile)
         return model
     
-    def train(self, X_train: np.ndarray, y_train: np.ndarray,
-              epochs: int = 50, batch_size: int = 32) -> Dict:
-        """Train CNN-GRU model."""
-        history = self.model.fit(
-            X_train, y_train,
-            epochs=epochs,
-            batch_size=batch_size,
-            validation_split=0.2,
-            verbose=0
-        )
-        return history.history
+    def train(self, X_train, y_train: np.ndarray = None,
+              epochs: int = 50, batch_size: int = None, checkpoint_dir: str = None) -> Dict:
+        """Train CNN-GRU model on arrays or SequenceWindows."""
+        self.throughput = ThroughputReport('cnn_gru')
+        return _fit_model(self.model, X_train, y_train, epochs, batch_size or self.batch_size,
+                          report=self.throughput, checkpoint_dir=checkpoint_dir)
     
     def predict(self, X: np.ndarray) -> np.ndarray:
         """Make predictions."""
@@ -199,113 +429,452 @@ class CNNGRUModel:
         self.model = keras.models.load_model(path)
 
 
+def _flat_pair(y_true, y_pred) -> Tuple[np.ndarray, np.ndarray]:
+    """Flatten targets and predictions, refusing silent broadcasting.
+    
+    (N, 1) predictions against (N,) targets would otherwise broadcast to
+    an (N, N) matrix.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64).reshape(-1)
+    y_pred = np.asarray(y_pred, dtype=np.float64).reshape(-1)
+    if y_true.shape != y_pred.shape:
+        raise ValueError(f"Got {y_true.size} targets but {y_pred.size} predictions")
+    return y_true, y_pred
+
+
+class MetricAccumulator:
+    """Running RMSE/MAE/MAPE sums, overall or per integer group.
+    
+    Memory is one row of sums per group, however many samples are added.
+    """
+    
+    def __init__(self):
+        # count, squared error, absolute error, absolute fraction error
+        self.sums = np.zeros((4, 0))
+    
+    def update(self, y_true, y_pred, groups=None):
+        """Add a batch; ``groups`` gives each sample's group id."""
+        y_true, y_pred = _flat_pair(y_true, y_pred)
+        if groups is None:
+            groups = np.zeros(len(y_true), dtype=np.int64)
+        groups = np.asarray(groups, dtype=np.int64).reshape(-1)
+        if len(groups) != len(y_true):
+            raise ValueError(f"Got {len(groups)} group ids for {len(y_true)} samples")
+        if not len(groups):
+            return
+        
+        size = max(self.sums.shape[1], int(groups.max()) + 1)
+        if size > self.sums.shape[1]:
+            self.sums = np.pad(self.sums, ((0, 0), (0, size - self.sums.shape[1])))
+        error = y_true - y_pred
+        for row, weights in enumerate((None, error ** 2, np.abs(error),
+                                       np.abs(error / (y_true + 1e-8)))):
+            self.sums[row] += np.bincount(groups, weights=weights, minlength=size)
+    
+    @staticmethod
+    def _metrics(count, squared_error, absolute_error, fraction_error) -> Dict:
+        return {
+            'rmse': float(np.sqrt(squared_error / count)),
+            'mae': float(absolute_error / count),
+            'mape': float(fraction_error / count * 100),
+            'samples': int(count)
+        }
+    
+    def total(self) -> Dict:
+        """Metrics over every sample added."""
+        if not self.sums.size or not self.sums[0].sum():
+            raise ValueError("No samples to evaluate")
+        return self._metrics(*self.sums.sum(axis=1))
+    
+    def by_group(self, key: str) -> List[Dict]:
+        """Metrics for every group with samples, as ``{key: id, ...}`` rows."""
+        return [{key: int(group), **self._metrics(*self.sums[:, group])}
+                for group in np.flatnonzero(self.sums[0])]
+
+
 class ModelEvaluator:
-    """Evaluate and compare model performance."""
+    """Evaluate and compare model performance.
+    
+    Test sets are streamed in batches and scored with running sums, so memory
+    stays constant in the number of test samples.
+    """
     
     @staticmethod
     def calculate_rmse(y_true: np.ndarray, y_pred: np.ndarray) -> float:
         """Calculate Root Mean Squared Error."""
+        y_true, y_pred = _flat_pair(y_true, y_pred)
         return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
     
     @staticmethod
     def calculate_mae(y_true: np.ndarray, y_pred: np.ndarray) -> float:
         """Calculate Mean Absolute Error."""
+        y_true, y_pred = _flat_pair(y_true, y_pred)
         return float(np.mean(np.abs(y_true - y_pred)))
     
     @staticmethod
     def calculate_mape(y_true: np.ndarray, y_pred: np.ndarray) -> float:
         """Calculate Mean Absolute Percentage Error."""
+        y_true, y_pred = _flat_pair(y_true, y_pred)
         return float(np.mean(np.abs((y_true - y_pred) / (y_true + 1e-8))) * 100)
     
     @staticmethod
-    def evaluate_model(model, X_test: np.ndarray, y_test: np.ndarray,
-                      model_name: str) -> Dict:
-        """Evaluate model on test set."""
-        y_pred = model.predict(X_test)
+    def iter_batches(X_test, y_test: np.ndarray = None, batch_size: int = 1024,
+                     graph: bool = False, segment_ids: np.ndarray = None,
+                     hours: np.ndarray = None):
+        """Yield (X, y, segment_ids, hours) test batches in order.
         
-        metrics = {
-            'model': model_name,
-            'rmse': ModelEvaluator.calculate_rmse(y_test, y_pred),
-            'mae': ModelEvaluator.calculate_mae(y_test, y_pred),
-            'mape': ModelEvaluator.calculate_mape(y_test, y_pred),
-            'timestamp': datetime.now().isoformat()
-        }
+        For SequenceWindows, segment ids come from the windows and ``hours``
+        is the hour of day of every series timestep, (T,) or (segments, T);
+        each window is labelled with the hour of its target. For arrays,
+        ``segment_ids`` and ``hours`` give one value per sample, except that
+        graph array columns are labelled with ``segment_ids`` (default
+        0..segments-1). Breakdowns are None when unknown.
+        """
+        if isinstance(X_test, SequenceWindows):
+            yield from ModelEvaluator._window_batches(X_test, batch_size, graph, hours)
+            return
+        
+        for start in range(0, len(X_test), batch_size):
+            batch = slice(start, start + batch_size)
+            y = y_test[batch]
+            hour = None if hours is None else np.asarray(hours[batch])
+            if graph and y.ndim == 2:
+                # (samples, segments) targets: one column per segment
+                seg = np.arange(y.shape[1]) if segment_ids is None else segment_ids
+                seg = np.broadcast_to(seg, y.shape)
+                if hour is not None:
+                    hour = np.broadcast_to(hour[:, None], y.shape)
+            else:
+                seg = None if segment_ids is None else segment_ids[batch]
+            yield X_test[batch], y, seg, hour
+    
+    @staticmethod
+    def _window_batches(windows: SequenceWindows, batch_size: int, graph: bool,
+                        hours: np.ndarray = None):
+        """Gather one batch of flat or graph windows at a time."""
+        target_offset = windows.seq_length + windows.horizon - 1
         
-        return metrics
+        def target_hours(segment, position):
+            if hours is None:
+                return None
+            hours_arr = np.asarray(hours)
+            if hours_arr.ndim == 1:
+                return hours_arr[position + target_offset]
+            return hours_arr[segment, position + target_offset]
+        
+        if graph:
+            positions = windows.graph_positions()
+            segments = np.arange(windows.num_segments)
+            for start in range(0, len(positions), batch_size):
+                pos = positions[start:start + batch_size]
+                X = windows.windows[:, pos].swapaxes(0, 1)
+                y = windows.targets[:, pos].T
+                seg, position = np.broadcast_arrays(segments[None, :], pos[:, None])
+                yield X, y, seg, target_hours(seg, position)
+            return
+        
+        for start in range(0, len(windows), batch_size):
+            indices = windows.indices[start:start + batch_size]
+            X, y = windows.take(indices)
+            segment, position = np.divmod(indices, windows.windows_per_segment)
+            yield X, y, segment, target_hours(segment, position)
+    
+    @staticmethod
+    def evaluate_model(model, X_test: np.ndarray, y_test: np.ndarray,
+                      model_name: str, batch_size: int = 1024,
+                      segment_ids: np.ndarray = None, hours: np.ndarray = None) -> Dict:
+        """Evaluate model on test set."""
+        return ModelEvaluator.compare_models({model_name: model}, X_test, y_test, batch_size,
+                                             segment_ids=segment_ids, hours=hours)[0]
     
     @staticmethod
-    def compare_models(models: Dict, X_test: np.ndarray, 
-                      y_test: np.ndarray) -> List[Dict]:
-        """Compare multiple models."""
+    def compare_models(models: Dict, X_test,
+                      y_test: np.ndarray = None, batch_size: int = 1024,
+                      segment_ids: np.ndarray = None, hours: np.ndarray = None,
+                      workers: int = None) -> List[Dict]:
+        """Compare multiple models on arrays or test SequenceWindows.
+        
+        Every batch is gathered once and scored by all models concurrently
+        (up to ``workers`` threads), accumulating overall, per-segment and
+        per-hour metrics.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
         results = []
-        for model_name, model in models.items():
-            metrics = ModelEvaluator.evaluate_model(model, X_test, y_test, model_name)
-            results.append(metrics)
+        # Graph models score every segment per sample, so they get their own batches
+        for graph in (False, True):
+            group = {name: model for name, model in models.items()
+                     if getattr(model, 'is_graph_model', False) == graph}
+            if not group:
+                continue
+            accumulators = {name: (MetricAccumulator(), MetricAccumulator(), MetricAccumulator())
+                            for name in group}
+            with ThreadPoolExecutor(max_workers=workers or len(group)) as executor:
+                for X, y, seg, hour in ModelEvaluator.iter_batches(X_test, y_test, batch_size, graph,
+                                                                   segment_ids, hours):
+                    predictions = executor.map(lambda model: model.predict(X), group.values())
+                    for name, y_pred in zip(group, predictions):
+                        overall, per_segment, per_hour = accumulators[name]
+                        overall.update(y, y_pred)
+                        if seg is not None:
+                            per_segment.update(y, y_pred, seg)
+                        if hour is not None:
+                            per_hour.update(y, y_pred, hour)
+            
+            for name, (overall, per_segment, per_hour) in accumulators.items():
+                metrics = {'model': name, **overall.total(), 'timestamp': datetime.now().isoformat()}
+                if per_segment.sums.size:
+                    metrics['per_segment'] = per_segment.by_group('segment')
+                if per_hour.sums.size:
+                    metrics['per_hour'] = per_hour.by_group('hour')
+                results.append(metrics)
         
         # Sort by RMSE
         results.sort(key=lambda x: x['rmse'])
         return results
 
 
+def _model_dir(root: str, name: str) -> str:
+    """Per-model subdirectory of an optional root directory."""
+    return os.path.join(root, name) if root else None
+
+
+# Constructor arguments that define each architecture beyond the data shape
+MODEL_PARAMS = {'lstm': ('units', 'learning_rate'), 'cnn_gru': ('units', 'learning_rate'),
+                'gnn': ('hidden_dim', 'k_neighbors', 'learning_rate')}
+
+
+def model_params(name: str, model) -> Dict:
+    """Constructor arguments that rebuild ``model`` with ``build_model``."""
+    return {key: getattr(model, key) for key in MODEL_PARAMS[name]}
+
+
 class TrafficPredictionPipeline:
     """Complete pipeline for training and evaluating traffic prediction models."""
     
-    def __init__(self, seq_length: int = 24, num_features: int = 5):
+    def __init__(self, seq_length: int = 24, num_features: int = 5, horizon: int = 1,
+                 segment_coordinates: np.ndarray = None, performance: bool = False,
+                 mixed_precision: bool = False):
         self.seq_length = seq_length
         self.num_features = num_features
+        self.horizon = horizon
+        self.segment_coordinates = segment_coordinates
+        self.performance = performance
+        self.mixed_precision = mixed_precision
         self.models = {}
+        self.versions = {}
+        self.throughput = {}
         self.evaluator = ModelEvaluator()
     
+    def prepare_windows(self, data: np.ndarray,
+                        train_ratio: float = 0.8) -> Tuple[SequenceWindows, SequenceWindows]:
+        """Build zero-copy train/test windows from (T, F) or (segments, T, F) data."""
+        windows = SequenceWindows(data, self.seq_length, self.horizon, target_col=0)  # Predict speed
+        return windows.split(train_ratio)
+    
     def prepare_data(self, data: np.ndarray, 
-                    train_ratio: float = 0.8) -> Tuple[Tuple, Tuple]:
-        """Prepare data for training."""
-        # Create sequences
-        X, y = [], []
-        for i in range(len(data) - self.seq_length):
-            X.append(data[i:i + self.seq_length])
-            y.append(data[i + self.seq_length, 0])  # Predict speed
+                    train_ratio: float = 0.8, cache: StageCache = None) -> Tuple[Tuple, Tuple]:
+        """Prepare data for training.
         
-        X = np.array(X)
-        y = np.array(y)
+        With a ``cache``, the materialized windows are stored on disk keyed by
+        the data's content and the window settings, and reloaded memory-mapped.
+        """
+        def materialize():
+            with trace_stage('TrafficPredictionPipeline.prepare_data'):
+                train_windows, test_windows = self.prepare_windows(data, train_ratio)
+                (X_train, y_train), (X_test, y_test) = train_windows.arrays(), test_windows.arrays()
+                arrays = {'X_train': np.ascontiguousarray(X_train), 'y_train': np.ascontiguousarray(y_train),
+                          'X_test': np.ascontiguousarray(X_test), 'y_test': np.ascontiguousarray(y_test)}
+                check_copy('prepare_data X_train', arrays['X_train'], source=X_train)
+                check_copy('prepare_data X_test', arrays['X_test'], source=X_test)
+            return arrays
         
-        # Split train/test
-        split_idx = int(len(X) * train_ratio)
-        X_train, X_test = X[:split_idx], X[split_idx:]
-        y_train, y_test = y[:split_idx], y[split_idx:]
+        if cache is None:
+            arrays = materialize()
+        else:
+            arrays = cache.run('pipeline_windows', materialize,
+                               config={'seq_length': self.seq_length, 'horizon': self.horizon,
+                                       'train_ratio': train_ratio, 'target_col': 0},
+                               inputs=[array_fingerprint(np.asarray(data, dtype=np.float32))])
+        return (arrays['X_train'], arrays['y_train']), (arrays['X_test'], arrays['y_test'])
+    
+    def train_all_models(self, X_train, y_train: np.ndarray = None,
+                        epochs: int = 50, workers: int = 1, checkpoint_dir: str = None,
+                        warm_start: bool = False) -> Dict:
+        """Train all three models on arrays or SequenceWindows.
+        
+        With ``workers > 1`` each model trains in its own process. With a
+        ``checkpoint_dir`` each model checkpoints into its own subdirectory
+        every epoch and resumes from it after an interruption.
+        ``warm_start=True`` continues from the models loaded by
+        ``load_models`` instead of fresh weights.
+        """
+        if workers > 1:
+            return self._train_all_models_parallel(X_train, y_train, epochs, workers,
+                                                   checkpoint_dir, warm_start)
         
-        return (X_train, y_train), (X_test, y_test)
-    
-    def train_all_models(self, X_train: np.ndarray, y_train: np.ndarray,
-                        epochs: int = 50) -> Dict:
-        """Train all three models."""
         print("Training LSTM model...")
-        lstm = LSTMModel(self.seq_length, self.num_features)
-        lstm_history = lstm.train(X_train, y_train, epochs=epochs)
+        lstm = self._warm_model('lstm', warm_start) or LSTMModel(
+            self.seq_length, self.num_features, performance=self.performance,
+            mixed_precision=self.mixed_precision)
+        lstm_history = lstm.train(X_train, y_train, epochs=epochs,
+                                  checkpoint_dir=_model_dir(checkpoint_dir, 'lstm'))
         self.models['lstm'] = lstm
         
         print("Training CNN-GRU model...")
-        cnn_gru = CNNGRUModel(self.seq_length, self.num_features)
-        cnn_gru_history = cnn_gru.train(X_train, y_train, epochs=epochs)
+        cnn_gru = self._warm_model('cnn_gru', warm_start) or CNNGRUModel(
+            self.seq_length, self.num_features, performance=self.performance,
+            mixed_precision=self.mixed_precision)
+        cnn_gru_history = cnn_gru.train(X_train, y_train, epochs=epochs,
+                                        checkpoint_dir=_model_dir(checkpoint_dir, 'cnn_gru'))
         self.models['cnn_gru'] = cnn_gru
         
         print("Training GNN model...")
-        gnn = GNNModel(num_nodes=50, seq_length=self.seq_length, 
-                      num_features=self.num_features)
-        gnn_history = gnn.train(X_train, y_train, epochs=epochs)
+        gnn = self._warm_model('gnn', warm_start) or GNNModel(
+            num_nodes=self._num_nodes(X_train), seq_length=self.seq_length,
+            num_features=self.num_features, coordinates=self.segment_coordinates,
+            performance=self.performance, mixed_precision=self.mixed_precision)
+        gnn_history = gnn.train(X_train, y_train, epochs=epochs,
+                                checkpoint_dir=_model_dir(checkpoint_dir, 'gnn'))
         self.models['gnn'] = gnn
         
+        self.throughput = {name: model.throughput.epochs for name, model in self.models.items()}
         return {
             'lstm': lstm_history,
             'cnn_gru': cnn_gru_history,
             'gnn': gnn_history
         }
     
-    def evaluate_all_models(self, X_test: np.ndarray, 
-                           y_test: np.ndarray) -> List[Dict]:
-        """Evaluate all models and return comparison."""
-        results = self.evaluator.compare_models(self.models, X_test, y_test)
+    def _num_nodes(self, X_train) -> int:
+        """Graph size: one node per segment."""
+        if self.segment_coordinates is not None:
+            return len(self.segment_coordinates)
+        if isinstance(X_train, SequenceWindows):
+            return X_train.num_segments
+        return X_train.shape[1]
+    
+    def _warm_model(self, name: str, warm_start: bool):
+        """The loaded model to continue training, or None for a fresh one."""
+        if not warm_start:
+            return None
+        if name not in self.models:
+            raise ValueError(f"No {name} model loaded to warm-start from; call load_models() first")
+        return self.models[name]
+    
+    def _train_all_models_parallel(self, X_train, y_train: np.ndarray, epochs: int, workers: int,
+                                   checkpoint_dir: str = None, warm_start: bool = False) -> Dict:
+        """Train all models in worker processes and rebuild them here."""
+        from parallel_training import (MODEL_NAMES, build_model, model_state, restore_model_state,
+                                       train_models_parallel)
+        
+        if not isinstance(X_train, SequenceWindows):
+            raise TypeError("Parallel training needs SequenceWindows from prepare_windows()")
+        
+        # Workers continue the loaded models like _warm_model does: same
+        # architecture, weights and optimizer state
+        params, initial_state = {}, None
+        if warm_start:
+            warm = {name: self._warm_model(name, True) for name in MODEL_NAMES}
+            params = {name: model_params(name, model) for name, model in warm.items()}
+            initial_state = {name: model_state(model.model) for name, model in warm.items()}
+        results = train_models_parallel(X_train, epochs=epochs, workers=workers,
+                                        coordinates=self.segment_coordinates,
+                                        performance=self.performance,
+                                        mixed_precision=self.mixed_precision,
+                                        checkpoint_dir=checkpoint_dir,
+                                        model_params=params,
+                                        initial_state=initial_state)
+        histories = {}
+        for name in MODEL_NAMES:
+            model = build_model(name, self.seq_length, self.num_features,
+                                num_nodes=self._num_nodes(X_train),
+                                coordinates=self.segment_coordinates,
+                                performance=self.performance,
+                                mixed_precision=self.mixed_precision,
+                                **params.get(name, {}))
+            restore_model_state(model.model, results[name]['state'])
+            self.models[name] = model
+            histories[name] = results[name]['history']
+            self.throughput[name] = results[name]['throughput']
+        return histories
+    
+    def evaluate_all_models(self, X_test,
+                           y_test: np.ndarray = None, batch_size: int = 1024,
+                           hours: np.ndarray = None) -> List[Dict]:
+        """Evaluate all models on shared test batches and return comparison."""
+        results = self.evaluator.compare_models(self.models, X_test, y_test, batch_size,
+                                                hours=hours)
         return results
     
+    def throughput_report(self) -> Dict:
+        """Per-epoch samples/sec and step time for every trained architecture."""
+        return {
+            'performance': self.performance,
+            'precision': precision_policy(self.mixed_precision),
+            'models': {
+                name: {
+                    'batch_size': self.models[name].batch_size,
+                    'jit_compile': self.models[name].jit_compile,
+                    'epochs': epochs,
+                    'steady_samples_per_sec': float(np.mean(
+                        [e['samples_per_sec'] for e in (epochs[1:] or epochs)])),
+                }
+                for name, epochs in self.throughput.items()
+            },
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def load_models(self, registry: ModelRegistry = None) -> Dict[str, Dict]:
+        """Load the latest registered version of every model.
+        
+        Returns the metadata of the versions loaded; models without any
+        version are skipped.
+        """
+        from parallel_training import MODEL_NAMES, build_model
+        
+        registry = registry or ModelRegistry()
+        loaded = {}
+        for name in MODEL_NAMES:
+            metadata = registry.latest(name)
+            if metadata is None:
+                continue
+            # Versions registered before params were recorded used the defaults
+            model = build_model(name, self.seq_length, self.num_features,
+                                num_nodes=metadata['config']['num_nodes'],
+                                coordinates=self.segment_coordinates,
+                                performance=self.performance,
+                                mixed_precision=self.mixed_precision,
+                                **metadata['config'].get('params', {}))
+            model.load(os.path.join(metadata['path'], 'model.keras'))
+            self.models[name] = model
+            self.versions[name] = metadata['version']
+            loaded[name] = metadata
+        return loaded
+    
+    def save_models(self, registry: ModelRegistry = None, metadata: Dict = None,
+                    results: List[Dict] = None) -> Dict[str, Dict]:
+        """Store every trained model as a new registry version.
+        
+        ``metadata`` (e.g. the data range trained on) is recorded with each
+        version, along with the version it was warm-started from and its
+        entry in ``results`` from ``evaluate_all_models``.
+        """
+        registry = registry or ModelRegistry()
+        metrics = {result['model']: result for result in results or []}
+        saved = {}
+        for name, model in self.models.items():
+            saved[name] = registry.save_keras(name, model.model, {
+                **(metadata or {}),
+                'parent': self.versions.get(name),
+                'config': {'seq_length': self.seq_length, 'num_features': self.num_features,
+                           'horizon': self.horizon, 'num_nodes': getattr(model, 'num_nodes', None),
+                           'params': model_params(name, model)},
+                'metrics': {key: metrics[name][key] for key in ('rmse', 'mae', 'mape')
+                            if key in metrics.get(name, {})},
+            })
+            self.versions[name] = saved[name]['version']
+        return saved
+    
     def get_best_model(self) -> Tuple[str, object]:
         """Get best performing model."""
         if not self.models:
@@ -319,21 +888,23 @@ if __name__ == "__main__":
     
     # Generate synthetic data
     np.random.seed(42)
-    data = np.random.randn(1000, 5)  # 1000 timesteps, 5 features
+    data = np.random.randn(10, 200, 5)  # 10 segments, 200 timesteps, 5 features
+    coordinates = np.random.rand(10, 2)
     
     # Create pipeline
-    pipeline = TrafficPredictionPipeline(seq_length=24, num_features=5)
+    pipeline = TrafficPredictionPipeline(seq_length=24, num_features=5,
+                                         segment_coordinates=coordinates)
     
     # Prepare data
-    (X_train, y_train), (X_test, y_test) = pipeline.prepare_data(data)
-    print(f"Training data shape: {X_train.shape}")
-    print(f"Test data shape: {X_test.shape}")
+    train_windows, test_windows = pipeline.prepare_windows(data)
+    print(f"Training data shape: {train_windows.shape}")
+    print(f"Test data shape: {test_windows.shape}")
     
     # Train models
-    histories = pipeline.train_all_models(X_train, y_train, epochs=10)
+    histories = pipeline.train_all_models(train_windows, epochs=10)
     
     # Evaluate models
-    results = pipeline.evaluate_all_models(X_test, y_test)
+    results = pipeline.evaluate_all_models(test_windows)
     
     print("\nModel Comparison Results:")
     for result in results:
@@ -0,0 +1,81 @@
+"""
+Versioned model artifacts for incremental training.
+Each trained model is stored as ``<root>/<name>/v<N>/`` with its artifact
+files and a metadata.json recording the data range it was trained on and the
+version it was fine-tuned from. The metadata is written last, so a version
+only becomes visible once its artifacts are complete.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def default_registry_dir() -> str:
+    """$MODEL_REGISTRY_DIR, or model_versions at the repository root."""
+    return os.environ.get('MODEL_REGISTRY_DIR', os.path.join(REPO_ROOT, 'model_versions'))
+
+
+class ModelRegistry:
+    """Numbered, append-only versions of each named model."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or default_registry_dir()
+
+    def versions(self, name: str) -> List[int]:
+        """Committed versions of a model, oldest first."""
+        model_dir = os.path.join(self.root, name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(int(entry[1:]) for entry in os.listdir(model_dir)
+                      if entry.startswith('v') and entry[1:].isdigit()
+                      and os.path.exists(os.path.join(model_dir, entry, 'metadata.json')))
+
+    def get(self, name: str, version: Optional[int] = None) -> Optional[Dict]:
+        """Metadata (with ``path``) of one version, or of the latest when None."""
+        versions = self.versions(name)
+        if not versions:
+            return None
+        version = versions[-1] if version is None else version
+        path = os.path.join(self.root, name, f"v{version}")
+        with open(os.path.join(path, 'metadata.json')) as f:
+            return {**json.load(f), 'path': path}
+
+    def latest(self, name: str) -> Optional[Dict]:
+        """Metadata of the newest version, or None."""
+        return self.get(name)
+
+    def new_version(self, name: str) -> Tuple[int, str]:
+        """Reserve the next version number and create its directory."""
+        model_dir = os.path.join(self.root, name)
+        os.makedirs(model_dir, exist_ok=True)
+        existing = [int(entry[1:]) for entry in os.listdir(model_dir)
+                    if entry.startswith('v') and entry[1:].isdigit()]
+        version = max(existing, default=0) + 1
+        path = os.path.join(model_dir, f"v{version}")
+        os.makedirs(path)
+        return version, path
+
+    def commit(self, name: str, version: int, metadata: Dict) -> Dict:
+        """Publish a version once its artifacts are written."""
+        path = os.path.join(self.root, name, f"v{version}")
+        metadata = {'name': name, 'version': version, 'created': datetime.now().isoformat(), **metadata}
+        tmp_path = os.path.join(path, 'metadata.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+        os.replace(tmp_path, os.path.join(path, 'metadata.json'))
+        return {**metadata, 'path': path}
+
+    def save_keras(self, name: str, model, metadata: Dict) -> Dict:
+        """Store a Keras model (weights and optimizer state) as a new version."""
+        version, path = self.new_version(name)
+        try:
+            model.save(os.path.join(path, 'model.keras'))
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        return self.commit(name, version, metadata)
@@ -5,73 +5,149 @@ Loads data from Supabase and trains all three models.
 
 import os
 import json
+import argparse
 import numpy as np
 from datetime import datetime
+from typing import Tuple
 from ml_models import TrafficPredictionPipeline, ModelEvaluator
-from data_generator import DataGenerator, FeatureEngineer, DataPreprocessor
+from data_generator import TrafficDataGenerator
+from feature_pipeline import FeaturePipeline, observations_to_frame
+from model_registry import ModelRegistry
+from memory_trace import check_copy, traced
 
+# speed, volume, occupancy, free, severe
+TRAINING_FEATURES = ['speed_kmh', 'volume_vehicles', 'occupancy_percent', 'is_free', 'is_severe']
 
-def load_training_data(num_segments: int = 50, days: int = 30) -> np.ndarray:
-    """Load and prepare training data."""
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints')
+FULL_EPOCHS = 50
+FINE_TUNE_EPOCHS = 5
+
+
+@traced()
+def load_training_data(num_segments: int = 50,
+                       days: int = 30) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Load and prepare training data.
+    
+    Returns a (segments, timesteps, features) array, the matching
+    (segments, 2) latitude/longitude coordinates, the (segments, timesteps)
+    hour of day of every observation and the (timesteps,) timestamps shared
+    by all segments.
+    """
     print("Generating training data...")
     
-    generator = DataGenerator(num_segments=num_segments, days=days)
+    generator = TrafficDataGenerator(num_segments=num_segments, days=days)
     observations = generator.generate_traffic_observations()
     
-    # Extract speed data for training
-    speeds = np.array([obs['speed_kmh'] for obs in observations])
-    
-    # Reshape for multi-segment training
-    # Group by segment and create feature matrix
-    segment_data = {}
-    for obs in observations:
-        seg_id = obs['segment_id']
-        if seg_id not in segment_data:
-            segment_data[seg_id] = []
-        segment_data[seg_id].append([
-            obs['speed_kmh'],
-            obs['volume_vehicles'],
-            obs['occupancy_percent'],
-            1 if obs['congestion_level'] == 'free' else 0,  # Encoded
-            1 if obs['congestion_level'] == 'severe' else 0
-        ])
-    
-    # Convert to numpy array (use first segment for training)
-    first_segment = list(segment_data.values())[0]
-    data = np.array(first_segment)
+    # Build the feature matrix column-wise instead of per observation
+    df = observations_to_frame(observations)
+    df = check_copy('sorted observation frame',
+                    df.sort_values(['segment_id', 'timestamp'], kind='stable').reset_index(drop=True))
+    df['is_free'] = (df['congestion_level'] == 'free').astype(np.int8)  # Encoded
+    df['is_severe'] = (df['congestion_level'] == 'severe').astype(np.int8)
+    features = FeaturePipeline(TRAINING_FEATURES, scaling=None).transform(df)
+    
+    # Stack every segment's series for multi-segment training
+    counts = df.groupby('segment_id', sort=False).size()
+    if counts.nunique() != 1:
+        raise ValueError("All segments need the same number of observations")
+    data = features.reshape(len(counts), int(counts.iloc[0]), len(TRAINING_FEATURES))
+    
+    segments = {seg['id']: seg for seg in generator.segments}
+    coordinates = np.array([[segments[seg_id]['latitude'], segments[seg_id]['longitude']]
+                            for seg_id in counts.index])
+    
+    hours = df['timestamp'].dt.hour.to_numpy().reshape(data.shape[:2])
+    timestamps = df['timestamp'].to_numpy().reshape(data.shape[:2])[0]
     
     print(f"Data shape: {data.shape}")
-    return data
+    return data, coordinates, hours, timestamps
+
+
+def recent_data(data: np.ndarray, hours: np.ndarray, timestamps: np.ndarray,
+                since: np.datetime64, context: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Keep the timesteps after ``since`` plus ``context`` earlier steps.
+    
+    The context lets the first new timestep be the target of a full window.
+    """
+    new = np.flatnonzero(timestamps > since)
+    if len(new) == 0:
+        return data[:, :0], hours[:, :0], timestamps[:0]
+    start = max(0, new[0] - context)
+    return data[:, start:], hours[:, start:], timestamps[start:]
 
 
-def train_and_evaluate():
-    """Main training and evaluation function."""
+def train_and_evaluate(workers: int = 1, performance: bool = False, mixed_precision: bool = False,
+                       checkpoint_dir: str = CHECKPOINT_DIR, fine_tune: bool = False,
+                       epochs: int = None, registry: ModelRegistry = None):
+    """Main training and evaluation function.
+    
+    ``fine_tune=True`` starts from the latest registered models and trains
+    only on data newer than what they were trained on. Either way the
+    trained models are registered as new versions.
+    """
     print("=" * 60)
     print("Traffic Prediction Model Training Pipeline")
     print("=" * 60)
     
+    registry = registry or ModelRegistry()
+    epochs = epochs or (FINE_TUNE_EPOCHS if fine_tune else FULL_EPOCHS)
+    
     # Load data
-    data = load_training_data(num_segments=50, days=30)
+    data, coordinates, hours, timestamps = load_training_data(num_segments=50, days=30)
+    
+    # Create pipeline (segment coordinates define the GNN's graph)
+    pipeline = TrafficPredictionPipeline(seq_length=24, num_features=5,
+                                         segment_coordinates=coordinates,
+                                         performance=performance,
+                                         mixed_precision=mixed_precision)
     
-    # Create pipeline
-    pipeline = TrafficPredictionPipeline(seq_length=24, num_features=5)
+    if fine_tune:
+        loaded = pipeline.load_models(registry)
+        if not loaded:
+            raise ValueError(f"No registered models in {registry.root} to fine-tune; run a full training first")
+        since = min(np.datetime64(metadata['data_end']) for metadata in loaded.values())
+        context = pipeline.seq_length + pipeline.horizon - 1
+        data, hours, timestamps = recent_data(data, hours, timestamps, since, context)
+        new_steps = max(0, len(timestamps) - context)
+        print(f"\nFine-tuning versions {pipeline.versions} on {new_steps} new timesteps since {since}")
+        if new_steps == 0:
+            print("No new data; nothing to train")
+            return []
     
-    # Prepare data
-    (X_train, y_train), (X_test, y_test) = pipeline.prepare_data(data, train_ratio=0.8)
+    # Interrupted runs resume from here; each mode keeps its own checkpoints
+    if checkpoint_dir:
+        checkpoint_dir = os.path.join(checkpoint_dir, 'fine_tune' if fine_tune else 'full')
+    
+    # Prepare windows over all segments (streamed to the models via tf.data)
+    train_windows, test_windows = pipeline.prepare_windows(data, train_ratio=0.8)
     
     print(f"\nData Preparation:")
-    print(f"  Training samples: {len(X_train)}")
-    print(f"  Test samples: {len(X_test)}")
+    print(f"  Segments: {data.shape[0]}")
+    print(f"  Training samples: {len(train_windows)}")
+    print(f"  Test samples: {len(test_windows)}")
     print(f"  Sequence length: 24 hours")
     print(f"  Features: 5 (speed, volume, occupancy, free, severe)")
     
     # Train models
-    print(f"\nTraining Models (50 epochs)...")
-    histories = pipeline.train_all_models(X_train, y_train, epochs=50)
+    mode = "performance" if performance else "default"
+    print(f"\nTraining Models ({epochs} epochs, {workers} worker(s), {mode} mode)...")
+    histories = pipeline.train_all_models(train_windows, None, epochs=epochs, workers=workers,
+                                          checkpoint_dir=checkpoint_dir, warm_start=fine_tune)
+    
+    # Training throughput
+    throughput = pipeline.throughput_report()
+    print(f"\nTraining throughput ({throughput['precision']}):")
+    for name, stats in throughput['models'].items():
+        xla = ", XLA" if stats['jit_compile'] else ""
+        print(f"  {name.upper():8s} batch {stats['batch_size']:4d}{xla}: "
+              f"{stats['steady_samples_per_sec']:,.0f} samples/sec")
+    throughput_file = "scripts/training_throughput.json"
+    with open(throughput_file, 'w') as f:
+        json.dump(throughput, f, indent=2)
     
     # Evaluate models
     print(f"\nEvaluating Models...")
-    results = pipeline.evaluate_all_models(X_test, y_test)
+    results = pipeline.evaluate_all_models(test_windows, hours=hours)
     
     # Display results
     print("\n" + "=" * 60)
@@ -83,6 +159,9 @@ def train_and_evaluate():
         print(f"   RMSE (Root Mean Squared Error): {result['rmse']:.4f}")
         print(f"   MAE  (Mean Absolute Error):     {result['mae']:.4f}")
         print(f"   MAPE (Mean Absolute % Error):   {result['mape']:.2f}%")
+        if result.get('per_hour'):
+            worst = max(result['per_hour'], key=lambda row: row['rmse'])
+            print(f"   Worst hour: {worst['hour']:02d}:00 (RMSE {worst['rmse']:.4f})")
     
     # Save results
     results_file = "scripts/model_results.json"
@@ -90,8 +169,42 @@ def train_and_evaluate():
         json.dump(results, f, indent=2)
     print(f"\nResults saved to {results_file}")
     
+    # Register the trained models as new versions
+    saved = pipeline.save_models(registry, {
+        'mode': 'fine_tune' if fine_tune else 'full',
+        'data_start': str(timestamps[0]),
+        'data_end': str(timestamps[-1]),
+        'epochs': epochs,
+        'training_samples': len(train_windows),
+    }, results)
+    for name, metadata in saved.items():
+        parent = f" (from v{metadata['parent']})" if metadata['parent'] else ""
+        print(f"Registered {name} v{metadata['version']}{parent} at {metadata['path']}")
+    
     return results
 
 
 if __name__ == "__main__":
-    results = train_and_evaluate()
+    parser = argparse.ArgumentParser(description="Train and compare traffic prediction models")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes for training (1 trains the models one after another)")
+    parser.add_argument('--performance', action='store_true',
+                        help="Fused-kernel-friendly layers, larger batches and XLA where it helps")
+    parser.add_argument('--mixed-precision', action='store_true',
+                        help="bfloat16 compute where the CPU supports it natively")
+    parser.add_argument('--fine-tune', action='store_true',
+                        help="Warm-start from the latest registered models on data since they were trained")
+    parser.add_argument('--epochs', type=int, default=None,
+                        help=f"Training epochs (default {FULL_EPOCHS}, or {FINE_TUNE_EPOCHS} with --fine-tune)")
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR,
+                        help="Per-epoch checkpoints, resumed after an interruption")
+    parser.add_argument('--no-checkpoint', action='store_true', help="Don't write checkpoints")
+    parser.add_argument('--registry', default=None,
+                        help="Model version directory (default: $MODEL_REGISTRY_DIR or model_versions/)")
+    args = parser.parse_args()
+    
+    results = train_and_evaluate(workers=args.workers, performance=args.performance,
+                                 mixed_precision=args.mixed_precision,
+                                 checkpoint_dir=None if args.no_checkpoint else args.checkpoint_dir,
+                                 fine_tune=args.fine_tune, epochs=args.epochs,
+                                 registry=ModelRegistry(args.registry))
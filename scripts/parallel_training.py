@@ -0,0 +1,173 @@
+"""
+Parallel multi-model training.
+Trains each architecture in its own worker process. The raw series behind
+the training windows is placed in shared memory once, and each worker
+rebuilds zero-copy windows over it instead of receiving a pickled copy.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from windowing import SequenceWindows
+
+MODEL_NAMES = ['lstm', 'cnn_gru', 'gnn']
+
+
+def _share_array(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, Dict]:
+    """Copy an array into a new shared memory block."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, {'name': shm.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+
+def _attach_array(spec: Dict) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    """Attach to a shared memory block created by _share_array."""
+    # Spawned workers share the parent's resource tracker, and the parent
+    # unlinks the block once every worker is done
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    return shm, np.ndarray(spec['shape'], dtype=np.dtype(spec['dtype']), buffer=shm.buf)
+
+
+def _limit_threads(num_threads: int, framework: str = 'tensorflow'):
+    """Cap math-library and framework threads before the framework is imported."""
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                'TF_NUM_INTRAOP_THREADS'):
+        os.environ[var] = str(num_threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    if framework == 'torch':
+        import torch
+        torch.set_num_threads(num_threads)
+        return
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def build_model(name: str, seq_length: int, num_features: int,
+                num_nodes: int = 50, coordinates: Optional[np.ndarray] = None,
+                performance: bool = False, mixed_precision: bool = False, **params):
+    """Create an untrained model wrapper by name.
+
+    ``params`` are extra constructor arguments such as ``units`` or
+    ``learning_rate``.
+    """
+    from ml_models import LSTMModel, CNNGRUModel, GNNModel
+
+    if name == 'lstm':
+        return LSTMModel(seq_length, num_features, performance=performance,
+                         mixed_precision=mixed_precision, **params)
+    if name == 'cnn_gru':
+        return CNNGRUModel(seq_length, num_features, performance=performance,
+                           mixed_precision=mixed_precision, **params)
+    if name == 'gnn':
+        return GNNModel(num_nodes=num_nodes, seq_length=seq_length,
+                        num_features=num_features, coordinates=coordinates,
+                        performance=performance, mixed_precision=mixed_precision, **params)
+    raise ValueError(f"Unknown model: {name}")
+
+
+def model_state(model) -> Dict:
+    """Weights and optimizer variables of a compiled Keras model."""
+    return {'weights': model.get_weights(),
+            'optimizer': [v.numpy() for v in model.optimizer.variables]}
+
+
+def restore_model_state(model, state: Dict):
+    """Load a ``model_state`` into a compiled model of the same architecture."""
+    model.set_weights(state['weights'])
+    model.optimizer.build(model.trainable_variables)
+    for variable, value in zip(model.optimizer.variables, state['optimizer']):
+        variable.assign(value)
+
+
+def _train_worker(name: str, data_spec: Dict, index_spec: Dict, seq_length: int,
+                  horizon: int, target_col: int, epochs: int, batch_size: Optional[int],
+                  coordinates: Optional[np.ndarray], performance: bool = False,
+                  mixed_precision: bool = False, checkpoint_dir: Optional[str] = None,
+                  params: Optional[Dict] = None, initial_state: Optional[Dict] = None) -> Dict:
+    """Train one architecture on windows over the shared series."""
+    data_shm, data = _attach_array(data_spec)
+    index_shm, indices = _attach_array(index_spec)
+    try:
+        windows = SequenceWindows(data, seq_length, horizon, target_col, indices=indices)
+        model = build_model(name, seq_length, windows.num_features,
+                            num_nodes=windows.num_segments, coordinates=coordinates,
+                            performance=performance, mixed_precision=mixed_precision,
+                            **(params or {}))
+        if initial_state is not None:
+            restore_model_state(model.model, initial_state)
+        history = model.train(windows, epochs=epochs, batch_size=batch_size,
+                              checkpoint_dir=checkpoint_dir)
+        result = {
+            'history': {k: [float(v) for v in values] for k, values in history.items()},
+            'state': model_state(model.model),
+            'throughput': model.throughput.epochs,
+        }
+    finally:
+        # Views into the shared buffers must be gone before closing them
+        windows = data = indices = None
+        data_shm.close()
+        index_shm.close()
+    return result
+
+
+def train_models_parallel(train_windows: SequenceWindows, epochs: int = 50,
+                          batch_size: Optional[int] = None, workers: int = 3,
+                          threads_per_worker: Optional[int] = None,
+                          model_names: Optional[List[str]] = None,
+                          coordinates: Optional[np.ndarray] = None,
+                          performance: bool = False,
+                          mixed_precision: bool = False,
+                          checkpoint_dir: Optional[str] = None,
+                          model_params: Optional[Dict[str, Dict]] = None,
+                          initial_state: Optional[Dict[str, Dict]] = None
+                          ) -> Dict[str, Dict]:
+    """Train several architectures concurrently on the same windows.
+
+    ``batch_size=None`` uses each model's default for the training mode.
+    Each model is built with ``model_params[name]`` constructor arguments,
+    checkpoints into ``<checkpoint_dir>/<name>`` when given, and starts from
+    the ``model_state`` in ``initial_state[name]`` when given.
+    Returns ``{name: {'history': ..., 'state': ..., 'throughput': ...}}``.
+    """
+    model_names = model_names or MODEL_NAMES
+    workers = max(1, min(workers, len(model_names)))
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    data_shm, data_spec = _share_array(np.ascontiguousarray(train_windows.data))
+    index_shm, index_spec = _share_array(np.ascontiguousarray(train_windows.indices))
+    results = {}
+    try:
+        # spawn: workers must set thread limits before TensorFlow initializes
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_limit_threads,
+                                 initargs=(threads_per_worker,)) as executor:
+            futures = {
+                executor.submit(_train_worker, name, data_spec, index_spec,
+                                train_windows.seq_length, train_windows.horizon,
+                                train_windows.target_col, epochs, batch_size,
+                                coordinates, performance, mixed_precision,
+                                os.path.join(checkpoint_dir, name) if checkpoint_dir else None,
+                                (model_params or {}).get(name),
+                                (initial_state or {}).get(name)): name
+                for name in model_names
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                results[name] = future.result()
+                print(f"Finished training {name} model")
+    finally:
+        for shm in (data_shm, index_shm):
+            shm.close()
+            shm.unlink()
+
+    return {name: results[name] for name in model_names}
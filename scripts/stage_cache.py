@@ -0,0 +1,162 @@
+"""
+Content-addressed on-disk cache for preprocessing stages.
+A stage's key hashes its name, its config and the keys of its inputs (source
+file hashes, code fingerprints or upstream stage keys), so changing one
+setting only reruns the stages downstream of it. Arrays are stored as .npy
+and loaded memory-mapped; DataFrames as Parquet when pyarrow is available.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+EXTENSIONS = {'npy': 'npy', 'parquet': 'parquet', 'pickle': 'pkl', 'json': 'json'}
+
+_file_hashes: Dict[tuple, str] = {}
+
+
+def default_cache_dir() -> str:
+    """$STAGE_CACHE_DIR, or .stage_cache at the repository root."""
+    return os.environ.get('STAGE_CACHE_DIR', os.path.join(REPO_ROOT, '.stage_cache'))
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_fingerprint(path: str) -> str:
+    """Content hash of a file, memoized per (path, size, mtime) in this process."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _file_hashes[memo_key] = f"file:{digest.hexdigest()}"
+    return _file_hashes[memo_key]
+
+
+def array_fingerprint(array: np.ndarray) -> str:
+    """Content hash of an in-memory array (shape and dtype included)."""
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha256(f"{array.shape}{array.dtype}".encode())
+    digest.update(array.data if array.dtype != object else repr(array.tolist()).encode())
+    return f"array:{digest.hexdigest()}"
+
+
+def source_fingerprint(*functions: Callable) -> str:
+    """Hash of the functions' source code, so editing a stage invalidates it."""
+    return f"code:{_digest([inspect.getsource(fn) for fn in functions])}"
+
+
+class StageOutputs(dict):
+    """Outputs of one stage. ``key`` identifies them for downstream stages."""
+
+    def __init__(self, key: str, outputs: Dict, cached: bool):
+        super().__init__(outputs)
+        self.key = key
+        self.cached = cached
+
+
+class StageCache:
+    """Runs pipeline stages, reusing stored outputs when their inputs match.
+
+    ``compute`` returns a dict of outputs: numpy arrays, DataFrames or
+    JSON-serializable values. Entries live in ``<root>/<stage>/<key>/`` and
+    are written to a temporary directory first, so readers never see a
+    partial entry.
+    """
+
+    def __init__(self, root: Optional[str] = None, enabled: bool = True, verbose: bool = True):
+        self.root = root or default_cache_dir()
+        self.enabled = enabled
+        self.verbose = verbose
+
+    @staticmethod
+    def stage_key(stage: str, config: Optional[Dict] = None, inputs: Iterable = ()) -> str:
+        """Fingerprint of a stage's name, config and input keys."""
+        input_keys = [getattr(item, 'key', item) for item in inputs]
+        return _digest({'stage': stage, 'config': config or {}, 'inputs': input_keys})[:24]
+
+    def run(self, stage: str, compute: Callable[[], Dict], config: Optional[Dict] = None,
+            inputs: Iterable = ()) -> StageOutputs:
+        """Return the stage's outputs from the cache, computing them on a miss."""
+        key = self.stage_key(stage, config, inputs)
+        path = os.path.join(self.root, stage, key)
+        if self.enabled and os.path.exists(os.path.join(path, 'manifest.json')):
+            outputs = self._load(path)
+            if self.verbose:
+                print(f"Stage '{stage}' loaded from cache ({key[:12]})")
+            return StageOutputs(key, outputs, cached=True)
+
+        outputs = compute()
+        if self.enabled:
+            self._save(path, outputs, {'stage': stage, 'config': config or {},
+                                       'inputs': [getattr(item, 'key', item) for item in inputs]})
+            if self.verbose:
+                print(f"Stage '{stage}' computed and cached ({key[:12]})")
+        return StageOutputs(key, outputs, cached=False)
+
+    def _save(self, path: str, outputs: Dict, description: Dict):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        kinds = {}
+        for name, value in outputs.items():
+            if isinstance(value, pd.DataFrame):
+                try:
+                    value.to_parquet(os.path.join(tmp_path, f"{name}.parquet"))
+                    kinds[name] = 'parquet'
+                except ImportError:
+                    value.to_pickle(os.path.join(tmp_path, f"{name}.pkl"))
+                    kinds[name] = 'pickle'
+            elif isinstance(value, np.ndarray):
+                np.save(os.path.join(tmp_path, f"{name}.npy"), value, allow_pickle=value.dtype == object)
+                kinds[name] = 'npy'
+            else:
+                with open(os.path.join(tmp_path, f"{name}.json"), 'w') as f:
+                    json.dump(value, f)
+                kinds[name] = 'json'
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump({**description, 'outputs': kinds}, f, indent=2)
+
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another process cached the same key first; its entry is identical
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @staticmethod
+    def _load(path: str) -> Dict:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            kinds = json.load(f)['outputs']
+        outputs = {}
+        for name, kind in kinds.items():
+            file_path = os.path.join(path, f"{name}.{EXTENSIONS[kind]}")
+            if kind == 'npy':
+                # Object arrays can't be memory-mapped
+                try:
+                    outputs[name] = np.load(file_path, mmap_mode='r')
+                except ValueError:
+                    outputs[name] = np.load(file_path, allow_pickle=True)
+            elif kind == 'parquet':
+                outputs[name] = pd.read_parquet(file_path)
+            elif kind == 'pickle':
+                outputs[name] = pd.read_pickle(file_path)
+            else:
+                with open(file_path) as f:
+                    outputs[name] = json.load(f)
+        return outputs
+
+    def clear(self, stage: Optional[str] = None):
+        """Delete every cached entry, or only those of one stage."""
+        shutil.rmtree(os.path.join(self.root, stage) if stage else self.root, ignore_errors=True)
@@ -0,0 +1,223 @@
+"""
+Sliding-window sequence building for time series models.
+Windows are strided views over the source array, so building them costs no
+memory; only the batches handed to a model are ever copied.
+"""
+
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from memory_trace import check_copy
+
+
+def sliding_windows(data: np.ndarray, seq_length: int = 24, horizon: int = 1,
+                    target_col: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Create zero-copy (X, y) windows for seq-to-one forecasting.
+
+    ``data`` of shape (T, F) gives X (N, seq_length, F) and y (N,);
+    ``data`` of shape (segments, T, F) gives X (segments, N, seq_length, F)
+    and y (segments, N). A 1-D series gives X (N, seq_length) and y (N,).
+    The target for a window starting at ``i`` is
+    ``data[i + seq_length + horizon - 1, target_col]``.
+    """
+    data = np.asarray(data)
+    time_axis = 0 if data.ndim <= 2 else 1
+    num_windows = data.shape[time_axis] - seq_length - horizon + 1
+    if num_windows <= 0:
+        raise ValueError(
+            f"Need more than {seq_length + horizon - 1} timesteps, got {data.shape[time_axis]}"
+        )
+
+    windows = sliding_window_view(data, seq_length, axis=time_axis)
+    if data.ndim == 1:
+        X = windows[:num_windows]
+        y = data[seq_length + horizon - 1:]
+    else:
+        # (..., N, F, seq) -> (..., N, seq, F), still a view
+        X = windows.swapaxes(-1, -2)[..., :num_windows, :, :]
+        y = data[..., seq_length + horizon - 1:, target_col]
+    return X, y
+
+
+class SequenceWindows:
+    """Indexable set of training windows over one or more segments.
+
+    Holds strided views of shape (segments, N, seq_length, F) plus the flat
+    indices of the windows it covers. Windows are only gathered into memory
+    one batch at a time by ``batches`` or ``to_dataset``.
+    """
+
+    def __init__(self, data: np.ndarray, seq_length: int = 24, horizon: int = 1,
+                 target_col: int = 0, indices: Optional[np.ndarray] = None):
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 2:
+            data = data[np.newaxis]
+        if data.ndim != 3:
+            raise ValueError(f"Expected (T, F) or (segments, T, F) data, got shape {data.shape}")
+
+        self.data = data
+        self.seq_length = seq_length
+        self.horizon = horizon
+        self.target_col = target_col
+        self.windows, self.targets = sliding_windows(data, seq_length, horizon, target_col)
+        self.num_segments, self.windows_per_segment = self.targets.shape
+        self.num_features = data.shape[2]
+        if indices is None:
+            indices = np.arange(self.num_segments * self.windows_per_segment)
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return (len(self), self.seq_length, self.num_features)
+
+    def _subset(self, indices: np.ndarray) -> 'SequenceWindows':
+        subset = SequenceWindows.__new__(SequenceWindows)
+        subset.__dict__.update(self.__dict__)
+        subset.indices = indices
+        return subset
+
+    def split(self, train_ratio: float = 0.8) -> Tuple['SequenceWindows', 'SequenceWindows']:
+        """Time-based split: the first ``train_ratio`` of every segment trains."""
+        position = self.indices % self.windows_per_segment
+        if not len(position):
+            return self._subset(self.indices), self._subset(self.indices)
+        start = position.min()
+        cutoff = start + int((position.max() + 1 - start) * train_ratio)
+        return self._subset(self.indices[position < cutoff]), self._subset(self.indices[position >= cutoff])
+
+    def take(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Gather the windows with the given flat indices into contiguous arrays."""
+        segment, position = np.divmod(np.asarray(indices), self.windows_per_segment)
+        # Index the raw series, not the swapped-axes view, so X comes out C-contiguous
+        # and callers needing contiguous arrays do not copy it a second time
+        steps = position[:, None] + np.arange(self.seq_length)
+        return self.data[segment[:, None], steps], self.targets[segment, position]
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (X, y); views when the windows are one contiguous run of one segment."""
+        segment, position = np.divmod(self.indices, self.windows_per_segment)
+        if len(self.indices) and (segment == segment[0]).all() and (np.diff(position) == 1).all():
+            run = slice(position[0], position[-1] + 1)
+            return self.windows[segment[0], run], self.targets[segment[0], run]
+        X, y = self.take(self.indices)
+        check_copy('SequenceWindows.arrays X', X, source=self.data)
+        return X, y
+
+    def graph_positions(self) -> np.ndarray:
+        """Window start positions present in every segment (graph samples)."""
+        segment, position = np.divmod(self.indices, self.windows_per_segment)
+        counts = np.bincount(position, minlength=self.windows_per_segment)
+        return np.flatnonzero(counts == self.num_segments)
+
+    def graph_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return graph samples X (P, segments, seq, F) and y (P, segments)."""
+        positions = self.graph_positions()
+        return (self.windows[:, positions].swapaxes(0, 1),
+                self.targets[:, positions].swapaxes(0, 1))
+
+    def batches(self, batch_size: int = 32, shuffle: bool = False,
+                seed=None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (X, y) batches, copying only one batch at a time.
+
+        ``seed`` may be an int or a ``np.random.Generator``.
+        """
+        order = self.indices
+        if shuffle:
+            order = np.random.default_rng(seed).permutation(order)
+        for start in range(0, len(order), batch_size):
+            yield self.take(order[start:start + batch_size])
+
+    def to_dataset(self, batch_size: int = 32, shuffle: bool = False,
+                   seed: Optional[int] = None, shuffle_buffer: int = 4096,
+                   cycle_length: int = 16, ram_budget_mb: Optional[int] = None):
+        """Stream windows as a batched, prefetched tf.data.Dataset.
+
+        Only (segment, position) indices flow through the pipeline: segments
+        are interleaved in parallel, shuffled through a bounded buffer,
+        batched, and the windows are gathered from the raw series in a
+        parallel map. Per-epoch memory is the raw series plus the shuffle
+        buffer and a few prefetched batches, whatever the number of windows.
+        """
+        import tensorflow as tf
+
+        indices = np.sort(self.indices)
+        segment, position = np.divmod(indices, self.windows_per_segment)
+        segments, starts = np.unique(segment, return_index=True)
+        positions = tf.RaggedTensor.from_row_starts(position, starts)
+
+        series = tf.constant(self.data)
+        seq_steps = tf.range(self.seq_length, dtype=tf.int64)
+        target_offset = self.seq_length + self.horizon - 1
+        target_col = self.target_col
+
+        def segment_positions(seg, pos):
+            positions_ds = tf.data.Dataset.from_tensor_slices(pos)
+            if shuffle:
+                positions_ds = positions_ds.shuffle(self.windows_per_segment, seed=seed)
+            return positions_ds.map(lambda p: (seg, p))
+
+        def gather_windows(seg, pos):
+            steps = pos[:, None] + seq_steps
+            seg_steps = tf.broadcast_to(seg[:, None], tf.shape(steps))
+            X = tf.gather_nd(series, tf.stack([seg_steps, steps], axis=-1))
+            y = tf.gather_nd(series, tf.stack([seg, pos + target_offset], axis=-1))[:, target_col]
+            return X, y
+
+        dataset = tf.data.Dataset.from_tensor_slices((segments, positions))
+        if shuffle:
+            dataset = dataset.shuffle(len(segments), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.interleave(
+            segment_positions,
+            cycle_length=max(1, min(cycle_length, len(segments))),
+            num_parallel_calls=tf.data.AUTOTUNE,
+            deterministic=not shuffle,
+        )
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size)
+        dataset = dataset.map(gather_windows, num_parallel_calls=tf.data.AUTOTUNE,
+                              deterministic=not shuffle)
+
+        num_batches = -(-len(self) // batch_size)
+        dataset = dataset.apply(tf.data.experimental.assert_cardinality(num_batches))
+        if ram_budget_mb is not None:
+            options = tf.data.Options()
+            options.autotune.ram_budget = int(ram_budget_mb) * 1024 * 1024
+            dataset = dataset.with_options(options)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def to_graph_dataset(self, batch_size: int = 32, shuffle: bool = False,
+                         seed: Optional[int] = None):
+        """Stream (batch, segments, seq, F) graph samples as a tf.data.Dataset.
+
+        Each sample stacks the window at one time position for every segment,
+        so graph models see all nodes at once.
+        """
+        import tensorflow as tf
+
+        positions = self.graph_positions()
+        series = tf.constant(self.data)
+        targets = tf.constant(self.data[:, :, self.target_col])
+        seq_steps = tf.range(self.seq_length, dtype=tf.int64)
+        target_offset = self.seq_length + self.horizon - 1
+
+        def gather_graphs(pos):
+            steps = pos[:, None] + seq_steps
+            X = tf.transpose(tf.gather(series, steps, axis=1), [1, 0, 2, 3])
+            y = tf.transpose(tf.gather(targets, pos + target_offset, axis=1))
+            return X, y
+
+        dataset = tf.data.Dataset.from_tensor_slices(positions.astype(np.int64))
+        if shuffle:
+            dataset = dataset.shuffle(len(positions), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size)
+        dataset = dataset.map(gather_graphs, num_parallel_calls=tf.data.AUTOTUNE,
+                              deterministic=not shuffle)
+        num_batches = -(-len(positions) // batch_size)
+        dataset = dataset.apply(tf.data.experimental.assert_cardinality(num_batches))
+        return dataset.prefetch(tf.data.AUTOTUNE)